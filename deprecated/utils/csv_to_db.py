@@ -5,6 +5,7 @@ from dotenv import load_dotenv
 import os
 
 
+# Superseded by src/helper/import_csv.py, which stages the file in bulk and merges it set-based
 def csv_to_db(csv_file):
 
     load_dotenv()
@@ -20,6 +21,19 @@ def csv_to_db(csv_file):
     # Create a cursor object
     mycursor = mydb.cursor()
 
+    # Since migration 0004 TrackGenres is a view derived from ArtistGenres, and the CSV only
+    # has the genres of every track, not of every artist
+    mycursor.execute(
+        "SELECT TABLE_TYPE FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'TrackGenres'"
+    )
+    result = mycursor.fetchall()
+    if result and result[0][0] == 'VIEW':
+        mydb.close()
+        raise RuntimeError(
+            "TrackGenres is a view on this database (migration 0004), so this script can't write it: "
+            "use src/helper/import_csv.py instead"
+        )
+
     # Open the CSV file with utf-8 encoding
     with open(csv_file, 'r', encoding='utf-8') as f:
         reader = csv.DictReader(f)
@@ -0,0 +1,255 @@
+from .snapshot import Snapshot
+
+import numpy as np
+import pandas as pd
+
+
+# Dimension tables, loaded first so their keys define the categories of the link tables
+DIMENSION_QUERIES = {
+    'tracks': "SELECT track_id, track_name, track_album, track_duration FROM Tracks",
+    'users': "SELECT user_id, user_name FROM Users",
+    'artists': "SELECT artist_id, artist_name FROM Artists",
+    'genres': "SELECT genre_id, genre_name FROM Genres",
+}
+
+# Link tables: name -> (query, {column: dimension whose keys it references})
+LINK_QUERIES = {
+    'track_artists': ("SELECT track_id, artist_id FROM TrackArtists", {'track_id': 'tracks', 'artist_id': 'artists'}),
+    'track_genres': ("SELECT track_id, genre_id FROM TrackGenres", {'track_id': 'tracks', 'genre_id': 'genres'}),
+    'user_tracks': ("SELECT user_id, track_id FROM UserTracks", {'user_id': 'users', 'track_id': 'tracks'}),
+}
+
+# Key and label column of each dimension
+DIMENSION_COLUMNS = {
+    'tracks': ('track_id', 'track_name'),
+    'users': ('user_id', 'user_name'),
+    'artists': ('artist_id', 'artist_name'),
+    'genres': ('genre_id', 'genre_name'),
+}
+
+
+def load_tables(engine):
+    """
+    Loads the dimension and link tables of the playlist database into DataFrames.
+
+    Every key column of a link table is a Categorical whose categories are the keys of the
+    dimension it references, in the dimension's row order. Its codes are therefore row positions
+    in the dimension DataFrame, which is what the aggregation functions below count with
+    np.bincount instead of splitting and exploding joined strings.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        The engine connected to the playlist database.
+
+    Returns
+    -------
+    dict
+        The DataFrames 'tracks', 'users', 'artists', 'genres', 'track_artists', 'track_genres'
+        and 'user_tracks'.
+    """
+    tables = {name: pd.read_sql(query, engine) for name, query in DIMENSION_QUERIES.items()}
+
+    for name, (query, references) in LINK_QUERIES.items():
+        df = pd.read_sql(query, engine)
+        for column, dimension in references.items():
+            keys = tables[dimension][DIMENSION_COLUMNS[dimension][0]]
+            df[column] = pd.Categorical(df[column], categories=keys)
+        tables[name] = df
+
+    return tables
+
+
+def load_snapshot(path):
+    """
+    Opens a snapshot exported by src/helper/export_snapshot.py, without querying MySQL.
+
+    Parameters
+    ----------
+    path : str
+        The directory of the snapshot.
+
+    Returns
+    -------
+    Snapshot
+        A lazy, memory-mapped view of the tables accepted by every function of this module.
+    """
+    return Snapshot(path)
+
+
+def _codes(tables, link, column):
+    """
+    Returns the codes of a link table column, straight from the memory map of a snapshot.
+    """
+    if isinstance(tables, Snapshot):
+        return tables.codes(link, column)
+    return tables[link][column].cat.codes.to_numpy()
+
+
+def _rows(tables, table):
+    if isinstance(tables, Snapshot):
+        return tables.rows(table)
+    return len(tables[table])
+
+
+def _counts(codes, size):
+    """
+    Counts the occurrences of every code, ignoring -1 (keys missing from the dimension).
+    """
+    codes = np.asarray(codes)
+    return np.bincount(codes[codes >= 0], minlength=size)
+
+
+def _top(counts, labels, n):
+    """
+    Returns the n largest counts indexed by label, summing the rows that share a label.
+    """
+    series = pd.Series(counts, index=labels)
+    if not series.index.is_unique:
+        series = series.groupby(level=0, sort=False).sum()
+    series = series[series > 0]
+    return series.sort_values(ascending=False, kind='stable').head(n)
+
+
+def _top_of_dimension(tables, link, column, dimension, n):
+    codes  = _codes(tables, link, column)
+    labels = tables[dimension][DIMENSION_COLUMNS[dimension][1]].to_numpy()
+    return _top(_counts(codes, len(labels)), labels, n)
+
+
+def top_artists(tables, n=10):
+    """
+    Returns the artists with the most tracks.
+
+    Parameters
+    ----------
+    tables : dict or Snapshot
+        The DataFrames returned by load_tables, or the snapshot returned by load_snapshot.
+    n : int, optional
+        The number of artists to return.
+
+    Returns
+    -------
+    pandas.Series
+        The number of tracks indexed by artist name, in descending order.
+    """
+    return _top_of_dimension(tables, 'track_artists', 'artist_id', 'artists', n)
+
+
+def top_genres(tables, n=10):
+    """
+    Returns the genres with the most tracks.
+
+    Parameters
+    ----------
+    tables : dict or Snapshot
+        The DataFrames returned by load_tables, or the snapshot returned by load_snapshot.
+    n : int, optional
+        The number of genres to return.
+
+    Returns
+    -------
+    pandas.Series
+        The number of tracks indexed by genre name, in descending order.
+    """
+    return _top_of_dimension(tables, 'track_genres', 'genre_id', 'genres', n)
+
+
+def top_users(tables, n=10):
+    """
+    Returns the users who added the most tracks.
+
+    Parameters
+    ----------
+    tables : dict or Snapshot
+        The DataFrames returned by load_tables, or the snapshot returned by load_snapshot.
+    n : int, optional
+        The number of users to return.
+
+    Returns
+    -------
+    pandas.Series
+        The number of tracks indexed by user name, in descending order.
+    """
+    return _top_of_dimension(tables, 'user_tracks', 'user_id', 'users', n)
+
+
+def user_track_mask(tables, user_name):
+    """
+    Returns which tracks were added by a user.
+
+    Parameters
+    ----------
+    tables : dict or Snapshot
+        The DataFrames returned by load_tables, or the snapshot returned by load_snapshot.
+    user_name : str
+        The display name of the user.
+
+    Returns
+    -------
+    numpy.ndarray
+        A boolean array with one entry per row of tables['tracks'].
+    """
+    user_codes = np.flatnonzero(tables['users']['user_name'].to_numpy() == user_name)
+
+    selected = np.isin(_codes(tables, 'user_tracks', 'user_id'), user_codes)
+    track_codes = _codes(tables, 'user_tracks', 'track_id')[selected]
+
+    mask = np.zeros(_rows(tables, 'tracks'), dtype=bool)
+    mask[track_codes[track_codes >= 0]] = True
+    return mask
+
+
+def top_genres_of_user(tables, user_name, n=10):
+    """
+    Returns the genres with the most tracks among the tracks added by a user.
+
+    Parameters
+    ----------
+    tables : dict or Snapshot
+        The DataFrames returned by load_tables, or the snapshot returned by load_snapshot.
+    user_name : str
+        The display name of the user.
+    n : int, optional
+        The number of genres to return.
+
+    Returns
+    -------
+    pandas.Series
+        The number of tracks indexed by genre name, in descending order.
+    """
+    track_codes = _codes(tables, 'track_genres', 'track_id')
+    genre_codes = _codes(tables, 'track_genres', 'genre_id')
+
+    mask = user_track_mask(tables, user_name)
+    selected = (track_codes >= 0) & mask[track_codes]
+
+    labels = tables['genres']['genre_name'].to_numpy()
+    return _top(_counts(genre_codes[selected], len(labels)), labels, n)
+
+
+def count_tracks_with_genre(tables, pattern, case=False):
+    """
+    Counts the tracks having at least one genre whose name contains a pattern.
+
+    Parameters
+    ----------
+    tables : dict or Snapshot
+        The DataFrames returned by load_tables, or the snapshot returned by load_snapshot.
+    pattern : str
+        The substring to look for in the genre names, e.g. 'rock'.
+    case : bool, optional
+        Whether the match is case sensitive.
+
+    Returns
+    -------
+    int
+        The number of distinct tracks.
+    """
+    matching = tables['genres']['genre_name'].str.contains(pattern, case=case, regex=False, na=False).to_numpy()
+
+    track_codes = _codes(tables, 'track_genres', 'track_id')
+    genre_codes = _codes(tables, 'track_genres', 'genre_id')
+
+    selected = (genre_codes >= 0) & matching[genre_codes] & (track_codes >= 0)
+    return int(np.unique(track_codes[selected]).size)
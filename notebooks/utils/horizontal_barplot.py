@@ -2,8 +2,10 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 
+import os
 
-def horizontal_barplot(x, y, title, xlabel, ylabel, filename, total_entries):
+
+def horizontal_barplot(x, y, title, xlabel, ylabel, filename, total_entries, output_dir="../images", show=True):
     # plot most active users by number of tracks added
     # color palette
     plt.style.use("dark_background")
@@ -63,6 +65,13 @@ def horizontal_barplot(x, y, title, xlabel, ylabel, filename, total_entries):
     plt.tight_layout()
 
     # save the plot as a png file
-    plt.savefig(f"../images/f{filename}", dpi=300)
+    path = os.path.join(output_dir, filename)
+    plt.savefig(path, dpi=300)
+
+    if show:
+        plt.show()
+    else:
+        # Batch rendering: free the figure instead of displaying it
+        plt.close()
 
-    plt.show()
\ No newline at end of file
+    return path
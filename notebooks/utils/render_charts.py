@@ -0,0 +1,167 @@
+from . import analytics
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import hashlib
+import json
+import os
+
+
+# Hashes of the rendered charts, kept next to the images
+MANIFEST_NAME = ".render_manifest.json"
+
+# The module defining the chart style: any edit to it invalidates every rendered chart
+STYLE_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "horizontal_barplot.py")
+
+
+def _style_digest():
+    with open(STYLE_SOURCE, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def chart_spec(x, y, title, xlabel, ylabel, filename, total_entries):
+    """
+    Returns the spec of a horizontal_barplot chart, with its data as plain JSON values.
+
+    Parameters
+    ----------
+    x, y, title, xlabel, ylabel, filename, total_entries
+        The arguments of horizontal_barplot. x and y can be any sequences (Series, arrays...).
+
+    Returns
+    -------
+    dict
+        The spec, which can be hashed and sent to a worker process.
+    """
+    return {
+        'x': [float(value) for value in x],
+        'y': [str(value) for value in y],
+        'title': title,
+        'xlabel': xlabel,
+        'ylabel': ylabel,
+        'filename': filename,
+        'total_entries': int(total_entries),
+    }
+
+
+def spec_hash(spec, style_digest=None):
+    """
+    Returns the content hash of a chart: its data, labels and the source of the chart style.
+    """
+    payload = json.dumps(dict(spec, style=style_digest or _style_digest()), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _bars(counts):
+    return counts.values, counts.index
+
+
+def _init_worker():
+    # Headless backend, set before pyplot is imported by horizontal_barplot
+    import matplotlib
+    matplotlib.use("Agg", force=True)
+
+
+def _render(spec, output_dir):
+    from .horizontal_barplot import horizontal_barplot
+    return horizontal_barplot(**spec, output_dir=output_dir, show=False)
+
+
+def render_charts(specs, output_dir="../images", max_workers=None, force=False):
+    """
+    Renders a batch of horizontal_barplot charts across a process pool, skipping unchanged ones.
+
+    A chart is rendered only if its file is missing or its content hash (see spec_hash) differs
+    from the one recorded in the manifest of output_dir when it was last rendered, so
+    regenerating the whole image set after a sync only costs the charts whose data changed.
+
+    Parameters
+    ----------
+    specs : list of dict
+        The charts to render, as returned by chart_spec.
+    output_dir : str, optional
+        The folder of the images and of the manifest.
+    max_workers : int, optional
+        The number of processes. Defaults to the number of CPUs.
+    force : bool, optional
+        Whether to render every chart even if it is unchanged.
+
+    Returns
+    -------
+    dict
+        The filenames 'rendered' and 'skipped'.
+    """
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    style_digest = _style_digest()
+    pending, skipped = {}, []
+    for spec in specs:
+        digest = spec_hash(spec, style_digest)
+        if not force and manifest.get(spec['filename']) == digest and os.path.exists(os.path.join(output_dir, spec['filename'])):
+            skipped.append(spec['filename'])
+        else:
+            pending[spec['filename']] = (spec, digest)
+
+    rendered = []
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+            futures = {executor.submit(_render, spec, output_dir): filename for filename, (spec, _) in pending.items()}
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    filename = futures[future]
+                    manifest[filename] = pending[filename][1]
+                    rendered.append(filename)
+            finally:
+                # Record what was rendered even if a chart failed
+                with open(manifest_path + ".tmp", 'w', encoding='utf-8') as f:
+                    json.dump(manifest, f, indent=2, sort_keys=True, ensure_ascii=False)
+                os.replace(manifest_path + ".tmp", manifest_path)
+
+    return {'rendered': rendered, 'skipped': skipped}
+
+
+def playlist_chart_specs(tables, user_names=None, n=10):
+    """
+    Returns the specs of the charts of the images folder: the top artists, genres and users, and
+    the top genres of each user.
+
+    Parameters
+    ----------
+    tables : dict or Snapshot
+        The tables returned by analytics.load_tables or analytics.load_snapshot.
+    user_names : list of str, optional
+        The users to chart the genres of. Defaults to the top n users.
+    n : int, optional
+        The number of bars of each chart.
+
+    Returns
+    -------
+    list of dict
+        The chart specs.
+    """
+    total_tracks = len(tables['tracks'])
+    top_users = analytics.top_users(tables, n)
+
+    specs = [
+        chart_spec(*_bars(analytics.top_artists(tables, n)), f"Top {n} artists by number of tracks",
+                   "Number of tracks", "Artist", "top_artists.png", total_tracks),
+        chart_spec(*_bars(analytics.top_genres(tables, n)), f"Top {n} genres",
+                   "Number of tracks", "Genre", "top_genres.png", total_tracks),
+        chart_spec(*_bars(top_users), f"Top {n} users by number of tracks added",
+                   "Number of tracks", "User", "top_users.png", total_tracks),
+    ]
+
+    for user_name in (user_names if user_names is not None else top_users.index):
+        specs.append(chart_spec(
+            *_bars(analytics.top_genres_of_user(tables, user_name, n)), f"Tracks Added by {user_name} - Genres",
+            "Genre", "Number of Tracks", f"{user_name}_top_genres.png",
+            int(analytics.user_track_mask(tables, user_name).sum())
+        ))
+
+    return specs
+
@@ -0,0 +1,87 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class Snapshot:
+    """
+    A read-only view of a snapshot written by src/helper/export_snapshot.py.
+
+    Nothing is read when the snapshot is opened besides its manifest. Integer columns and the
+    codes of the link tables are memory-mapped on first access (np.load with mmap_mode='r'), so
+    they are shared with the page cache instead of copied. String columns are decoded from their
+    UTF-8 blob on first access and cached.
+
+    Indexing the snapshot by table name returns a DataFrame shaped like the ones returned by
+    analytics.load_tables, so every analytics function accepts either.
+
+    ...
+
+    Methods
+    -------
+    codes(table, column):
+        Returns the memory-mapped codes of a link table column.
+
+    column(table, column):
+        Returns a dimension column, memory-mapped if numeric or decoded if a string.
+
+    rows(table):
+        Returns the number of rows of a table.
+    """
+
+    def __init__(self, path):
+        # The export swaps the symlink at path, so the columns read lazily must come from the
+        # version the manifest was read from
+        self.path = os.path.realpath(path)
+        with open(os.path.join(path, "manifest.json"), encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self._columns = {}
+        self._frames  = {}
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def rows(self, table):
+        return self.manifest['tables'][table]['rows']
+
+    def codes(self, table, column):
+        key = (table, column)
+        if key not in self._columns:
+            self._columns[key] = np.load(self._file(f"{table}.{column}.npy"), mmap_mode='r')
+        return self._columns[key]
+
+    def column(self, table, column):
+        key = (table, column)
+        if key not in self._columns:
+            if self.manifest['tables'][table]['columns'][column] == 'str':
+                offsets = np.load(self._file(f"{table}.{column}.offsets.npy"))
+                with open(self._file(f"{table}.{column}.bin"), 'rb') as f:
+                    blob = f.read()
+                self._columns[key] = np.array(
+                    [blob[start:stop].decode('utf-8') for start, stop in zip(offsets[:-1], offsets[1:])], dtype=object
+                )
+            else:
+                self._columns[key] = np.load(self._file(f"{table}.{column}.npy"), mmap_mode='r')
+        return self._columns[key]
+
+    def __getitem__(self, table):
+        if table not in self._frames:
+            info = self.manifest['tables'][table]
+            if 'columns' in info:
+                df = pd.DataFrame({column: self.column(table, column) for column in info['columns']})
+            else:
+                # Link tables: Categoricals over the keys of the referenced dimensions
+                df = pd.DataFrame({
+                    column: pd.Categorical.from_codes(
+                        np.asarray(self.codes(table, column)),
+                        categories=self[dimension].iloc[:, 0]
+                    )
+                    for column, dimension in info['references'].items()
+                })
+            self._frames[table] = df
+        return self._frames[table]
+
+    def __contains__(self, table):
+        return table in self.manifest['tables']
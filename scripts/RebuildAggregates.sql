@@ -0,0 +1,28 @@
+USE playlist_do_xet;
+
+-- Recomputes the summary tables from scratch. The loader keeps them up to date on every load,
+-- this is only needed to initialize them on an existing database or to repair them.
+
+START TRANSACTION;
+
+DELETE FROM UserGenreCounts;
+DELETE FROM GenreTrackCounts;
+DELETE FROM ArtistTrackCounts;
+DELETE FROM UserTrackCounts;
+
+INSERT INTO UserTrackCounts (user_id, track_count)
+SELECT user_id, COUNT(*) FROM UserTracks GROUP BY user_id;
+
+INSERT INTO ArtistTrackCounts (artist_id, track_count)
+SELECT artist_id, COUNT(*) FROM TrackArtists GROUP BY artist_id;
+
+INSERT INTO GenreTrackCounts (genre_id, track_count)
+SELECT genre_id, COUNT(*) FROM TrackGenres GROUP BY genre_id;
+
+INSERT INTO UserGenreCounts (user_id, genre_id, track_count)
+SELECT UT.user_id, TG.genre_id, COUNT(*)
+FROM UserTracks UT
+INNER JOIN TrackGenres TG ON UT.track_id = TG.track_id
+GROUP BY UT.user_id, TG.genre_id;
+
+COMMIT;
@@ -69,3 +69,53 @@ CREATE TABLE UserTracks (
     FOREIGN KEY (user_id) REFERENCES Users(user_id),
     FOREIGN KEY (track_id) REFERENCES Tracks(track_id)
 );
+
+-- SyncState table with the playlist snapshot and the last track index stored by the previous sync
+CREATE TABLE SyncState (
+    playlist_id      VARCHAR(255) PRIMARY KEY,
+    snapshot_id      VARCHAR(255) NOT NULL,
+    last_track_index INT,
+    synced_at        TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Summary tables maintained incrementally by the loader for the analytics notebooks
+
+-- UserTrackCounts table with the number of tracks added by each user
+CREATE TABLE UserTrackCounts (
+    user_id     VARCHAR(255) PRIMARY KEY,
+    track_count INT          NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (user_id) REFERENCES Users(user_id)
+);
+
+-- ArtistTrackCounts table with the number of tracks of each artist
+CREATE TABLE ArtistTrackCounts (
+    artist_id   VARCHAR(255) PRIMARY KEY,
+    track_count INT          NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (artist_id) REFERENCES Artists(artist_id)
+);
+
+-- GenreTrackCounts table with the number of tracks of each genre
+CREATE TABLE GenreTrackCounts (
+    genre_id    INT PRIMARY KEY,
+    track_count INT NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (genre_id) REFERENCES Genres(genre_id)
+);
+
+-- UserGenreCounts table with the number of tracks of each genre added by each user
+CREATE TABLE UserGenreCounts (
+    user_id     VARCHAR(255),
+    genre_id    INT,
+    track_count INT NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (user_id, genre_id),
+    FOREIGN KEY (user_id) REFERENCES Users(user_id),
+    FOREIGN KEY (genre_id) REFERENCES Genres(genre_id)
+);
+
+-- Later changes live in scripts/migrations: after creating a database from this file, run
+-- "python -m helper.migrate apply" from src to bring it to the latest version
+-- scripts/SchemaSQLite.sql mirrors the migrated schema for the embedded SQLite backend: update
+-- it along with every new migration
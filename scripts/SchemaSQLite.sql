@@ -0,0 +1,154 @@
+-- The schema of scripts/Schema.sql with every migration of scripts/migrations applied, for the
+-- embedded SQLite backend (STORAGE_BACKEND=sqlite). lib.storage runs it on every new database
+-- file, so every statement must be idempotent. Keep it in sync with the migrations.
+
+
+-- Users table with user_id as primary key
+CREATE TABLE IF NOT EXISTS Users (
+    user_id   VARCHAR(255) PRIMARY KEY,
+    user_name VARCHAR(255)
+);
+
+-- Artists table with artist_id as primary key
+CREATE TABLE IF NOT EXISTS Artists (
+    artist_id   VARCHAR(255) PRIMARY KEY,
+    artist_name VARCHAR(255) NOT NULL
+);
+
+-- Genres table with genre_id as primary key and a unique genre_name
+CREATE TABLE IF NOT EXISTS Genres (
+    genre_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+    genre_name VARCHAR(255) NOT NULL,
+
+    CONSTRAINT uq_genres_genre_name UNIQUE (genre_name)
+);
+
+-- Tracks table with track_id as primary key and added_by as foreign key referencing Users
+CREATE TABLE IF NOT EXISTS Tracks (
+    track_id       VARCHAR(255) PRIMARY KEY,
+    track_name     VARCHAR(255) NOT NULL,
+    track_album    VARCHAR(255),
+    track_duration INT          NOT NULL,
+    added_by       VARCHAR(255) NOT NULL,
+
+    FOREIGN KEY (added_by) REFERENCES Users(user_id)
+);
+
+-- TrackArtists table for many-to-many relationship between Tracks and Artists
+CREATE TABLE IF NOT EXISTS TrackArtists (
+    track_id  VARCHAR(255),
+    artist_id VARCHAR(255),
+
+    PRIMARY KEY (track_id, artist_id),
+    FOREIGN KEY (track_id) REFERENCES Tracks(track_id),
+    FOREIGN KEY (artist_id) REFERENCES Artists(artist_id)
+);
+
+-- ArtistGenres table for many-to-many relationship between Artists and Genres
+CREATE TABLE IF NOT EXISTS ArtistGenres (
+    artist_id VARCHAR(255),
+    genre_id  INT,
+
+    PRIMARY KEY (artist_id, genre_id),
+    FOREIGN KEY (artist_id) REFERENCES Artists(artist_id),
+    FOREIGN KEY (genre_id) REFERENCES Genres(genre_id)
+);
+
+-- UserTracks table for many-to-many relationship between Users and Tracks
+CREATE TABLE IF NOT EXISTS UserTracks (
+    user_id  VARCHAR(255),
+    track_id VARCHAR(255),
+
+    PRIMARY KEY (user_id, track_id),
+    FOREIGN KEY (user_id) REFERENCES Users(user_id),
+    FOREIGN KEY (track_id) REFERENCES Tracks(track_id)
+);
+
+-- InnoDB indexes the track_id foreign key by itself, SQLite doesn't, and the loader looks
+-- UserTracks up by track_id
+CREATE INDEX IF NOT EXISTS idx_user_tracks_track_id ON UserTracks (track_id);
+
+-- The genres of every track, derived from the genres of its artists
+CREATE VIEW IF NOT EXISTS TrackGenres AS
+SELECT DISTINCT TA.track_id, AG.genre_id
+FROM TrackArtists TA
+INNER JOIN ArtistGenres AG ON TA.artist_id = AG.artist_id;
+
+-- SyncState table with the playlist snapshot and the last track index stored by the previous sync
+CREATE TABLE IF NOT EXISTS SyncState (
+    playlist_id      VARCHAR(255) PRIMARY KEY,
+    snapshot_id      VARCHAR(255) NOT NULL,
+    last_track_index INT,
+    synced_at        TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- SQLite has no ON UPDATE CURRENT_TIMESTAMP
+CREATE TRIGGER IF NOT EXISTS SyncStateSyncedAt AFTER UPDATE OF snapshot_id, last_track_index ON SyncState
+BEGIN
+    UPDATE SyncState SET synced_at = CURRENT_TIMESTAMP WHERE playlist_id = NEW.playlist_id;
+END;
+
+-- Summary tables maintained incrementally by the loader for the analytics notebooks
+
+-- UserTrackCounts table with the number of tracks added by each user
+CREATE TABLE IF NOT EXISTS UserTrackCounts (
+    user_id     VARCHAR(255) PRIMARY KEY,
+    track_count INT          NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (user_id) REFERENCES Users(user_id)
+);
+
+-- ArtistTrackCounts table with the number of tracks of each artist
+CREATE TABLE IF NOT EXISTS ArtistTrackCounts (
+    artist_id   VARCHAR(255) PRIMARY KEY,
+    track_count INT          NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (artist_id) REFERENCES Artists(artist_id)
+);
+
+-- GenreTrackCounts table with the number of tracks of each genre
+CREATE TABLE IF NOT EXISTS GenreTrackCounts (
+    genre_id    INT PRIMARY KEY,
+    track_count INT NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (genre_id) REFERENCES Genres(genre_id)
+);
+
+-- UserGenreCounts table with the number of tracks of each genre added by each user
+CREATE TABLE IF NOT EXISTS UserGenreCounts (
+    user_id     VARCHAR(255),
+    genre_id    INT,
+    track_count INT NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (user_id, genre_id),
+    FOREIGN KEY (user_id) REFERENCES Users(user_id),
+    FOREIGN KEY (genre_id) REFERENCES Genres(genre_id)
+);
+
+-- The positional tables of migration 0005, replaced by the chunks of migration 0006
+DROP TABLE IF EXISTS PlaylistPages;
+DROP TABLE IF EXISTS PlaylistTracks;
+
+-- PlaylistChunks table with the content-defined chunks of every playlist synced in reconcile mode
+CREATE TABLE IF NOT EXISTS PlaylistChunks (
+    playlist_id VARCHAR(255),
+    fingerprint CHAR(16),
+    occurrences INT NOT NULL,
+
+    PRIMARY KEY (playlist_id, fingerprint)
+);
+
+-- PlaylistItems table with the items of those chunks
+CREATE TABLE IF NOT EXISTS PlaylistItems (
+    playlist_id VARCHAR(255),
+    chunk       CHAR(16),
+    item_offset INT,
+    track_id    VARCHAR(255) NOT NULL,
+    added_by    VARCHAR(255) NOT NULL,
+
+    PRIMARY KEY (playlist_id, chunk, item_offset),
+    FOREIGN KEY (track_id) REFERENCES Tracks(track_id),
+    FOREIGN KEY (added_by) REFERENCES Users(user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_playlist_items_track_id ON PlaylistItems (track_id, added_by);
@@ -0,0 +1,61 @@
+-- Brings databases created before SyncState and the summary tables up to scripts/Schema.sql.
+-- Every statement is a no-op on a database created from the current Schema.sql.
+
+CREATE TABLE IF NOT EXISTS SyncState (
+    playlist_id      VARCHAR(255) PRIMARY KEY,
+    snapshot_id      VARCHAR(255) NOT NULL,
+    last_track_index INT,
+    synced_at        TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS UserTrackCounts (
+    user_id     VARCHAR(255) PRIMARY KEY,
+    track_count INT          NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (user_id) REFERENCES Users(user_id)
+);
+
+CREATE TABLE IF NOT EXISTS ArtistTrackCounts (
+    artist_id   VARCHAR(255) PRIMARY KEY,
+    track_count INT          NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (artist_id) REFERENCES Artists(artist_id)
+);
+
+CREATE TABLE IF NOT EXISTS GenreTrackCounts (
+    genre_id    INT PRIMARY KEY,
+    track_count INT NOT NULL DEFAULT 0,
+
+    FOREIGN KEY (genre_id) REFERENCES Genres(genre_id)
+);
+
+CREATE TABLE IF NOT EXISTS UserGenreCounts (
+    user_id     VARCHAR(255),
+    genre_id    INT,
+    track_count INT NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (user_id, genre_id),
+    FOREIGN KEY (user_id) REFERENCES Users(user_id),
+    FOREIGN KEY (genre_id) REFERENCES Genres(genre_id)
+);
+
+-- Fill the summary tables from the relations loaded before they existed
+DELETE FROM UserGenreCounts;
+DELETE FROM GenreTrackCounts;
+DELETE FROM ArtistTrackCounts;
+DELETE FROM UserTrackCounts;
+
+INSERT INTO UserTrackCounts (user_id, track_count)
+SELECT user_id, COUNT(*) FROM UserTracks GROUP BY user_id;
+
+INSERT INTO ArtistTrackCounts (artist_id, track_count)
+SELECT artist_id, COUNT(*) FROM TrackArtists GROUP BY artist_id;
+
+INSERT INTO GenreTrackCounts (genre_id, track_count)
+SELECT genre_id, COUNT(*) FROM TrackGenres GROUP BY genre_id;
+
+INSERT INTO UserGenreCounts (user_id, genre_id, track_count)
+SELECT UT.user_id, TG.genre_id, COUNT(*)
+FROM UserTracks UT
+INNER JOIN TrackGenres TG ON UT.track_id = TG.track_id
+GROUP BY UT.user_id, TG.genre_id;
@@ -0,0 +1,40 @@
+-- Makes genre_name a unique key: genre lookups become index probes and INSERT IGNORE can no
+-- longer create duplicated genres when loads run concurrently.
+
+-- Merge the genres already duplicated into the one with the lowest ID
+CREATE TEMPORARY TABLE GenreDuplicates AS
+SELECT G.genre_id, K.keep_id
+FROM Genres G
+INNER JOIN (
+    SELECT genre_name, MIN(genre_id) AS keep_id FROM Genres GROUP BY genre_name HAVING COUNT(*) > 1
+) K ON G.genre_name = K.genre_name
+WHERE G.genre_id <> K.keep_id;
+
+INSERT IGNORE INTO TrackGenres (track_id, genre_id)
+SELECT TG.track_id, D.keep_id FROM TrackGenres TG INNER JOIN GenreDuplicates D ON TG.genre_id = D.genre_id;
+
+DELETE TG FROM TrackGenres TG INNER JOIN GenreDuplicates D ON TG.genre_id = D.genre_id;
+
+INSERT IGNORE INTO ArtistGenres (artist_id, genre_id)
+SELECT AG.artist_id, D.keep_id FROM ArtistGenres AG INNER JOIN GenreDuplicates D ON AG.genre_id = D.genre_id;
+
+DELETE AG FROM ArtistGenres AG INNER JOIN GenreDuplicates D ON AG.genre_id = D.genre_id;
+
+-- The genre summary tables are recomputed below, once the duplicates are gone
+DELETE FROM UserGenreCounts;
+DELETE FROM GenreTrackCounts;
+
+DELETE G FROM Genres G INNER JOIN GenreDuplicates D ON G.genre_id = D.genre_id;
+
+DROP TEMPORARY TABLE GenreDuplicates;
+
+ALTER TABLE Genres ADD CONSTRAINT uq_genres_genre_name UNIQUE (genre_name);
+
+INSERT INTO GenreTrackCounts (genre_id, track_count)
+SELECT genre_id, COUNT(*) FROM TrackGenres GROUP BY genre_id;
+
+INSERT INTO UserGenreCounts (user_id, genre_id, track_count)
+SELECT UT.user_id, TG.genre_id, COUNT(*)
+FROM UserTracks UT
+INNER JOIN TrackGenres TG ON UT.track_id = TG.track_id
+GROUP BY UT.user_id, TG.genre_id;
@@ -0,0 +1,35 @@
+-- Stores the genres once per artist in ArtistGenres and replaces the TrackGenres table, which
+-- repeated them for every track of the artist, with a view deriving them from TrackArtists.
+
+-- Every track has the union of the genres of its artists, so the genres shared by all the
+-- tracks of an artist contain its own genres and are contained in each of its tracks' genres:
+-- the view below returns exactly the rows of the table it replaces.
+INSERT IGNORE INTO ArtistGenres (artist_id, genre_id)
+SELECT TA.artist_id, TG.genre_id
+FROM TrackArtists TA
+INNER JOIN TrackGenres TG ON TA.track_id = TG.track_id
+INNER JOIN (
+    SELECT artist_id, COUNT(*) AS track_count FROM TrackArtists GROUP BY artist_id
+) N ON N.artist_id = TA.artist_id
+GROUP BY TA.artist_id, TG.genre_id, N.track_count
+HAVING COUNT(*) = N.track_count;
+
+DROP TABLE TrackGenres;
+
+CREATE VIEW TrackGenres AS
+SELECT DISTINCT TA.track_id, AG.genre_id
+FROM TrackArtists TA
+INNER JOIN ArtistGenres AG ON TA.artist_id = AG.artist_id;
+
+-- Recount the genres from the view, in case some tracks didn't match the genres of their artists
+DELETE FROM UserGenreCounts;
+DELETE FROM GenreTrackCounts;
+
+INSERT INTO GenreTrackCounts (genre_id, track_count)
+SELECT genre_id, COUNT(*) FROM TrackGenres GROUP BY genre_id;
+
+INSERT INTO UserGenreCounts (user_id, genre_id, track_count)
+SELECT UT.user_id, TG.genre_id, COUNT(*)
+FROM UserTracks UT
+INNER JOIN TrackGenres TG ON UT.track_id = TG.track_id
+GROUP BY UT.user_id, TG.genre_id;
@@ -0,0 +1,23 @@
+-- Stores the items of every playlist synced in reconcile mode (SYNC_MODE=reconcile) and a
+-- fingerprint of each of their pages, so a sync only diffs the pages that changed.
+-- The tables start empty: the first reconciliation of a playlist records all its items.
+
+CREATE TABLE PlaylistTracks (
+    playlist_id VARCHAR(255),
+    position    INT,
+    track_id    VARCHAR(255) NOT NULL,
+    added_by    VARCHAR(255) NOT NULL,
+
+    PRIMARY KEY (playlist_id, position),
+    INDEX idx_playlist_tracks_track_id (track_id, added_by),
+    FOREIGN KEY (track_id) REFERENCES Tracks(track_id),
+    FOREIGN KEY (added_by) REFERENCES Users(user_id)
+);
+
+CREATE TABLE PlaylistPages (
+    playlist_id VARCHAR(255),
+    page_index  INT,
+    fingerprint CHAR(16) NOT NULL,
+
+    PRIMARY KEY (playlist_id, page_index)
+);
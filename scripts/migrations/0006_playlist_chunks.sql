@@ -0,0 +1,29 @@
+-- Replaces the positional pages of migration 0005 with content-defined chunks (see
+-- src/reconcile_playlist.py): the items are stored per chunk, so an item inserted or deleted
+-- mid-playlist only rewrites the chunk holding it instead of every later position.
+-- The reconciled playlists record all their items again on their next sync. Until then they
+-- have no stored chunk and count as synced in append mode, so no track is deleted on their account.
+
+DROP TABLE IF EXISTS PlaylistPages;
+DROP TABLE IF EXISTS PlaylistTracks;
+
+CREATE TABLE PlaylistChunks (
+    playlist_id VARCHAR(255),
+    fingerprint CHAR(16),
+    occurrences INT NOT NULL,
+
+    PRIMARY KEY (playlist_id, fingerprint)
+);
+
+CREATE TABLE PlaylistItems (
+    playlist_id VARCHAR(255),
+    chunk       CHAR(16),
+    item_offset INT,
+    track_id    VARCHAR(255) NOT NULL,
+    added_by    VARCHAR(255) NOT NULL,
+
+    PRIMARY KEY (playlist_id, chunk, item_offset),
+    INDEX idx_playlist_items_track_id (track_id, added_by),
+    FOREIGN KEY (track_id) REFERENCES Tracks(track_id),
+    FOREIGN KEY (added_by) REFERENCES Users(user_id)
+);
@@ -0,0 +1,84 @@
+"""
+Compares the per-row and the bulk write paths of DatabaseLoader.
+
+It needs a scratch MySQL database created from scripts/Schema.sql and migrated, or with
+--backend sqlite the path of a scratch SQLite file (created on first use), which is emptied
+before every measurement. Run it from the src folder:
+
+    python -m benchmarks.bench_loader --database playlist_do_xet_bench --sizes 1000 10000 100000
+    python -m benchmarks.bench_loader --backend sqlite --database /tmp/bench.sqlite --sizes 1000 10000
+"""
+from benchmarks.synthetic import generate_track_batch
+from classes.DatabaseLoader import DatabaseLoader
+from dotenv import load_dotenv
+from lib.storage import DEFAULT_SQLITE_PATH, MySQLBackend, SQLiteBackend, set_backend
+
+import argparse
+import os
+import time
+
+
+# Children first, so the foreign keys are never violated
+TABLES = (
+    "PlaylistItems", "PlaylistChunks",
+    "UserGenreCounts", "GenreTrackCounts", "ArtistTrackCounts", "UserTrackCounts",
+    "UserTracks", "TrackArtists", "ArtistGenres", "Tracks", "Genres", "Artists", "Users")
+
+
+def select_backend(parser, backend, database):
+    """
+    Points the storage backend of the process at the scratch database, refusing the production one.
+    """
+    if backend == "sqlite":
+        production = os.path.abspath(os.getenv("SQLITE_PATH", DEFAULT_SQLITE_PATH))
+        if os.path.abspath(database) == production:
+            parser.error("refusing to empty the production database, use a scratch one")
+        # The loads without an explicit database go to the backend's default file
+        set_backend(SQLiteBackend(database))
+    else:
+        if database == os.getenv("DB_CONNECTION_DATABASE"):
+            parser.error("refusing to empty the production database, use a scratch one")
+        set_backend(MySQLBackend())
+
+
+def reset_database(database):
+    mydb = DatabaseLoader.establish_connection(database)
+    mycursor = mydb.cursor()
+    for table in TABLES:
+        mycursor.execute(f"DELETE FROM {table}")
+    mydb.commit()
+    mydb.close()
+
+
+def run(database, sizes, modes, chunk_size):
+    results = []
+    for size in sizes:
+        processed_tracks = generate_track_batch(size)
+        for mode in modes:
+            reset_database(database)
+            started = time.perf_counter()
+            if mode == "row":
+                DatabaseLoader.csv_to_db(processed_tracks, database=database)
+            else:
+                DatabaseLoader.bulk_csv_to_db(processed_tracks, chunk_size=chunk_size, database=database)
+            elapsed = time.perf_counter() - started
+            results.append((size, mode, elapsed))
+
+    print(f"\n{'tracks':>8} {'mode':>5} {'seconds':>10} {'tracks/s':>10}")
+    for size, mode, elapsed in results:
+        print(f"{size:>8} {mode:>5} {elapsed:>10.2f} {size / elapsed:>10.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", required=True, help="scratch database (SQLite file) emptied before every run")
+    parser.add_argument("--backend", choices=("mysql", "sqlite"), default=None, help="defaults to STORAGE_BACKEND or mysql")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--modes", nargs="+", choices=("row", "bulk"), default=["row", "bulk"])
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    load_dotenv()
+    select_backend(parser, args.backend or os.getenv("STORAGE_BACKEND", "mysql"), args.database)
+
+    run(args.database, args.sizes, args.modes, args.chunk_size)
@@ -0,0 +1,52 @@
+"""
+Measures the memory held by processed tracks as lists of tuples versus a TrackBatch.
+
+Run it from the src folder:
+
+    python -m benchmarks.bench_memory --sizes 1000 10000 100000
+"""
+from benchmarks.synthetic import generate_processed_tracks
+from classes.TrackBatch import TrackBatch
+from classes.TrackRecord import TrackRecord
+
+import argparse
+import gc
+import pickle
+import tracemalloc
+
+
+def measure(build):
+    """
+    Returns the bytes and the number of memory blocks still allocated by the object build() returns.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del result
+    return sum(stat.size for stat in snapshot.statistics("filename")), sum(stat.count for stat in snapshot.statistics("filename"))
+
+
+def run(sizes):
+    print(f"{'tracks':>8} {'representation':>16} {'MiB':>8} {'bytes/track':>12} {'allocations':>12}")
+    for size in sizes:
+        # Round-trip through pickle so every representation starts from fresh strings, like rows decoded from the API
+        serialized = pickle.dumps(generate_processed_tracks(size))
+
+        representations = (
+            ("tuples", lambda: pickle.loads(serialized)),
+            ("TrackRecords", lambda: [TrackRecord(*row) for row in pickle.loads(serialized)]),
+            ("TrackBatch", lambda: TrackBatch.from_records(TrackRecord(*row) for row in pickle.loads(serialized))),
+        )
+        for name, build in representations:
+            size_bytes, blocks = measure(build)
+            print(f"{size:>8} {name:>16} {size_bytes / 2**20:>8.2f} {size_bytes / size:>12.0f} {blocks:>12}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+    run(args.sizes)
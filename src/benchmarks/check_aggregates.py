@@ -0,0 +1,105 @@
+"""
+Checks that the summary tables maintained by the loader match a full recompute.
+
+Loads synthetic tracks with duplicates (the same row twice, and the same track added by a
+second user) in several loads through each write path of DatabaseLoader, then compares
+every summary table with the queries of scripts/RebuildAggregates.sql. It needs a scratch
+database like bench_loader, which is emptied before every load. Run it from the src folder:
+
+    python -m benchmarks.check_aggregates --backend sqlite --database /tmp/check.sqlite
+"""
+from benchmarks.bench_loader import reset_database, select_backend
+from benchmarks.synthetic import generate_processed_tracks
+from classes.DatabaseLoader import AGGREGATE_KEYS, DatabaseLoader
+from classes.TrackBatch import TrackBatch
+from classes.TrackRecord import TrackRecord
+from dotenv import load_dotenv
+
+import argparse
+import os
+import random
+import re
+
+
+REBUILD_AGGREGATES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "RebuildAggregates.sql")
+
+
+def rebuild_queries():
+    """
+    Returns the SELECT of every INSERT of scripts/RebuildAggregates.sql, keyed by summary table.
+    """
+    with open(REBUILD_AGGREGATES, encoding='utf-8') as f:
+        script = f.read()
+    return {
+        table: select
+        for table, select in re.findall(r"INSERT INTO (\w+) \([^)]*\)\s*(SELECT .*?);", script, re.DOTALL)
+    }
+
+
+def tracks_with_duplicates(n_tracks, seed=0):
+    """
+    Returns synthetic processed tracks where some rows repeat and some tracks are added again
+    by another user.
+    """
+    rng = random.Random(seed)
+    rows = generate_processed_tracks(n_tracks, seed)
+    users = list({(row[7], row[8]) for row in rows})
+
+    duplicates = []
+    for row in rng.sample(rows, n_tracks // 10):
+        duplicates.append(row)
+        user_id, user_name = rng.choice(users)
+        duplicates.append(row[:7] + (user_id, user_name))
+
+    rows = rows + duplicates
+    rng.shuffle(rows)
+    return rows
+
+
+def check(database, n_tracks, loads, mode, chunk_size):
+    reset_database(database)
+
+    rows = tracks_with_duplicates(n_tracks)
+    step = -(-len(rows) // loads)
+    for start in range(0, len(rows), step):
+        batch = TrackBatch.from_records(TrackRecord(*row) for row in rows[start:start + step])
+        if mode == "row":
+            DatabaseLoader.csv_to_db(batch, database=database)
+        else:
+            DatabaseLoader.bulk_csv_to_db(batch, chunk_size=chunk_size, database=database)
+
+    mydb = DatabaseLoader.establish_connection(database)
+    mycursor = mydb.cursor()
+    mismatches = {}
+    for table, select in rebuild_queries().items():
+        mycursor.execute(select)
+        expected = {tuple(row[:-1]): row[-1] for row in mycursor.fetchall()}
+        mycursor.execute(f"SELECT {', '.join(AGGREGATE_KEYS[table])}, track_count FROM {table} WHERE track_count <> 0")
+        stored = {tuple(row[:-1]): row[-1] for row in mycursor.fetchall()}
+        wrong = sum(1 for key in expected.keys() | stored.keys() if expected.get(key) != stored.get(key))
+        if wrong:
+            mismatches[table] = wrong
+    mydb.close()
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", required=True, help="scratch database (SQLite file) emptied before every load")
+    parser.add_argument("--backend", choices=("mysql", "sqlite"), default=None, help="defaults to STORAGE_BACKEND or mysql")
+    parser.add_argument("--tracks", type=int, default=2000)
+    parser.add_argument("--loads", type=int, default=3, help="the number of loads the tracks are split into")
+    parser.add_argument("--modes", nargs="+", choices=("row", "bulk"), default=["row", "bulk"])
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    load_dotenv()
+    select_backend(parser, args.backend or os.getenv("STORAGE_BACKEND", "mysql"), args.database)
+
+    failed = False
+    for mode in args.modes:
+        mismatches = check(args.database, args.tracks, args.loads, mode, args.chunk_size)
+        print(f"{mode:>5}: {'OK' if not mismatches else f'wrong rows per table {mismatches}'}")
+        failed = failed or bool(mismatches)
+
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,129 @@
+from collections import Counter
+
+import ast
+import csv
+import os
+import threading
+import time
+
+
+DEFAULT_SEED_CSV = os.path.join(os.path.dirname(__file__), "..", "..", "deprecated", "data", "playlist_data_cache.csv")
+
+
+class FakeSpotify:
+    """
+    An offline stand-in for the parts of spotipy.Spotify used by the pipeline.
+
+    It serves a synthetic playlist built from the rows of playlist_data_cache.csv, repeated
+    (with suffixed track IDs) until the requested size is reached, so the artists, genres and
+    contributors keep the distribution of the real playlist. Every call sleeps for `latency`
+    seconds and is counted per endpoint.
+
+    ...
+
+    Methods
+    -------
+    playlist(playlist_id, fields):
+        Returns the snapshot_id and the total of the playlist.
+
+    playlist_tracks(playlist_id, offset, limit):
+        Returns a page of playlist items.
+
+    artists(artists):
+        Returns several artists by ID.
+
+    user(user):
+        Returns the profile of a user.
+
+    search(q, type):
+        Searches an artist by name.
+
+    stats():
+        Returns the number of calls per endpoint.
+    """
+
+    def __init__(self, n_tracks, latency=0.0, csv_path=None, snapshot_id="fake-snapshot"):
+        self.latency     = latency
+        self.snapshot_id = snapshot_id
+        self.calls       = Counter()
+
+        self._lock    = threading.Lock()
+        self._items   = []
+        self._artists = {}
+        self._users   = {}
+
+        with open(csv_path or DEFAULT_SEED_CSV, 'r', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+
+        for row in rows:
+            artist_ids   = ast.literal_eval(row['artist_id'])
+            artist_names = ast.literal_eval(row['artist_name'])
+            genres       = ast.literal_eval(row['genres'])
+            row['artists'] = [
+                {'id': artist_id, 'name': artist_name}
+                for artist_id, artist_name in zip(artist_ids, artist_names)
+            ]
+            for artist in row['artists']:
+                # The cache only has the union of the genres per track, good enough for a benchmark
+                if artist['id'] is not None:
+                    self._artists.setdefault(artist['id'], {'id': artist['id'], 'name': artist['name'], 'genres': genres})
+            self._users[row['user_id']] = {'id': row['user_id'], 'display_name': row['user_name']}
+
+        for i in range(n_tracks):
+            row  = rows[i % len(rows)]
+            copy = i // len(rows)
+            self._items.append({
+                'added_by': {'id': row['user_id']},
+                'track': {
+                    'id': row['track_id'] if copy == 0 else f"{row['track_id']}-{copy}",
+                    'name': row['track_name'],
+                    'album': {'name': row['track_album']},
+                    'artists': row['artists'],
+                    'duration_ms': int(row['track_duration'])
+                }
+            })
+
+    def _request(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def playlist(self, playlist_id, fields=None):
+        self._request("playlist")
+        return {'snapshot_id': self.snapshot_id, 'tracks': {'total': len(self._items)}}
+
+    def playlist_tracks(self, playlist_id, offset=0, limit=100, **kwargs):
+        self._request("playlist_tracks")
+        items = self._items[offset:offset + limit]
+        return {
+            'items': items,
+            'total': len(self._items),
+            'offset': offset,
+            'next': "next" if offset + limit < len(self._items) else None
+        }
+
+    def artists(self, artists):
+        self._request("artists")
+        return {'artists': [self._artists.get(artist_id) for artist_id in artists]}
+
+    def user(self, user):
+        self._request("user")
+        return self._users.get(user, {'id': user, 'display_name': user})
+
+    def search(self, q, limit=10, offset=0, type='track', **kwargs):
+        self._request("search")
+        name = q.split(':', 1)[-1]
+        matches = [artist for artist in self._artists.values() if artist['name'] == name]
+        return {'artists': {'items': matches[:limit]}}
+
+    def stats(self):
+        """
+        Returns the number of calls per endpoint.
+
+        Returns
+        -------
+        dict
+        """
+        with self._lock:
+            return dict(self.calls)
@@ -0,0 +1,107 @@
+"""
+End-to-end benchmark of the sync pipeline against the offline FakeSpotify backend.
+
+For every playlist size it runs fetch -> process -> load against a scratch MySQL database
+(created from scripts/Schema.sql, migrated and emptied before every run), or a scratch SQLite
+file with --backend sqlite, and reports the wall time, the API calls per endpoint and the DB
+round trips of each stage. Run it from the src folder:
+
+    python -m benchmarks.run_benchmark --database playlist_do_xet_bench --sizes 1000 10000 100000 --latency 0.05
+    python -m benchmarks.run_benchmark --backend sqlite --database /tmp/bench.sqlite --sizes 1000 10000 --latency 0
+"""
+from benchmarks.bench_loader import reset_database, select_backend
+from benchmarks.fake_spotify import FakeSpotify
+from classes.ArtistCache import ArtistCache
+from classes.DatabaseLoader import DatabaseLoader
+from dotenv import load_dotenv
+from fetch_tracks import fetch_tracks
+from lib import dbClient
+from lib.metrics import configure_logging, metrics
+from lib.rateLimiter import RateLimitedClient
+from pipeline import run_streaming_pipeline
+from process_tracks import process_tracks
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+
+def run_once(size, database, latency, mode, workers, rate, chunk_size):
+    fake = FakeSpotify(size, latency=latency)
+    sp   = RateLimitedClient(fake, rate=rate, burst=rate, max_concurrency=workers) if rate else fake
+
+    metrics.reset()
+    dbClient.set_connection_wrapper(metrics.wrap_connection)
+
+    # A fresh artist cache per run, so every run starts cold
+    cache_dir    = tempfile.mkdtemp(prefix="artist_cache_")
+    artist_cache = ArtistCache(path=os.path.join(cache_dir, "artists.sqlite"))
+
+    report = {'tracks': size, 'mode': mode, 'stages': {}}
+
+    def measure(stage, run):
+        calls_before, trips_before = sum(fake.stats().values()), metrics.db_round_trips()
+        started = time.perf_counter()
+        result  = run()
+        report['stages'][stage] = {
+            'seconds': round(time.perf_counter() - started, 3),
+            'api_calls': sum(fake.stats().values()) - calls_before,
+            'db_round_trips': metrics.db_round_trips() - trips_before
+        }
+        return result
+
+    known_users = measure("preload_users", DatabaseLoader.fetch_known_users)
+
+    if mode == "streaming":
+        measure("pipeline", lambda: run_streaming_pipeline(
+            sp, None, fetch_workers=workers, artist_cache=artist_cache, known_users=known_users,
+            user_workers=workers, chunk_size=chunk_size
+        ))
+    else:
+        tracks    = measure("fetch", lambda: fetch_tracks(sp, None, max_workers=workers))
+        processed = measure("process", lambda: process_tracks(sp, tracks, artist_cache, known_users, workers))
+        measure("load", lambda: DatabaseLoader.bulk_csv_to_db(processed, chunk_size=chunk_size, database=database))
+
+    artist_cache.close()
+    dbClient.set_connection_wrapper(None)
+
+    report['api_calls_per_endpoint'] = fake.stats()
+    report['db_statements_per_table'] = metrics.report()['db_statements']
+    report['rows_written'] = metrics.report()['rows_written']
+    report['total_seconds'] = round(sum(stage['seconds'] for stage in report['stages'].values()), 3)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", required=True, help="scratch database (SQLite file) emptied before every run")
+    parser.add_argument("--backend", choices=("mysql", "sqlite"), default=None, help="defaults to STORAGE_BACKEND or mysql")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds of simulated latency per API call")
+    parser.add_argument("--mode", choices=("batch", "streaming"), default="batch")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0, help="requests per second through RateLimitedClient, 0 to disable")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--output", help="write the reports to this JSON file")
+    args = parser.parse_args()
+
+    load_dotenv()
+    configure_logging()
+    select_backend(parser, args.backend or os.getenv("STORAGE_BACKEND", "mysql"), args.database)
+
+    # The pipeline loads through the default database, so point it at the scratch one
+    os.environ["DB_CONNECTION_DATABASE"] = args.database
+    os.environ["PLAYLIST_URI"] = "fake-playlist"
+
+    reports = []
+    for size in args.sizes:
+        reset_database(args.database)
+        report = run_once(size, args.database, args.latency, args.mode, args.workers, args.rate, args.chunk_size)
+        reports.append(report)
+        print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
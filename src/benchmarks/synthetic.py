@@ -0,0 +1,79 @@
+from classes.TrackBatch import TrackBatch
+from classes.TrackRecord import TrackRecord
+
+import random
+import string
+
+
+def _random_id(rng, length=22):
+    return "".join(rng.choice(string.ascii_letters + string.digits) for _ in range(length))
+
+
+def generate_processed_tracks(n_tracks, seed=0, n_users=15, n_genres=600):
+    """
+    Generates a synthetic list of processed tracks shaped like the output of process_tracks.
+
+    Artists are drawn from a pool with a skewed distribution so that, like in the real
+    playlist, a few artists and genres recur across many tracks.
+
+    Parameters
+    ----------
+    n_tracks : int
+        The number of tracks to generate.
+    seed : int, optional
+        The seed of the random generator, so runs are reproducible.
+    n_users : int, optional
+        The number of distinct contributors.
+    n_genres : int, optional
+        The number of distinct genres.
+
+    Returns
+    -------
+    list
+        A list of tuples in the form (track_id, track_name, track_album, artist_ids,
+        artist_names, track_duration, genres, user_id, user_name).
+    """
+    rng = random.Random(seed)
+
+    users   = [(_random_id(rng, 25).lower(), f"User {i}") for i in range(n_users)]
+    genres  = [f"genre {i}" for i in range(n_genres)]
+    artists = [
+        (_random_id(rng), f"Artist {i}", rng.sample(genres, rng.randint(0, 6)))
+        for i in range(max(1, n_tracks // 4))
+    ]
+
+    processed_tracks = []
+    for i in range(n_tracks):
+        # Skew the picks towards the start of the pools
+        track_artists = [artists[int(len(artists) * rng.random() ** 2)] for _ in range(rng.choice((1, 1, 1, 2, 3)))]
+        track_artists = list({artist[0]: artist for artist in track_artists}.values())
+        user_id, user_name = users[int(n_users * rng.random() ** 2)]
+
+        track_genres = set()
+        for artist in track_artists:
+            track_genres.update(artist[2])
+
+        processed_tracks.append((
+            _random_id(rng),
+            f"Track {i}",
+            f"Album {i // 10}",
+            [artist[0] for artist in track_artists],
+            [artist[1] for artist in track_artists],
+            rng.randint(90_000, 420_000),
+            list(track_genres),
+            user_id,
+            user_name
+        ))
+
+    return processed_tracks
+
+
+def generate_track_batch(n_tracks, seed=0, **kwargs):
+    """
+    Generates the same synthetic tracks as generate_processed_tracks, as a TrackBatch.
+
+    Returns
+    -------
+    classes.TrackBatch.TrackBatch
+    """
+    return TrackBatch.from_records(TrackRecord(*row) for row in generate_processed_tracks(n_tracks, seed, **kwargs))
@@ -0,0 +1,276 @@
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+load_dotenv()
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "artist_cache.sqlite")
+DEFAULT_TTL_DAYS   = 30
+DEFAULT_LRU_SIZE   = 5000
+
+# Artists the API can't resolve are retried sooner than the resolved ones expire
+DEFAULT_NEGATIVE_TTL_HOURS = 24
+
+
+class ArtistCache:
+    """
+    A persistent artist metadata cache (artist_id -> name, genres, fetched_at).
+
+    The entries are stored in a local SQLite file so they survive between runs, with a bounded
+    in-memory LRU in front of it so repeated lookups during a run don't touch the disk. Artists
+    the API can't resolve get a negative entry with a shorter TTL, so they aren't requested
+    again on every run.
+
+    ...
+
+    Attributes
+    ----------
+    hits : int
+        The number of lookups answered by the cache.
+    misses : int
+        The number of lookups that were missing or expired.
+
+    Methods
+    -------
+    get(artist_id):
+        Returns the cached entry of an artist, or None if it is missing or expired.
+
+    get_many(artist_ids):
+        Returns the cached entries of the given artists and the IDs that still need to be fetched.
+
+    put(artist_id, artist_name, genres):
+        Stores the metadata of an artist.
+
+    put_many(artists):
+        Stores the metadata of several artists in a single transaction.
+
+    put_unresolved(artist_ids):
+        Stores negative entries for artists the API can't resolve.
+
+    stats():
+        Returns the hit/miss counters of the cache.
+
+    close():
+        Closes the underlying SQLite connection.
+    """
+
+    def __init__(self, path=None, ttl_days=None, lru_size=None, negative_ttl_hours=None):
+        """
+        Parameters
+        ----------
+        path : str, optional
+            The path of the SQLite file. Defaults to the ARTIST_CACHE_PATH environment variable.
+        ttl_days : float, optional
+            How long an entry stays valid. Defaults to the ARTIST_CACHE_TTL_DAYS environment variable.
+        lru_size : int, optional
+            The maximum number of entries kept in memory. Defaults to the ARTIST_CACHE_LRU_SIZE environment variable.
+        negative_ttl_hours : float, optional
+            How long a negative entry stays valid. Defaults to the ARTIST_CACHE_NEGATIVE_TTL_HOURS environment variable.
+        """
+        self.path     = path or os.getenv("ARTIST_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.ttl      = float(ttl_days if ttl_days is not None else os.getenv("ARTIST_CACHE_TTL_DAYS", DEFAULT_TTL_DAYS)) * 86400
+        self.lru_size = int(lru_size if lru_size is not None else os.getenv("ARTIST_CACHE_LRU_SIZE", DEFAULT_LRU_SIZE))
+        self.negative_ttl = float(
+            negative_ttl_hours if negative_ttl_hours is not None
+            else os.getenv("ARTIST_CACHE_NEGATIVE_TTL_HOURS", DEFAULT_NEGATIVE_TTL_HOURS)
+        ) * 3600
+
+        self.hits   = 0
+        self.misses = 0
+
+        self._lru  = OrderedDict()
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS artists ("
+            "artist_id TEXT PRIMARY KEY, artist_name TEXT, genres TEXT NOT NULL, fetched_at REAL NOT NULL, "
+            "resolved INTEGER NOT NULL DEFAULT 1)"
+        )
+        # Cache files created before the negative entries
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(artists)")}
+        if "resolved" not in columns:
+            self._db.execute("ALTER TABLE artists ADD COLUMN resolved INTEGER NOT NULL DEFAULT 1")
+        self._db.commit()
+
+    def _is_fresh(self, entry, now):
+        return now - entry['fetched_at'] < (self.ttl if entry['resolved'] else self.negative_ttl)
+
+    def _remember(self, artist_id, entry):
+        # Move the entry to the most recently used end and evict the least recently used ones
+        self._lru[artist_id] = entry
+        self._lru.move_to_end(artist_id)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def _lookup(self, artist_id, now):
+        entry = self._lru.get(artist_id)
+        if entry is None:
+            row = self._db.execute(
+                "SELECT artist_name, genres, fetched_at, resolved FROM artists WHERE artist_id = ?", (artist_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            entry = {'name': row[0], 'genres': json.loads(row[1]), 'fetched_at': row[2], 'resolved': bool(row[3])}
+
+        if not self._is_fresh(entry, now):
+            self._lru.pop(artist_id, None)
+            return None
+
+        self._remember(artist_id, entry)
+        return entry
+
+    def get(self, artist_id):
+        """
+        Returns the cached entry of an artist, or None if it is missing or expired.
+
+        Parameters
+        ----------
+        artist_id : str
+            The ID of the artist.
+
+        Returns
+        -------
+        dict or None
+            A dictionary with the keys 'name', 'genres', 'fetched_at' and 'resolved' (False for
+            a negative entry, with no name nor genres).
+        """
+        with self._lock:
+            entry = self._lookup(artist_id, time.time())
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def get_many(self, artist_ids):
+        """
+        Returns the cached entries of the given artists and the IDs that still need to be fetched.
+
+        Parameters
+        ----------
+        artist_ids : iterable of str
+            The IDs of the artists.
+
+        Returns
+        -------
+        tuple
+            A (found, missing) pair where found maps each cached artist ID to its entry and
+            missing is the list of IDs that are not cached or have expired.
+        """
+        found   = {}
+        missing = []
+        now     = time.time()
+        with self._lock:
+            for artist_id in artist_ids:
+                entry = self._lookup(artist_id, now)
+                if entry is None:
+                    missing.append(artist_id)
+                else:
+                    found[artist_id] = entry
+            self.hits   += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put(self, artist_id, artist_name, genres):
+        """
+        Stores the metadata of an artist.
+
+        Parameters
+        ----------
+        artist_id : str
+            The ID of the artist.
+        artist_name : str
+            The name of the artist.
+        genres : list of str
+            The genres of the artist.
+
+        Returns
+        -------
+        None
+        """
+        self.put_many({artist_id: (artist_name, genres)})
+
+    def put_many(self, artists):
+        """
+        Stores the metadata of several artists in a single transaction.
+
+        Parameters
+        ----------
+        artists : dict
+            A dictionary mapping each artist ID to an (artist_name, genres) pair.
+
+        Returns
+        -------
+        None
+        """
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO artists (artist_id, artist_name, genres, fetched_at, resolved) VALUES (?, ?, ?, ?, 1)",
+                [(artist_id, name, json.dumps(genres), now) for artist_id, (name, genres) in artists.items()]
+            )
+            self._db.commit()
+            for artist_id, (name, genres) in artists.items():
+                self._remember(artist_id, {'name': name, 'genres': list(genres), 'fetched_at': now, 'resolved': True})
+
+    def put_unresolved(self, artist_ids):
+        """
+        Stores negative entries for artists the API can't resolve, valid for the negative TTL.
+
+        Parameters
+        ----------
+        artist_ids : iterable of str
+            The IDs of the artists.
+
+        Returns
+        -------
+        None
+        """
+        artist_ids = list(artist_ids)
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO artists (artist_id, artist_name, genres, fetched_at, resolved) VALUES (?, NULL, '[]', ?, 0)",
+                [(artist_id, now) for artist_id in artist_ids]
+            )
+            self._db.commit()
+            for artist_id in artist_ids:
+                self._remember(artist_id, {'name': None, 'genres': [], 'fetched_at': now, 'resolved': False})
+
+    def stats(self):
+        """
+        Returns the hit/miss counters of the cache.
+
+        Returns
+        -------
+        dict
+            A dictionary with the number of hits, misses and the hit ratio.
+        """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0
+        }
+
+    def close(self):
+        """
+        Closes the underlying SQLite connection.
+
+        Returns
+        -------
+        None
+        """
+        with self._lock:
+            self._db.close()
@@ -1,65 +1,138 @@
-import mysql.connector
-from dotenv import load_dotenv
+from classes.DimensionKeyCache import DimensionKeyCache
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from lib.metrics import metrics
+from lib.storage import get_backend
 
-import os
+import logging
+
+
+# Maximum number of rows sent in a single multi-row INSERT statement
+INSERT_BATCH_SIZE = 1000
+
+# Primary key columns of the summary tables maintained by the loader
+AGGREGATE_KEYS = {
+    "UserTrackCounts": ("user_id",),
+    "ArtistTrackCounts": ("artist_id",),
+    "GenreTrackCounts": ("genre_id",),
+    "UserGenreCounts": ("user_id", "genre_id"),
+}
+
+logger = logging.getLogger(__name__)
 
 
 class DatabaseLoader:
     """
     A class used to load data from a CSV file into a MySQL database.
 
+    The SQL that differs between databases comes from the storage backend of lib.storage, so
+    the same methods also load into the embedded SQLite backend.
+
     ...
 
     Methods
     -------
     establish_connection():
-        Establishes a connection to the MySQL database.
+        Establishes a connection to the database of the storage backend.
 
-    insert_user_if_not_exists(mycursor, row):
+    fetch_known_users():
+        Returns every user already stored in the Users table.
+
+    insert_user_if_not_exists(mycursor, row, key_cache):
         Inserts a new user into the Users table if the user does not already exist.
 
     insert_track_if_not_exists(mycursor, row):
         Inserts a new track into the Tracks table if the track does not already exist.
 
-    insert_artist_if_not_exists(mycursor, artist_id, artist_name):
+    insert_artist_if_not_exists(mycursor, artist_id, artist_name, key_cache):
         Inserts a new artist into the Artists table if the artist does not already exist.
 
     insert_track_artist_relation_if_not_exists(mycursor, row, artist_id):
         Inserts a new track-artist relation into the TrackArtists table if the relation does not already exist.
 
-    insert_genre_if_not_exists(mycursor, genre):
+    insert_genre_if_not_exists(mycursor, genre, key_cache):
         Inserts a new genre into the Genres table if the genre does not already exist.
 
-    insert_track_genre_relation_if_not_exists(mycursor, row, genre_id):
-        Inserts a new track-genre relation into the TrackGenres table if the relation does not already exist.
+    insert_artist_genre_relation_if_not_exists(mycursor, artist_id, genre_id):
+        Inserts a new artist-genre relation into the ArtistGenres table if the relation does not already exist.
 
     insert_user_track_relation_if_not_exists(mycursor, row):
         Inserts a new user-track relation into the UserTracks table if the relation does not already exist.
 
     csv_to_db(csv_file):
         Loads data from a CSV file into the MySQL database.
+
+    insert_ignore_many(mycursor, table, columns, rows):
+        Inserts several rows into a table with multi-row INSERT IGNORE statements.
+
+    resolve_genre_ids(mycursor, genres, key_cache):
+        Returns the IDs of the given genres, inserting the missing ones in bulk.
+
+    bulk_csv_to_db(processed_tracks, chunk_size):
+        Loads the processed_tracks list into the MySQL database with set-based statements.
+
+    write_chunk(mycursor, batch, key_cache, written, start, stop):
+        Writes a range of a batch of processed tracks with set-based statements, without committing.
+
+    stream_to_db(processed_batches, chunk_size):
+        Loads processed tracks into the MySQL database as they are produced, one commit per chunk.
+
+    select_track_relations(mycursor, table, columns, track_ids):
+        Returns the rows of a relation table that reference the given tracks.
+
+    select_artist_genres(mycursor, artist_ids):
+        Returns the stored genres of the given artists.
+
+    refresh_artist_genres(mycursor, batch, artist_codes, key_cache, written):
+        Replaces the stored genres of the stored artists whose genres changed.
+
+    aggregate_deltas(new_user_tracks, new_track_artists, new_track_genres, existing_user_tracks, all_track_genres):
+        Computes how the summary tables change with the relation rows being written.
+
+    apply_aggregate_deltas(mycursor, deltas):
+        Adds the deltas to the summary tables with multi-row upserts.
     """
 
     @staticmethod
-    def establish_connection():
+    def establish_connection(database=None):
+        """
+        Establishes a connection to the database of the storage backend (see lib.storage).
+
+        With MySQL the connection comes from the process-wide pool in lib.dbClient, and closing
+        it hands it back to the pool. With SQLite it opens the database file.
+
+        Parameters
+        ----------
+        database : str, optional
+            The database to connect to (the file path with SQLite). Defaults to the
+            DB_CONNECTION_DATABASE environment variable (SQLITE_PATH with SQLite).
+
+        Returns
+        -------
+        object
+            A DB-API connection to the database.
+        """
+        return get_backend().connect(database)
+
+    @staticmethod
+    def fetch_known_users():
         """
-        Establishes a connection to the MySQL database.
+        Returns every user already stored in the Users table.
 
         Returns
         -------
-        mysql.connector.connection_cext.CMySQLConnection
-            A connection to the MySQL database.
-        """
-        load_dotenv()
-        return mysql.connector.connect(
-            host=os.getenv("DB_CONNECTION_HOST"),
-            user=os.getenv("DB_CONNECTION_USER"),
-            password=os.getenv("DB_CONNECTION_PASSWORD"),
-            database=os.getenv("DB_CONNECTION_DATABASE")
-        )
+        dict
+            A dictionary mapping each user ID to its user name.
+        """
+        mydb = DatabaseLoader.establish_connection()
+        mycursor = mydb.cursor()
+        mycursor.execute("SELECT user_id, user_name FROM Users")
+        known_users = dict(mycursor.fetchall())
+        mydb.close()
+        return known_users
 
     @staticmethod
-    def insert_user_if_not_exists(mycursor, row):
+    def insert_user_if_not_exists(mycursor, row, key_cache=None):
         """
         Inserts a new user into the Users table if the user does not already exist.
 
@@ -69,19 +142,27 @@ class DatabaseLoader:
             A cursor object used to execute MySQL queries.
         row : dict
             A dictionary containing the user data.
+        key_cache : classes.DimensionKeyCache.DimensionKeyCache, optional
+            The loaded dimension key cache. When provided, the existence check is answered from
+            memory instead of the database.
 
         Returns
         -------
         None
         """
-        sql = "SELECT * FROM Users WHERE user_id = %s"
-        val = (row['user_id'],)
-        mycursor.execute(sql, val)
-        result = mycursor.fetchall()
-        if not result:
+        if key_cache is not None:
+            exists = key_cache.has_user(row['user_id'])
+        else:
+            sql = "SELECT * FROM Users WHERE user_id = %s"
+            val = (row['user_id'],)
+            mycursor.execute(sql, val)
+            exists = bool(mycursor.fetchall())
+        if not exists:
             sql = "INSERT INTO Users (user_id, user_name) VALUES (%s, %s)"
             val = (row['user_id'], row['user_name'])
             mycursor.execute(sql, val)
+            if key_cache is not None:
+                key_cache.add_user(row['user_id'])
 
     @staticmethod
     def insert_track_if_not_exists(mycursor, row):
@@ -109,7 +190,7 @@ class DatabaseLoader:
             mycursor.execute(sql, val)
 
     @staticmethod
-    def insert_artist_if_not_exists(mycursor, artist_id, artist_name):
+    def insert_artist_if_not_exists(mycursor, artist_id, artist_name, key_cache=None):
         """
         Inserts a new artist into the Artists table if the artist does not already exist.
 
@@ -121,21 +202,31 @@ class DatabaseLoader:
             The ID of the artist.
         artist_name : str
             The name of the artist.
+        key_cache : classes.DimensionKeyCache.DimensionKeyCache, optional
+            The loaded dimension key cache. When provided, the existence check is answered from
+            memory instead of the database.
 
         Returns
         -------
-        None
+        bool
+            True if the artist was inserted, False if it already existed.
         """
         if artist_id is None:
             artist_id = "No Artist"
-        sql = "SELECT * FROM Artists WHERE artist_id = %s"
-        val = (artist_id,)
-        mycursor.execute(sql, val)
-        result = mycursor.fetchall()
-        if not result:
+        if key_cache is not None:
+            exists = key_cache.has_artist(artist_id)
+        else:
+            sql = "SELECT * FROM Artists WHERE artist_id = %s"
+            val = (artist_id,)
+            mycursor.execute(sql, val)
+            exists = bool(mycursor.fetchall())
+        if not exists:
             sql = "INSERT INTO Artists (artist_id, artist_name) VALUES (%s, %s)"
             val = (artist_id, artist_name)
             mycursor.execute(sql, val)
+            if key_cache is not None:
+                key_cache.add_artist(artist_id)
+        return not exists
 
     @staticmethod
     def insert_track_artist_relation_if_not_exists(mycursor, row, artist_id):
@@ -153,7 +244,8 @@ class DatabaseLoader:
 
         Returns
         -------
-        None
+        bool
+            True if the relation was inserted, False if it already existed.
         """
         if artist_id is None:
             artist_id = "No Artist"
@@ -166,9 +258,11 @@ class DatabaseLoader:
             sql = "INSERT INTO TrackArtists (track_id, artist_id) VALUES (%s, %s)"
             val = (row['track_id'], artist_id)
             mycursor.execute(sql, val)
+            return True
+        return False
 
     @staticmethod
-    def insert_genre_if_not_exists(mycursor, genre):
+    def insert_genre_if_not_exists(mycursor, genre, key_cache=None):
         """
         Inserts a new genre into the Genres table if the genre does not already exist.
 
@@ -178,52 +272,69 @@ class DatabaseLoader:
             A cursor object used to execute MySQL queries.
         genre : str
             The name of the genre.
+        key_cache : classes.DimensionKeyCache.DimensionKeyCache, optional
+            The loaded dimension key cache. When provided, the existence check is answered from
+            memory instead of the database.
 
         Returns
         -------
         int
             The ID of the genre.
         """
-        sql = "SELECT genre_id FROM Genres WHERE genre_name = %s"
-        val = (genre,)
-        mycursor.execute(sql, val)
-        result = mycursor.fetchall()
+        if key_cache is not None:
+            genre_id = key_cache.genre_id(genre)
+            if genre_id is not None:
+                return genre_id
+            result = None
+        else:
+            sql = "SELECT genre_id FROM Genres WHERE genre_name = %s"
+            val = (genre,)
+            mycursor.execute(sql, val)
+            result = mycursor.fetchall()
         if not result:
-            sql = "INSERT INTO Genres (genre_name) VALUES (%s)"
+            # With the unique key on genre_name, a genre inserted meanwhile by another load is skipped
+            sql = get_backend().insert_ignore_sql("Genres", ("genre_name",))
             val = (genre,)
             mycursor.execute(sql, val)
-            mycursor.execute("SELECT LAST_INSERT_ID()")
-            genre_id = mycursor.fetchone()[0]
+            if mycursor.rowcount:
+                # The cursor already carries the AUTO_INCREMENT value, no need for SELECT LAST_INSERT_ID()
+                genre_id = mycursor.lastrowid
+            else:
+                mycursor.execute("SELECT genre_id FROM Genres WHERE genre_name = %s", val)
+                genre_id = mycursor.fetchall()[0][0]
+            if key_cache is not None:
+                key_cache.add_genre(genre, genre_id)
         else:
             genre_id = result[0][0]
         return genre_id
 
     @staticmethod
-    def insert_track_genre_relation_if_not_exists(mycursor, row, genre_id):
+    def insert_artist_genre_relation_if_not_exists(mycursor, artist_id, genre_id):
         """
-        Inserts a new track-genre relation into the TrackGenres table if the relation does not already exist.
+        Inserts a new artist-genre relation into the ArtistGenres table if the relation does not already exist.
 
         Parameters
         ----------
         mycursor : mysql.connector.cursor_cext.CMySQLCursor
             A cursor object used to execute MySQL queries.
-        row : dict
-            A dictionary containing the track data.
+        artist_id : str
+            The ID of the artist.
         genre_id : int
             The ID of the genre.
 
         Returns
         -------
-        None
+        bool
+            True if the relation was inserted, False if it already existed.
         """
-        sql = "SELECT * FROM TrackGenres WHERE track_id = %s AND genre_id = %s"
-        val = (row['track_id'], genre_id)
+        if artist_id is None:
+            artist_id = "No Artist"
+
+        # The primary key makes the existence check and the insert a single statement
+        sql = get_backend().insert_ignore_sql("ArtistGenres", ("artist_id", "genre_id"))
+        val = (artist_id, genre_id)
         mycursor.execute(sql, val)
-        result = mycursor.fetchall()
-        if not result:
-            sql = "INSERT INTO TrackGenres (track_id, genre_id) VALUES (%s, %s)"
-            val = (row['track_id'], genre_id)
-            mycursor.execute(sql, val)
+        return mycursor.rowcount > 0
 
     @staticmethod
     def insert_user_track_relation_if_not_exists(mycursor, row):
@@ -239,7 +350,8 @@ class DatabaseLoader:
 
         Returns
         -------
-        None
+        bool
+            True if the relation was inserted, False if it already existed.
         """
         sql = "SELECT * FROM UserTracks WHERE user_id = %s AND track_id = %s"
         val = (row['user_id'], row['track_id'])
@@ -249,29 +361,62 @@ class DatabaseLoader:
             sql = "INSERT INTO UserTracks (user_id, track_id) VALUES (%s, %s)"
             val = (row['user_id'], row['track_id'])
             mycursor.execute(sql, val)
+            return True
+        return False
 
     @staticmethod
-    def csv_to_db(processed_tracks):
+    def csv_to_db(processed_tracks, database=None):
         """
         Loads data from the processed_tracks list into the MySQL database.
 
         Parameters
         ----------
-        processed_tracks : list
-            A list of tuples containing track information.
+        processed_tracks : classes.TrackBatch.TrackBatch
+            The processed tracks.
+        database : str, optional
+            The database to load into. Defaults to the DB_CONNECTION_DATABASE environment variable.
 
         Returns
         -------
         None
         """
-        mydb = DatabaseLoader.establish_connection()
-        mycursor = mydb.cursor()
+        mydb = DatabaseLoader.establish_connection(database)
+
+        # Load the dimension keys once instead of checking them row by row
+        key_cache = DimensionKeyCache().load(mydb.cursor())
+
+        # Every SELECT/INSERT template of the per-row path is prepared once per connection
+        mycursor = get_backend().prepared_cursor(mydb)
+
+        # The artists already stored for these tracks and the genres of every artist involved, so
+        # the genres the TrackGenres view derives are known in memory instead of queried per track
+        artist_ids_of_batch = [artist_id if artist_id is not None else "No Artist" for artist_id in processed_tracks.artists.values]
+        stored_track_artists = DatabaseLoader.select_track_relations(
+            mycursor, "TrackArtists", ("track_id", "artist_id"), list(dict.fromkeys(processed_tracks.track_ids))
+        )
+        DatabaseLoader.refresh_artist_genres(
+            mycursor, processed_tracks, range(len(artist_ids_of_batch)), key_cache
+        )
+        artist_genre_ids = DatabaseLoader.select_artist_genres(
+            mycursor, sorted({artist_id for _, artist_id in stored_track_artists} | set(artist_ids_of_batch))
+        )
+        artists_of_track = defaultdict(set)
+        for track_id, artist_id in stored_track_artists:
+            artists_of_track[track_id].add(artist_id)
+
+        def genres_of_track(track_id):
+            return {genre_id for artist_id in artists_of_track[track_id] for genre_id in artist_genre_ids.get(artist_id, ())}
 
-        for track_info in processed_tracks:
-            (track_id, track_name, track_album, artist_ids, artist_names, 
-             track_duration, genres, user_id, user_name) = track_info
+        # The relations written by this load, to update the summary tables
+        new_user_tracks, new_track_artists, new_track_genres = set(), set(), set()
+        existing_user_tracks, all_track_genres = set(), set()
 
-            DatabaseLoader.insert_user_if_not_exists(mycursor, {'user_id': user_id, 'user_name': user_name})
+        for i, track in enumerate(processed_tracks):
+            track_id, track_name, track_album = track.track_id, track.track_name, track.track_album
+            track_duration, user_id, user_name = track.track_duration, track.added_by, track.user_name
+            artist_ids, artist_names = track.artist_ids, track.artist_names
+
+            DatabaseLoader.insert_user_if_not_exists(mycursor, {'user_id': user_id, 'user_name': user_name}, key_cache)
             DatabaseLoader.insert_track_if_not_exists(
                 mycursor, {
                     'track_id': track_id,
@@ -282,16 +427,601 @@ class DatabaseLoader:
                 }
             )
 
-            for artist_id, artist_name in zip(artist_ids, artist_names):
-                DatabaseLoader.insert_artist_if_not_exists(mycursor, artist_id, artist_name)
-                DatabaseLoader.insert_track_artist_relation_if_not_exists(mycursor, {'track_id': track_id}, artist_id)
+            # The genres of the track are derived from its artists by the TrackGenres view
+            genres_before = genres_of_track(track_id)
+
+            for artist_code, artist_id, artist_name in zip(processed_tracks.artist_codes_of(i), artist_ids, artist_names):
+                if DatabaseLoader.insert_artist_if_not_exists(mycursor, artist_id, artist_name, key_cache):
+                    # The genres of an artist are written once, along with the artist
+                    for genre in processed_tracks.genres_of_artist(artist_code):
+                        genre_id = DatabaseLoader.insert_genre_if_not_exists(mycursor, genre, key_cache)
+                        DatabaseLoader.insert_artist_genre_relation_if_not_exists(mycursor, artist_id, genre_id)
+                        artist_genre_ids[artist_ids_of_batch[artist_code]].add(genre_id)
+                if DatabaseLoader.insert_track_artist_relation_if_not_exists(mycursor, {'track_id': track_id}, artist_id):
+                    new_track_artists.add((track_id, artist_ids_of_batch[artist_code]))
+                    artists_of_track[track_id].add(artist_ids_of_batch[artist_code])
+
+            genres_after = genres_of_track(track_id)
+            all_track_genres.update((track_id, genre_id) for genre_id in genres_after)
+            new_track_genres.update((track_id, genre_id) for genre_id in genres_after - genres_before)
+
+            if DatabaseLoader.insert_user_track_relation_if_not_exists(mycursor, {'user_id': user_id, 'track_id': track_id}):
+                new_user_tracks.add((user_id, track_id))
+            elif (user_id, track_id) not in new_user_tracks:
+                # Only the pairs stored before this load, a repeated one already counts as new
+                existing_user_tracks.add((user_id, track_id))
+
+        DatabaseLoader.apply_aggregate_deltas(
+            mycursor,
+            DatabaseLoader.aggregate_deltas(
+                new_user_tracks, new_track_artists, new_track_genres, existing_user_tracks, all_track_genres
+            )
+        )
+
+        mydb.commit()
+        mycursor.close()
+        mydb.close()
+        logger.info("Data loaded successfully!")
+
+    @staticmethod
+    def insert_ignore_many(mycursor, table, columns, rows):
+        """
+        Inserts several rows into a table with multi-row INSERT IGNORE statements.
+
+        Rows whose primary key already exists are skipped by the server, so no existence
+        check is needed beforehand.
 
+        Parameters
+        ----------
+        mycursor : mysql.connector.cursor_cext.CMySQLCursor
+            A cursor object used to execute MySQL queries.
+        table : str
+            The name of the table.
+        columns : tuple of str
+            The names of the columns being inserted.
+        rows : list of tuple
+            The rows to insert, with one value per column.
+
+        Returns
+        -------
+        int
+            The number of rows actually written.
+        """
+        backend = get_backend()
+        written = 0
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            batch = rows[start:start + INSERT_BATCH_SIZE]
+            sql = backend.insert_ignore_sql(table, columns, len(batch))
+            mycursor.execute(sql, [value for row in batch for value in row])
+            written += mycursor.rowcount
+        return written
+
+    @staticmethod
+    def resolve_genre_ids(mycursor, genres, key_cache=None):
+        """
+        Returns the IDs of the given genres, inserting the missing ones in bulk.
+
+        Parameters
+        ----------
+        mycursor : mysql.connector.cursor_cext.CMySQLCursor
+            A cursor object used to execute MySQL queries.
+        genres : set of str
+            The names of the genres.
+        key_cache : classes.DimensionKeyCache.DimensionKeyCache, optional
+            The loaded dimension key cache. When provided, only the genres it doesn't know are
+            looked up, and the new IDs are recorded in it.
+
+        Returns
+        -------
+        tuple
+            A (genre_ids, written) pair where genre_ids maps each genre name to its ID and
+            written is the number of new genres inserted.
+        """
+        genre_ids = {}
+        genres = list(genres)
+
+        def select_genres(names):
+            for start in range(0, len(names), INSERT_BATCH_SIZE):
+                batch = names[start:start + INSERT_BATCH_SIZE]
+                sql = f"SELECT genre_id, genre_name FROM Genres WHERE genre_name IN ({', '.join(['%s'] * len(batch))})"
+                mycursor.execute(sql, batch)
+                for genre_id, genre_name in mycursor.fetchall():
+                    genre_ids.setdefault(genre_name, genre_id)
+
+        if key_cache is not None:
+            # A loaded cache knows every stored genre, so there is nothing to look up
             for genre in genres:
-                genre_id = DatabaseLoader.insert_genre_if_not_exists(mycursor, genre)
-                DatabaseLoader.insert_track_genre_relation_if_not_exists(mycursor, {'track_id': track_id}, genre_id)
+                genre_id = key_cache.genre_id(genre)
+                if genre_id is not None:
+                    genre_ids[genre] = genre_id
+        else:
+            select_genres(genres)
+
+        missing = [genre for genre in genres if genre not in genre_ids]
+
+        # The IDs are read back after the insert; with the unique key on genre_name, INSERT IGNORE
+        # also skips the genres another load inserted since they were looked up
+        written = 0
+        if missing:
+            written = DatabaseLoader.insert_ignore_many(mycursor, "Genres", ("genre_name",), [(genre,) for genre in missing])
+            select_genres(missing)
+            if key_cache is not None:
+                for genre in missing:
+                    key_cache.add_genre(genre, genre_ids[genre])
+
+        return genre_ids, written
+
+    @staticmethod
+    def bulk_csv_to_db(processed_tracks, chunk_size=1000, database=None, write_lock=None):
+        """
+        Loads the processed_tracks list into the MySQL database with set-based statements.
+
+        Instead of a SELECT and a conditional INSERT per row, the rows of every table are built
+        for a whole chunk of tracks and written with multi-row INSERT IGNORE statements, with
+        one commit per chunk.
+
+        Parameters
+        ----------
+        processed_tracks : classes.TrackBatch.TrackBatch
+            The processed tracks.
+        chunk_size : int, optional
+            The number of tracks written and committed together.
+        database : str, optional
+            The database to load into. Defaults to the DB_CONNECTION_DATABASE environment variable.
+        write_lock : threading.Lock, optional
+            A lock held while each chunk is written and committed, shared by the loads running
+            concurrently so their transactions never interleave.
+
+        Returns
+        -------
+        dict
+            The number of rows written per table.
+        """
+        mydb = DatabaseLoader.establish_connection(database)
+        mycursor = mydb.cursor()
+
+        key_cache = DimensionKeyCache().load(mycursor)
+        # Ends the read snapshot, so the first chunk sees what other loads committed meanwhile
+        mydb.commit()
+
+        written = DatabaseLoader.empty_written_counts()
+
+        for start in range(0, len(processed_tracks), chunk_size):
+            stop = min(start + chunk_size, len(processed_tracks))
+            with write_lock or nullcontext():
+                DatabaseLoader.write_chunk(mycursor, processed_tracks, key_cache, written, start, stop)
+                mydb.commit()
+            logger.info("Committed tracks %d-%d of %d", start + 1, stop, len(processed_tracks))
+
+        mydb.close()
+        metrics.add_rows(written)
+        logger.info("Data loaded successfully! Rows written per table: %s", written)
+        return written
+
+    @staticmethod
+    def empty_written_counts():
+        """
+        Returns the per-table counters of written rows, all set to zero.
+
+        Returns
+        -------
+        dict
+            A dictionary mapping each table name to 0.
+        """
+        return dict.fromkeys(
+            ("Users", "Tracks", "Artists", "TrackArtists", "Genres", "ArtistGenres", "UserTracks"), 0
+        )
+
+    @staticmethod
+    def write_chunk(mycursor, batch, key_cache, written, start=0, stop=None):
+        """
+        Writes a range of a batch of processed tracks with set-based statements, without committing.
+
+        The rows are read straight from the columns of the batch, and the interned user, artist
+        and genre codes are decoded once per distinct value rather than once per track.
+
+        Parameters
+        ----------
+        mycursor : mysql.connector.cursor_cext.CMySQLCursor
+            A cursor object used to execute MySQL queries.
+        batch : classes.TrackBatch.TrackBatch
+            The processed tracks.
+        key_cache : classes.DimensionKeyCache.DimensionKeyCache
+            The loaded dimension key cache.
+        written : dict
+            The per-table counters of written rows, updated in place.
+        start : int, optional
+            The index of the first track to write.
+        stop : int, optional
+            The index after the last track to write. Defaults to the end of the batch.
+
+        Returns
+        -------
+        None
+        """
+        if stop is None:
+            stop = len(batch)
+
+        track_ids  = batch.track_ids
+        user_codes = batch.user_codes
+
+        # Decode every distinct artist once, replacing missing IDs like the per-row path does
+        artist_ids = [artist_id if artist_id is not None else "No Artist" for artist_id in batch.artists.values]
+
+        users = [
+            (batch.users[code], batch.user_names[code])
+            for code in sorted(set(user_codes[start:stop])) if not key_cache.has_user(batch.users[code])
+        ]
+        # The first occurrence of a repeated track wins, like on the per-row path
+        tracks = {}
+        for i in range(start, stop):
+            tracks.setdefault(
+                track_ids[i],
+                (track_ids[i], batch.track_names[i], batch.track_albums[i], batch.track_durations[i], batch.users[user_codes[i]])
+            )
+        tracks = list(tracks.values())
+
+        # Only the artists missing from the database are written, along with their genres
+        artist_codes = set(batch.artist_codes[batch.artist_offsets[start]:batch.artist_offsets[stop]])
+        new_artist_codes = {code for code in artist_codes if not key_cache.has_artist(artist_ids[code])}
+        artists = list({artist_ids[code]: (artist_ids[code], batch.artist_names[code]) for code in new_artist_codes}.values())
+
+        # Stored artists whose genres changed get them replaced before the view is read below
+        DatabaseLoader.refresh_artist_genres(mycursor, batch, artist_codes - new_artist_codes, key_cache, written)
+
+        track_artists = {
+            (track_ids[i], artist_ids[code]) for i in range(start, stop) for code in batch.artist_codes_of(i)
+        }
+        user_tracks = {(batch.users[user_codes[i]], track_ids[i]) for i in range(start, stop)}
+
+        # The relations already stored for these tracks, so only the new ones are written and counted
+        chunk_track_ids = list(dict.fromkeys(track_ids[start:stop]))
+        existing_track_artists = DatabaseLoader.select_track_relations(mycursor, "TrackArtists", ("track_id", "artist_id"), chunk_track_ids)
+        existing_track_genres  = DatabaseLoader.select_track_relations(mycursor, "TrackGenres", ("track_id", "genre_id"), chunk_track_ids)
+        existing_user_tracks   = DatabaseLoader.select_track_relations(mycursor, "UserTracks", ("user_id", "track_id"), chunk_track_ids)
+
+        new_track_artists = track_artists - existing_track_artists
+        new_user_tracks   = user_tracks - existing_user_tracks
+
+        # The stored genres of the other artists of these tracks, from which the view derives their genres
+        new_artist_ids = {artist_id for artist_id, _ in artists}
+        artist_genre_ids = DatabaseLoader.select_artist_genres(
+            mycursor, sorted({artist_id for _, artist_id in track_artists | existing_track_artists} - new_artist_ids)
+        )
+
+        # Parents are written before the relations referencing them
+        written["Users"]   += DatabaseLoader.insert_ignore_many(mycursor, "Users", ("user_id", "user_name"), users)
+        written["Tracks"]  += DatabaseLoader.insert_ignore_many(
+            mycursor, "Tracks", ("track_id", "track_name", "track_album", "track_duration", "added_by"), tracks
+        )
+        written["Artists"] += DatabaseLoader.insert_ignore_many(mycursor, "Artists", ("artist_id", "artist_name"), artists)
+        written["TrackArtists"] += DatabaseLoader.insert_ignore_many(
+            mycursor, "TrackArtists", ("track_id", "artist_id"), sorted(new_track_artists)
+        )
+
+        for user_id, _ in users:
+            key_cache.add_user(user_id)
+        for artist_id, _ in artists:
+            key_cache.add_artist(artist_id)
+
+        # Genres are written once per artist rather than once per track of the artist
+        genre_codes = set().union(*(batch.artist_genres[code] for code in new_artist_codes))
+        genre_ids, genres_written = DatabaseLoader.resolve_genre_ids(
+            mycursor, {batch.genres[code] for code in genre_codes}, key_cache
+        )
+        artist_genres = {
+            (artist_ids[code], genre_ids[batch.genres[genre_code]])
+            for code in new_artist_codes for genre_code in batch.artist_genres[code]
+        }
+        for artist_id, genre_id in artist_genres:
+            artist_genre_ids[artist_id].add(genre_id)
+
+        written["Genres"] += genres_written
+        written["ArtistGenres"] += DatabaseLoader.insert_ignore_many(
+            mycursor, "ArtistGenres", ("artist_id", "genre_id"), sorted(artist_genres)
+        )
+        written["UserTracks"] += DatabaseLoader.insert_ignore_many(mycursor, "UserTracks", ("user_id", "track_id"), sorted(new_user_tracks))
+
+        # The genres of these tracks as the TrackGenres view returns them once the chunk is written
+        track_genres = {
+            (track_id, genre_id)
+            for track_id, artist_id in track_artists | existing_track_artists
+            for genre_id in artist_genre_ids.get(artist_id, ())
+        }
+        new_track_genres = track_genres - existing_track_genres
+
+        DatabaseLoader.apply_aggregate_deltas(
+            mycursor,
+            DatabaseLoader.aggregate_deltas(
+                new_user_tracks, new_track_artists, new_track_genres, existing_user_tracks, track_genres
+            )
+        )
+
+    @staticmethod
+    def select_track_relations(mycursor, table, columns, track_ids):
+        """
+        Returns the rows of a relation table that reference the given tracks.
+
+        Parameters
+        ----------
+        mycursor : mysql.connector.cursor_cext.CMySQLCursor
+            A cursor object used to execute MySQL queries.
+        table : str
+            The name of the relation table, which must have a track_id column.
+        columns : tuple of str
+            The two columns to return.
+        track_ids : list of str
+            The IDs of the tracks.
+
+        Returns
+        -------
+        set of tuple
+            The stored rows.
+        """
+        rows = set()
+        for start in range(0, len(track_ids), INSERT_BATCH_SIZE):
+            batch = track_ids[start:start + INSERT_BATCH_SIZE]
+            mycursor.execute(
+                f"SELECT {', '.join(columns)} FROM {table} WHERE track_id IN ({', '.join(['%s'] * len(batch))})",
+                batch
+            )
+            rows.update(tuple(row) for row in mycursor.fetchall())
+        return rows
+
+    @staticmethod
+    def select_artist_genres(mycursor, artist_ids):
+        """
+        Returns the stored genres of the given artists.
+
+        Parameters
+        ----------
+        mycursor : mysql.connector.cursor_cext.CMySQLCursor
+            A cursor object used to execute MySQL queries.
+        artist_ids : list of str
+            The IDs of the artists.
+
+        Returns
+        -------
+        collections.defaultdict
+            A dictionary mapping each artist ID to its set of genre IDs.
+        """
+        artist_genres = defaultdict(set)
+        for start in range(0, len(artist_ids), INSERT_BATCH_SIZE):
+            batch = artist_ids[start:start + INSERT_BATCH_SIZE]
+            mycursor.execute(
+                f"SELECT artist_id, genre_id FROM ArtistGenres WHERE artist_id IN ({', '.join(['%s'] * len(batch))})",
+                batch
+            )
+            for artist_id, genre_id in mycursor.fetchall():
+                artist_genres[artist_id].add(genre_id)
+        return artist_genres
+
+    @staticmethod
+    def refresh_artist_genres(mycursor, batch, artist_codes, key_cache, written=None):
+        """
+        Replaces the stored genres of the stored artists whose genres changed, e.g. after the
+        artist cache refreshed them, and updates the summary tables of their stored tracks.
+
+        An artist without genres in the batch keeps its stored ones, since the API also returns
+        none for the artists it can't resolve.
+
+        Parameters
+        ----------
+        mycursor : mysql.connector.cursor_cext.CMySQLCursor
+            A cursor object used to execute MySQL queries.
+        batch : classes.TrackBatch.TrackBatch
+            The processed tracks.
+        artist_codes : iterable of int
+            The codes of the artists of the batch to check.
+        key_cache : classes.DimensionKeyCache.DimensionKeyCache
+            The loaded dimension key cache, which tells the stored artists apart.
+        written : dict, optional
+            The per-table counters of written rows, updated in place.
+
+        Returns
+        -------
+        None
+        """
+        fresh_genres = {}
+        for code in artist_codes:
+            artist_id = batch.artists.values[code]
+            genres = batch.genres_of_artist(code)
+            if artist_id is not None and genres and key_cache.has_artist(artist_id):
+                fresh_genres[artist_id] = genres
+        if not fresh_genres:
+            return
+
+        stored = {
+            (artist_id, genre_id)
+            for artist_id, genre_ids in DatabaseLoader.select_artist_genres(mycursor, sorted(fresh_genres)).items()
+            for genre_id in genre_ids
+        }
+        genre_ids, genres_written = DatabaseLoader.resolve_genre_ids(
+            mycursor, set().union(*fresh_genres.values()), key_cache
+        )
+        fresh = {(artist_id, genre_ids[genre]) for artist_id, genres in fresh_genres.items() for genre in genres}
+
+        added, removed = fresh - stored, stored - fresh
+        if written is not None:
+            written["Genres"] += genres_written
+        if not added and not removed:
+            return
+
+        # The stored tracks of these artists, whose genres the TrackGenres view derives
+        changed_artists = sorted({artist_id for artist_id, _ in added | removed})
+        track_ids = set()
+        for start in range(0, len(changed_artists), INSERT_BATCH_SIZE):
+            artists = changed_artists[start:start + INSERT_BATCH_SIZE]
+            mycursor.execute(
+                f"SELECT track_id FROM TrackArtists WHERE artist_id IN ({', '.join(['%s'] * len(artists))})",
+                artists
+            )
+            track_ids.update(track_id for (track_id,) in mycursor.fetchall())
+        track_ids = sorted(track_ids)
+
+        genres_before = DatabaseLoader.select_track_relations(mycursor, "TrackGenres", ("track_id", "genre_id"), track_ids)
+
+        artist_genres_written = DatabaseLoader.insert_ignore_many(mycursor, "ArtistGenres", ("artist_id", "genre_id"), sorted(added))
+        for artist_id, genre_id in sorted(removed):
+            mycursor.execute("DELETE FROM ArtistGenres WHERE artist_id = %s AND genre_id = %s", (artist_id, genre_id))
+        if written is not None:
+            written["ArtistGenres"] += artist_genres_written
+
+        genres_after = DatabaseLoader.select_track_relations(mycursor, "TrackGenres", ("track_id", "genre_id"), track_ids)
+        user_tracks  = DatabaseLoader.select_track_relations(mycursor, "UserTracks", ("user_id", "track_id"), track_ids)
+
+        # The genres gained by these tracks count like new ones, the lost ones are taken back
+        deltas = DatabaseLoader.aggregate_deltas(set(), set(), genres_after - genres_before, user_tracks, genres_after)
+        lost = DatabaseLoader.aggregate_deltas(set(), set(), genres_before - genres_after, user_tracks, genres_before)
+        for table, counter in lost.items():
+            deltas[table].subtract(counter)
+        DatabaseLoader.apply_aggregate_deltas(mycursor, deltas)
+        for table, counter in lost.items():
+            if counter:
+                mycursor.execute(f"DELETE FROM {table} WHERE track_count <= 0")
+
+        logger.info(
+            "Refreshed the genres of %d stored artists: %d added, %d removed, %d tracks affected",
+            len(changed_artists), len(added), len(removed), len(track_ids)
+        )
+
+    @staticmethod
+    def aggregate_deltas(new_user_tracks, new_track_artists, new_track_genres, existing_user_tracks, all_track_genres):
+        """
+        Computes how the summary tables change with the relation rows being written.
+
+        Parameters
+        ----------
+        new_user_tracks : set of tuple
+            The new (user_id, track_id) rows.
+        new_track_artists : set of tuple
+            The new (track_id, artist_id) rows.
+        new_track_genres : set of tuple
+            The new (track_id, genre_id) rows.
+        existing_user_tracks : set of tuple
+            The (user_id, track_id) rows already stored for the same tracks.
+        all_track_genres : set of tuple
+            Every (track_id, genre_id) row of the same tracks, stored or new.
+
+        Returns
+        -------
+        dict
+            A Counter of deltas per summary table, keyed like the table's primary key.
+        """
+        genres_of_track = defaultdict(list)
+        for track_id, genre_id in all_track_genres:
+            genres_of_track[track_id].append(genre_id)
 
-            DatabaseLoader.insert_user_track_relation_if_not_exists(mycursor, {'user_id': user_id, 'track_id': track_id})
+        users_of_track = defaultdict(list)
+        for user_id, track_id in existing_user_tracks:
+            users_of_track[track_id].append(user_id)
 
+        user_genres = Counter()
+        # A new user-track pair counts every genre of the track for that user...
+        for user_id, track_id in new_user_tracks:
+            user_genres.update((user_id, genre_id) for genre_id in genres_of_track[track_id])
+        # ...and a new genre of an already stored pair counts for the users who had added it
+        for track_id, genre_id in new_track_genres:
+            user_genres.update((user_id, genre_id) for user_id in users_of_track[track_id])
+
+        return {
+            "UserTrackCounts": Counter((user_id,) for user_id, _ in new_user_tracks),
+            "ArtistTrackCounts": Counter((artist_id,) for _, artist_id in new_track_artists),
+            "GenreTrackCounts": Counter((genre_id,) for _, genre_id in new_track_genres),
+            "UserGenreCounts": user_genres,
+        }
+
+    @staticmethod
+    def apply_aggregate_deltas(mycursor, deltas):
+        """
+        Adds the deltas to the summary tables with multi-row upserts.
+
+        Parameters
+        ----------
+        mycursor : mysql.connector.cursor_cext.CMySQLCursor
+            A cursor object used to execute MySQL queries.
+        deltas : dict
+            The Counters returned by aggregate_deltas.
+
+        Returns
+        -------
+        None
+        """
+        backend = get_backend()
+        for table, counter in deltas.items():
+            rows = [key + (count,) for key, count in sorted(counter.items()) if count]
+            if not rows:
+                continue
+            columns = AGGREGATE_KEYS[table] + ("track_count",)
+            for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                batch = rows[start:start + INSERT_BATCH_SIZE]
+                mycursor.execute(
+                    backend.upsert_sql(table, AGGREGATE_KEYS[table], columns, len(batch), increment=True),
+                    [value for row in batch for value in row]
+                )
+
+    @staticmethod
+    def stream_to_db(processed_batches, chunk_size=1000, database=None, write_lock=None):
+        """
+        Loads processed tracks into the MySQL database as they are produced.
+
+        The batches are buffered as they arrive, and every time at least chunk_size tracks are
+        pending they are written and committed in one transaction.
+
+        Parameters
+        ----------
+        processed_batches : iterable of classes.TrackBatch.TrackBatch
+            The batches of processed tracks, e.g. from process_tracks.iter_processed_tracks.
+        chunk_size : int, optional
+            The number of tracks written and committed together.
+        database : str, optional
+            The database to load into. Defaults to the DB_CONNECTION_DATABASE environment variable.
+        write_lock : threading.Lock, optional
+            A lock held while each chunk is written and committed, shared by the loads running
+            concurrently so their transactions never interleave. It is never held while waiting
+            for the next batch.
+
+        Returns
+        -------
+        dict
+            The number of rows written per table.
+        """
+        mydb = DatabaseLoader.establish_connection(database)
+        mycursor = mydb.cursor()
+
+        key_cache = DimensionKeyCache().load(mycursor)
+        # Ends the read snapshot, so the first chunk sees what other loads committed meanwhile
         mydb.commit()
+
+        written   = DatabaseLoader.empty_written_counts()
+
+        pending   = []
+        committed = 0
+
+        def flush():
+            # Writes and commits the pending batches, returning how many tracks they held
+            with write_lock or nullcontext():
+                for batch in pending:
+                    DatabaseLoader.write_chunk(mycursor, batch, key_cache, written)
+                mydb.commit()
+            tracks = sum(len(batch) for batch in pending)
+            pending.clear()
+            return tracks
+
+        pending_tracks = 0
+        for batch in processed_batches:
+            pending.append(batch)
+            pending_tracks += len(batch)
+            if pending_tracks >= chunk_size:
+                committed += flush()
+                pending_tracks = 0
+                logger.info("Committed %d tracks", committed)
+
+        if pending:
+            committed += flush()
+            logger.info("Committed %d tracks", committed)
+
         mydb.close()
-        print("Data loaded successfully!")
+        metrics.add_rows(written)
+        logger.info("Data loaded successfully! Rows written per table: %s", written)
+        return written
@@ -0,0 +1,85 @@
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class DimensionKeyCache:
+    """
+    An in-process cache of the keys already stored in the Users, Artists and Genres tables.
+
+    It is loaded once at the start of a load and kept up to date as rows are inserted, so the
+    loader can decide whether a dimension row exists (and which genre_id a genre has) without
+    querying the database.
+
+    ...
+
+    Methods
+    -------
+    load(mycursor):
+        Loads the keys of every dimension table.
+
+    has_user(user_id) / add_user(user_id):
+        Checks / records a user ID.
+
+    has_artist(artist_id) / add_artist(artist_id):
+        Checks / records an artist ID.
+
+    genre_id(genre_name) / add_genre(genre_name, genre_id):
+        Returns / records the ID of a genre.
+    """
+
+    def __init__(self):
+        self.user_ids   = set()
+        self.artist_ids = set()
+        self.genre_ids  = {}
+
+    def load(self, mycursor):
+        """
+        Loads the keys of every dimension table.
+
+        Parameters
+        ----------
+        mycursor : mysql.connector.cursor_cext.CMySQLCursor
+            A cursor object used to execute MySQL queries.
+
+        Returns
+        -------
+        DimensionKeyCache
+            The cache itself, so it can be created and loaded in a single expression.
+        """
+        mycursor.execute("SELECT user_id FROM Users")
+        self.user_ids = {user_id for (user_id,) in mycursor.fetchall()}
+
+        mycursor.execute("SELECT artist_id FROM Artists")
+        self.artist_ids = {artist_id for (artist_id,) in mycursor.fetchall()}
+
+        # Keep the lowest ID if the table already contains duplicated genre names
+        mycursor.execute("SELECT genre_id, genre_name FROM Genres ORDER BY genre_id")
+        self.genre_ids = {}
+        for genre_id, genre_name in mycursor.fetchall():
+            self.genre_ids.setdefault(genre_name, genre_id)
+
+        logger.info(
+            "Loaded %d users, %d artists and %d genres into the key cache",
+            len(self.user_ids), len(self.artist_ids), len(self.genre_ids)
+        )
+        return self
+
+    def has_user(self, user_id):
+        return user_id in self.user_ids
+
+    def add_user(self, user_id):
+        self.user_ids.add(user_id)
+
+    def has_artist(self, artist_id):
+        return artist_id in self.artist_ids
+
+    def add_artist(self, artist_id):
+        self.artist_ids.add(artist_id)
+
+    def genre_id(self, genre_name):
+        return self.genre_ids.get(genre_name)
+
+    def add_genre(self, genre_name, genre_id):
+        self.genre_ids[genre_name] = genre_id
@@ -0,0 +1,197 @@
+from array import array
+from classes.TrackRecord import TrackRecord
+
+
+class StringPool:
+    """
+    Interns repeated strings once per batch and refers to them by integer codes.
+
+    Attributes
+    ----------
+    values : list
+        The distinct values, indexed by their code.
+    """
+
+    __slots__ = ('values', '_codes')
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value):
+        """
+        Returns the code of a value, adding it to the pool if it is new.
+        """
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+
+class TrackBatch:
+    """
+    A columnar container of processed tracks.
+
+    Every track attribute is stored in its own column. Users, artists and genres are interned
+    in a StringPool and referenced by integer codes stored in compact arrays, and the variable
+    length artist and genre lists are flattened with an offsets array (the codes of track i are
+    codes[offsets[i]:offsets[i + 1]]).
+
+    The genres of every distinct artist are kept once in artist_genres, which is what the loader
+    stores. When the records are appended without the genres of their artists (e.g. legacy rows
+    only carrying the union per track), an artist gets the genres shared by all its tracks.
+
+    ...
+
+    Methods
+    -------
+    from_records(records, artists_genres):
+        Builds a batch from processed TrackRecords.
+
+    append(record, artists_genres):
+        Adds a processed TrackRecord to the batch.
+
+    genres_of_artist(artist_code):
+        Returns the genre names of an artist.
+
+    record(i):
+        Decodes the i-th track back into a TrackRecord.
+
+    artist_codes_of(i) / genre_codes_of(i):
+        Returns the artist / genre codes of the i-th track.
+    """
+
+    __slots__ = (
+        'track_ids', 'track_names', 'track_albums', 'track_durations',
+        'user_codes', 'users', 'user_names',
+        'artist_offsets', 'artist_codes', 'artists', 'artist_names', 'artist_genres',
+        'genre_offsets', 'genre_codes', 'genres'
+    )
+
+    def __init__(self):
+        self.track_ids       = []
+        self.track_names     = []
+        self.track_albums    = []
+        self.track_durations = array('l')
+
+        self.user_codes = array('l')
+        self.users      = StringPool()  # user IDs
+        self.user_names = []            # indexed by user code
+
+        self.artist_offsets = array('l', [0])
+        self.artist_codes   = array('l')
+        self.artists        = StringPool()  # artist IDs
+        self.artist_names   = []            # indexed by artist code
+        self.artist_genres  = []            # frozensets of genre codes, indexed by artist code
+
+        self.genre_offsets = array('l', [0])
+        self.genre_codes   = array('l')
+        self.genres        = StringPool()  # genre names
+
+    @classmethod
+    def from_records(cls, records, artists_genres=None):
+        """
+        Builds a batch from processed TrackRecords.
+
+        Parameters
+        ----------
+        records : iterable of classes.TrackRecord.TrackRecord
+            The processed tracks.
+        artists_genres : dict, optional
+            The genres of each artist ID, as returned by fetch_artists_genres.
+
+        Returns
+        -------
+        TrackBatch
+        """
+        batch = cls()
+        for record in records:
+            batch.append(record, artists_genres)
+        return batch
+
+    def append(self, record, artists_genres=None):
+        """
+        Adds a processed TrackRecord to the batch.
+
+        Parameters
+        ----------
+        record : classes.TrackRecord.TrackRecord
+            The processed track.
+        artists_genres : dict, optional
+            The genres of each artist ID. Artists missing from it get the genres shared by all
+            their tracks in the batch.
+
+        Returns
+        -------
+        None
+        """
+        self.track_ids.append(record.track_id)
+        self.track_names.append(record.track_name)
+        self.track_albums.append(record.track_album)
+        self.track_durations.append(record.track_duration)
+
+        user_code = self.users.code(record.added_by)
+        if user_code == len(self.user_names):
+            self.user_names.append(record.user_name)
+        self.user_codes.append(user_code)
+
+        genre_codes = [self.genres.code(genre) for genre in record.genres or ()]
+        self.genre_codes.extend(genre_codes)
+        track_genres = frozenset(genre_codes)
+        self.genre_offsets.append(len(self.genre_codes))
+
+        for artist_id, artist_name in zip(record.artist_ids, record.artist_names):
+            artist_code = self.artists.code(artist_id)
+            if artists_genres is not None and artist_id in artists_genres:
+                genres = frozenset(self.genres.code(genre) for genre in artists_genres[artist_id])
+            else:
+                genres = track_genres
+            if artist_code == len(self.artist_names):
+                self.artist_names.append(artist_name)
+                self.artist_genres.append(genres)
+            elif artists_genres is None or artist_id not in artists_genres:
+                self.artist_genres[artist_code] &= genres
+            self.artist_codes.append(artist_code)
+        self.artist_offsets.append(len(self.artist_codes))
+
+    def artist_codes_of(self, i):
+        return self.artist_codes[self.artist_offsets[i]:self.artist_offsets[i + 1]]
+
+    def genre_codes_of(self, i):
+        return self.genre_codes[self.genre_offsets[i]:self.genre_offsets[i + 1]]
+
+    def genres_of_artist(self, artist_code):
+        return [self.genres[code] for code in sorted(self.artist_genres[artist_code])]
+
+    def record(self, i):
+        """
+        Decodes the i-th track back into a TrackRecord.
+        """
+        artist_codes = self.artist_codes_of(i)
+        user_code    = self.user_codes[i]
+        return TrackRecord(
+            self.track_ids[i],
+            self.track_names[i],
+            self.track_albums[i],
+            [self.artists[code] for code in artist_codes],
+            [self.artist_names[code] for code in artist_codes],
+            self.track_durations[i],
+            [self.genres[code] for code in self.genre_codes_of(i)],
+            self.users[user_code],
+            self.user_names[user_code]
+        )
+
+    def __len__(self):
+        return len(self.track_ids)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.record(i)
@@ -0,0 +1,49 @@
+class TrackRecord:
+    """
+    A single playlist track as it moves through the pipeline.
+
+    fetch_tracks fills the fields read from the playlist, and process_tracks completes the
+    genres and the user_name of the user who added it. The positional order of the fields
+    matches the tuples previously passed around, so TrackRecord(*row) converts one of them.
+
+    Attributes
+    ----------
+    track_id : str
+    track_name : str
+    track_album : str
+    artist_ids : tuple of str
+    artist_names : tuple of str
+    track_duration : int
+        The duration of the track in milliseconds.
+    genres : tuple of str or None
+        The union of the genres of the artists, None until the track is processed.
+    added_by : str
+        The ID of the user who added the track.
+    user_name : str or None
+        The display name of the user who added the track, None until the track is processed.
+    """
+
+    __slots__ = (
+        'track_id', 'track_name', 'track_album', 'artist_ids', 'artist_names',
+        'track_duration', 'genres', 'added_by', 'user_name'
+    )
+
+    def __init__(self, track_id, track_name, track_album, artist_ids, artist_names,
+                 track_duration, genres=None, added_by=None, user_name=None):
+        self.track_id       = track_id
+        self.track_name     = track_name
+        self.track_album    = track_album
+        self.artist_ids     = tuple(artist_ids)
+        self.artist_names   = tuple(artist_names)
+        self.track_duration = track_duration
+        self.genres         = tuple(genres) if genres is not None else None
+        self.added_by       = added_by
+        self.user_name      = user_name
+
+    def __eq__(self, other):
+        if not isinstance(other, TrackRecord):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __repr__(self):
+        return f"TrackRecord({self.track_id!r}, {self.track_name!r}, added_by={self.added_by!r})"
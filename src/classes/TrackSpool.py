@@ -0,0 +1,233 @@
+from classes.TrackBatch import TrackBatch
+from classes.TrackRecord import TrackRecord
+from dotenv import load_dotenv
+
+import json
+import logging
+import os
+import re
+
+
+load_dotenv()
+
+DEFAULT_SPOOL_DIR = os.path.join(".cache", "spool")
+
+logger = logging.getLogger(__name__)
+
+# The positions of the user fields in the spooled rows
+_ADDED_BY  = TrackRecord.__slots__.index('added_by')
+_USER_NAME = TrackRecord.__slots__.index('user_name')
+
+
+class TrackSpool:
+    """
+    A write-ahead journal of the processed track batches of a playlist, in a local JSON-lines file.
+
+    Every batch is appended and fsynced as soon as it is processed, so the API calls spent on it
+    survive a crash: a restarted run replays the journal and resumes fetching after the last
+    spooled track. The loader drains the journal into the database and truncates it once the
+    data is committed. The first line records the sync the batches belong to; a journal left by
+    a sync resuming from another index or of another snapshot is discarded.
+
+    ...
+
+    Attributes
+    ----------
+    path : str
+        The path of the journal file.
+
+    Methods
+    -------
+    open(last_track_index, snapshot_id, total_tracks, known_users):
+        Replays the journal and readies it for appending, returning the number of spooled tracks.
+
+    header():
+        Returns the first line of the journal, describing the sync it belongs to.
+
+    spooled():
+        Returns the number of tracks in the journal, without opening it for appending.
+
+    append(batch):
+        Appends a processed TrackBatch to the journal and syncs it to disk.
+
+    batches():
+        Yields the spooled batches, in order.
+
+    truncate():
+        Empties the journal, once its batches are committed to the database.
+    """
+
+    def __init__(self, playlist_id, directory=None):
+        """
+        Parameters
+        ----------
+        playlist_id : str
+            The URI or ID of the playlist, which names the journal file.
+        directory : str, optional
+            The folder of the journals. Defaults to the SPOOL_DIR environment variable.
+        """
+        directory = directory or os.getenv("SPOOL_DIR", DEFAULT_SPOOL_DIR)
+        os.makedirs(directory, exist_ok=True)
+
+        self.playlist_id = playlist_id
+        self.path        = os.path.join(directory, re.sub(r"[^\w.-]", "_", playlist_id) + ".jsonl")
+
+        self._tracks = 0
+
+    def _entries(self):
+        """
+        Yields every parsed line of the journal with the byte offset where it ends.
+
+        A crash while appending leaves at most one torn line at the end, where the iteration stops.
+        """
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            end = 0
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("torn line")
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning("Dropping a torn line at byte %d of %s", end, self.path)
+                    return
+                end += len(line)
+                yield entry, end
+
+    def _write(self, entry):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def open(self, last_track_index, snapshot_id=None, total_tracks=None, known_users=None):
+        """
+        Replays the journal and readies it for appending.
+
+        Parameters
+        ----------
+        last_track_index : int or None
+            The index the sync resumes from, as stored by the previous sync.
+        snapshot_id : str, optional
+            The snapshot of the playlist being synced. A journal of another snapshot is discarded,
+            since its tracks may sit at other indices.
+        total_tracks : int, optional
+            The number of tracks of that snapshot, recorded for the loader of a new journal.
+        known_users : dict, optional
+            The known users, updated in place with the users of the replayed tracks so they
+            aren't requested again.
+
+        Returns
+        -------
+        int
+            The number of tracks already spooled after last_track_index.
+        """
+        header  = {
+            'playlist_id': self.playlist_id, 'last_track_index': last_track_index,
+            'snapshot_id': snapshot_id, 'total_tracks': total_tracks
+        }
+        entries = self._entries()
+        first   = next(entries, None)
+
+        if first is not None and all(
+            first[0].get(key) == header[key] for key in ('playlist_id', 'last_track_index', 'snapshot_id')
+        ):
+            valid  = first[1]
+            tracks = 0
+            for entry, valid in entries:
+                tracks += len(entry['tracks'])
+                if known_users is not None:
+                    for row in entry['tracks']:
+                        known_users.setdefault(row[_ADDED_BY], row[_USER_NAME])
+            # Drop the torn tail, so the next append starts on a clean line
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid)
+                os.fsync(f.fileno())
+            self._tracks = tracks
+            if tracks:
+                logger.info("Replaying %d spooled tracks of playlist %s from %s", tracks, self.playlist_id, self.path)
+            return tracks
+
+        entries.close()
+        if first is not None:
+            logger.warning("Discarding the spool %s of another sync (%s)", self.path, first[0])
+        self.truncate()
+        self._write(header)
+        return 0
+
+    def header(self):
+        """
+        Returns the first line of the journal, describing the sync it belongs to.
+
+        Returns
+        -------
+        dict or None
+            The 'playlist_id', 'last_track_index', 'snapshot_id' and 'total_tracks' of the sync,
+            or None if the journal is empty.
+        """
+        entries = self._entries()
+        first = next(entries, None)
+        entries.close()
+        return first[0] if first is not None else None
+
+    def spooled(self):
+        """
+        Returns the number of tracks in the journal, without opening it for appending.
+        """
+        entries = self._entries()
+        next(entries, None)
+        return sum(len(entry['tracks']) for entry, _ in entries)
+
+    def append(self, batch):
+        """
+        Appends a processed TrackBatch to the journal and syncs it to disk.
+
+        Parameters
+        ----------
+        batch : classes.TrackBatch.TrackBatch
+            The processed tracks.
+
+        Returns
+        -------
+        None
+        """
+        self._write({
+            'tracks': [[getattr(record, field) for field in TrackRecord.__slots__] for record in batch],
+            'artists_genres': [
+                [artist_id, batch.genres_of_artist(code)] for code, artist_id in enumerate(batch.artists.values)
+            ],
+        })
+        self._tracks += len(batch)
+
+    def batches(self):
+        """
+        Yields the spooled batches, in order.
+
+        Yields
+        ------
+        classes.TrackBatch.TrackBatch
+            The processed tracks of each appended batch.
+        """
+        entries = self._entries()
+        # The first line is the header
+        next(entries, None)
+        for entry, _ in entries:
+            yield TrackBatch.from_records(
+                (TrackRecord(*row) for row in entry['tracks']),
+                {artist_id: genres for artist_id, genres in entry['artists_genres']}
+            )
+
+    def truncate(self):
+        """
+        Empties the journal, once its batches are committed to the database.
+        """
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self._tracks = 0
+
+    def __len__(self):
+        return self._tracks
@@ -0,0 +1,444 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+
+
+logger = logging.getLogger("cli")
+
+
+# Every subcommand imports the modules it needs in its own function, so `status` and `load`
+# never import spotipy, and only `export` imports numpy.
+
+
+class LazyClient:
+    """
+    A proxy that builds a client on first use, e.g. the Spotify client and its OAuth flow.
+
+    A stage that never reaches the API (every artist cached, every user known) skips the
+    client's imports and its authentication altogether.
+
+    ...
+
+    Attributes
+    ----------
+    built : bool
+        Whether the client was built.
+    """
+
+    def __init__(self, factory):
+        """
+        Parameters
+        ----------
+        factory : callable
+            Returns the client, called once on the first attribute access. None means the
+            client couldn't be built, and every access then raises a RuntimeError.
+        """
+        self._factory = factory
+        self._client  = None
+        self._failed  = False
+        self._lock    = threading.Lock()
+
+    @property
+    def built(self):
+        return self._client is not None
+
+    def __getattr__(self, name):
+        if self._client is None:
+            with self._lock:
+                if self._client is None and not self._failed:
+                    self._client = self._factory()
+                    self._failed = self._client is None
+        if self._failed:
+            raise RuntimeError("The client couldn't be initialized, check the credentials and the logs above")
+        return getattr(self._client, name)
+
+
+def spotify_client():
+    from lib.spClient import generate_sp_client
+
+    return generate_sp_client()
+
+
+def playlist_uris_from_env():
+    """
+    Returns the playlists to sync: the comma-separated PLAYLIST_URIS environment variable, or
+    PLAYLIST_URI when it is unset.
+
+    Returns
+    -------
+    list of str
+        The playlist URIs or IDs, without duplicates.
+    """
+    uris = os.getenv("PLAYLIST_URIS") or os.environ["PLAYLIST_URI"]
+    return list(dict.fromkeys(uri.strip() for uri in uris.split(",") if uri.strip()))
+
+
+def fetched_path(spool):
+    """
+    Returns the path of the file where `fetch` stores the raw tracks of a playlist, next to
+    its spool.
+    """
+    return spool.path[:-len(".jsonl")] + ".fetched.jsonl"
+
+
+def read_fetched(path):
+    """
+    Reads a file written by `fetch`.
+
+    Returns
+    -------
+    tuple
+        The header of the file (a dict) and a generator of its pages (lists of TrackRecord).
+    """
+    from classes.TrackRecord import TrackRecord
+
+    with open(path, encoding='utf-8') as f:
+        header = json.loads(f.readline())
+
+    def pages():
+        with open(path, encoding='utf-8') as f:
+            # The first line is the header
+            f.readline()
+            for line in f:
+                yield [TrackRecord(*row) for row in json.loads(line)]
+
+    return header, pages()
+
+
+def skip_tracks(pages, count):
+    """
+    Yields the pages without their first count tracks.
+    """
+    for page in pages:
+        if count >= len(page):
+            count -= len(page)
+            continue
+        yield page[count:]
+        count = 0
+
+
+def start_run():
+    from lib.dbClient import set_connection_wrapper
+    from lib.metrics import metrics
+
+    # Count every DB statement per table for the run report
+    set_connection_wrapper(metrics.wrap_connection)
+
+
+def finish_run(name, sp=None):
+    from lib.metrics import metrics
+
+    if sp is not None and sp.built:
+        logger.info("Spotify API stats: %s", sp.stats())
+
+    report = metrics.report()
+    logger.info(
+        "%s finished in %.1fs | stages: %s | DB statements: %s | rows written: %s",
+        name.capitalize(), report['duration_seconds'], report['stages_seconds'], report['db_statements'], report['rows_written']
+    )
+    metrics.export()
+
+
+def fetch(args):
+    """
+    Fetches the tracks added to the playlists since their last sync into local files.
+    """
+    from classes.TrackRecord import TrackRecord
+    from classes.TrackSpool import TrackSpool
+    from fetch_tracks import iter_track_pages
+    from helper.get_sync_state import get_sync_state
+    from lib.metrics import metrics
+    from sync_playlists import last_stored_index
+
+    start_run()
+    sp = LazyClient(spotify_client)
+
+    for playlist_id in args.playlists:
+        playlist = sp.playlist(playlist_id, fields="snapshot_id,tracks.total")
+        sync_state = get_sync_state(playlist_id)
+
+        if sync_state is not None and sync_state['snapshot_id'] == playlist['snapshot_id']:
+            logger.info("Playlist %s unchanged since %s, nothing to fetch", playlist_id, sync_state['synced_at'])
+            continue
+
+        # Resume after the tracks already stored, then after the ones already enriched
+        last_track_index = last_stored_index(sync_state, legacy_resume=len(args.playlists) == 1)
+        spool = TrackSpool(playlist_id)
+        header = spool.header()
+        resumable = (
+            header is not None and header.get('last_track_index') == last_track_index
+            and header.get('snapshot_id') == playlist['snapshot_id']
+        )
+        spooled = spool.spooled() if resumable else 0
+        first_track_index = (last_track_index if last_track_index is not None else -1) + spooled + 1
+
+        path = fetched_path(spool)
+        fetched = 0
+        with metrics.stage("fetch"), open(path + ".tmp", 'w', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'playlist_id': playlist_id, 'snapshot_id': playlist['snapshot_id'],
+                'total_tracks': playlist['tracks']['total'],
+                'last_track_index': last_track_index, 'first_track_index': first_track_index
+            }) + "\n")
+            for page in iter_track_pages(
+                sp, first_track_index - 1 if first_track_index > 0 else None,
+                int(os.getenv("FETCH_WORKERS", 4)), playlist_id
+            ):
+                f.write(json.dumps(
+                    [[getattr(record, field) for field in TrackRecord.__slots__] for record in page],
+                    ensure_ascii=False
+                ) + "\n")
+                fetched += len(page)
+        os.replace(path + ".tmp", path)
+
+        logger.info("Playlist %s: fetched %d tracks from index %d to %s", playlist_id, fetched, first_track_index, path)
+
+    finish_run("fetch", sp)
+    return 0
+
+
+def enrich(args):
+    """
+    Adds the genres and the user names to the fetched tracks, appending them to the spools.
+    """
+    from classes.ArtistCache import ArtistCache
+    from classes.DatabaseLoader import DatabaseLoader
+    from classes.TrackSpool import TrackSpool
+    from helper.get_sync_state import get_sync_state
+    from lib.metrics import metrics
+    from process_tracks import iter_processed_tracks
+    from sync_playlists import group_pages
+
+    start_run()
+    sp = LazyClient(spotify_client)
+
+    artist_cache = ArtistCache()
+    known_users  = DatabaseLoader.fetch_known_users()
+
+    for playlist_id in args.playlists:
+        spool = TrackSpool(playlist_id)
+        path = fetched_path(spool)
+        if not os.path.exists(path):
+            logger.info("Playlist %s: no fetched tracks, run `fetch` first", playlist_id)
+            continue
+
+        header, pages = read_fetched(path)
+
+        # The database may have moved on since the fetch, e.g. after loading a partial spool
+        sync_state = get_sync_state(playlist_id)
+        last_track_index = sync_state['last_track_index'] if sync_state is not None else header['last_track_index']
+        spooled = spool.open(last_track_index, header['snapshot_id'], header['total_tracks'], known_users)
+
+        # A rerun skips the fetched tracks that are stored or that an interrupted one already spooled
+        skip = (last_track_index if last_track_index is not None else -1) + spooled + 1 - header['first_track_index']
+        if skip < 0:
+            raise RuntimeError(
+                f"The tracks fetched for playlist {playlist_id} start at index {header['first_track_index']}, "
+                f"after the {spooled} spooled ones: run `fetch` again"
+            )
+
+        batches = group_pages(skip_tracks(pages, skip), int(os.getenv("SPOOL_BATCH_SIZE", 500)))
+
+        with metrics.stage("process"):
+            for batch in iter_processed_tracks(
+                sp, batches, artist_cache, known_users, int(os.getenv("USER_FETCH_WORKERS", 4))
+            ):
+                spool.append(batch)
+
+        # Every fetched track is in the spool now
+        os.remove(path)
+        logger.info("Playlist %s: %d tracks spooled, %d of them by a previous run", playlist_id, len(spool), spooled)
+
+    logger.info("Artist cache stats: %s", artist_cache.stats())
+    artist_cache.close()
+
+    finish_run("enrich", sp)
+    return 0
+
+
+def load(args):
+    """
+    Loads the spooled tracks into the database and records the sync state.
+    """
+    from classes.TrackSpool import TrackSpool
+    from helper.get_sync_state import get_sync_state
+    from helper.save_sync_state import save_sync_state
+    from lib.metrics import metrics
+    from load_tracks import load_batches
+
+    start_run()
+    chunk_size = int(os.getenv("DB_CHUNK_SIZE", 1000))
+
+    for playlist_id in args.playlists:
+        spool = TrackSpool(playlist_id)
+        header = spool.header()
+        spooled = spool.spooled()
+        if header is None or not spooled:
+            logger.info("Playlist %s: no spooled tracks to load", playlist_id)
+            continue
+
+        sync_state = get_sync_state(playlist_id)
+        if sync_state is not None and sync_state['last_track_index'] != header['last_track_index']:
+            logger.warning(
+                "Playlist %s: skipping the spool %s, it resumes from index %s but the database is at %s",
+                playlist_id, spool.path, header['last_track_index'], sync_state['last_track_index']
+            )
+            continue
+
+        with metrics.stage("load"):
+            load_batches(spool.batches(), chunk_size=chunk_size)
+
+        last_track_index = (header['last_track_index'] if header['last_track_index'] is not None else -1) + spooled
+        if header.get('total_tracks') is not None and last_track_index == header['total_tracks'] - 1:
+            snapshot_id = header['snapshot_id']
+        else:
+            # A partial load keeps the previous snapshot, so the next run resumes instead of skipping
+            snapshot_id = sync_state['snapshot_id'] if sync_state is not None else ""
+
+        save_sync_state(playlist_id, snapshot_id, last_track_index)
+        spool.truncate()
+        logger.info("Playlist %s: loaded %d tracks, now at index %d", playlist_id, spooled, last_track_index)
+
+    finish_run("load")
+    return 0
+
+
+def sync(args):
+    """
+    Fetches, processes and loads the playlists in one run, see sync_playlists.
+    """
+    from classes.ArtistCache import ArtistCache
+    from classes.DatabaseLoader import DatabaseLoader
+    from lib.metrics import metrics
+    from sync_playlists import sync_playlists
+
+    start_run()
+    sp = LazyClient(spotify_client)
+
+    # One client, rate limiter and set of caches for every playlist of the run
+    artist_cache = ArtistCache()
+    known_users  = DatabaseLoader.fetch_known_users()
+
+    results = sync_playlists(
+        sp_client=sp,
+        playlist_ids=args.playlists,
+        artist_cache=artist_cache,
+        known_users=known_users,
+        max_workers=int(os.getenv("PLAYLIST_WORKERS", 2))
+    )
+
+    logger.info("Artist cache stats: %s", artist_cache.stats())
+    artist_cache.close()
+
+    # Refresh the local snapshot the notebooks read instead of MySQL
+    if os.getenv("SNAPSHOT_PATH") and any(result['status'] == 'synced' for result in results):
+        from helper.export_snapshot import export_snapshot
+
+        with metrics.stage("export"):
+            export_snapshot(os.environ["SNAPSHOT_PATH"])
+
+    finish_run("sync", sp)
+    return 1 if any(result['status'] == 'failed' for result in results) else 0
+
+
+def status(args):
+    """
+    Prints the sync state and the pending local files of the playlists, without any API request.
+    """
+    from classes.TrackSpool import TrackSpool
+    from helper.get_sync_state import get_sync_state
+
+    for playlist_id in args.playlists:
+        sync_state = get_sync_state(playlist_id)
+        spool = TrackSpool(playlist_id)
+
+        fetched = 0
+        if os.path.exists(fetched_path(spool)):
+            fetched = sum(len(page) for page in read_fetched(fetched_path(spool))[1])
+
+        if sync_state is None:
+            state = "never synced"
+        else:
+            state = (
+                f"snapshot {sync_state['snapshot_id'] or '-'}, last track index {sync_state['last_track_index']}, "
+                f"synced at {sync_state['synced_at']}"
+            )
+        print(f"{playlist_id}: {state} | fetched {fetched} | spooled {spool.spooled()}")
+
+    return 0
+
+
+def export(args):
+    """
+    Exports the normalized tables to the analytics snapshot, see helper.export_snapshot.
+    """
+    from helper.export_snapshot import export_snapshot
+
+    export_snapshot(args.path, args.database)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Sync Spotify playlists into the database, in one run or stage by stage")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    commands = {
+        'fetch': (fetch, "fetch the new tracks of the playlists into local files"),
+        'enrich': (enrich, "add the genres and user names to the fetched tracks, into the spools"),
+        'load': (load, "load the spooled tracks into the database"),
+        'sync': (sync, "fetch, enrich and load the playlists in one run"),
+        'status': (status, "print the sync state and the pending files of the playlists"),
+    }
+    for name, (handler, help_text) in commands.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument(
+            "playlists", nargs="*", help="playlist URIs or IDs, defaults to PLAYLIST_URIS or PLAYLIST_URI"
+        )
+        subparser.set_defaults(handler=handler)
+
+    subparser = subparsers.add_parser('export', help="export the analytics snapshot")
+    subparser.add_argument("--path", default=None, help="defaults to SNAPSHOT_PATH, or .cache/snapshot")
+    subparser.add_argument("--database", default=None)
+    subparser.set_defaults(handler=export)
+
+    return parser
+
+
+def main(argv=None):
+    """
+    Runs a subcommand of the command line.
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        The arguments, defaults to sys.argv[1:].
+
+    Returns
+    -------
+    int
+        The exit status.
+    """
+    from dotenv import load_dotenv
+    from lib.metrics import configure_logging
+
+    load_dotenv()
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    if hasattr(args, "playlists"):
+        try:
+            args.playlists = list(dict.fromkeys(args.playlists)) or playlist_uris_from_env()
+        except KeyError:
+            parser.error("no playlist given, and neither PLAYLIST_URIS nor PLAYLIST_URI is set")
+    if args.command == "export":
+        args.path = args.path or os.getenv("SNAPSHOT_PATH", ".cache/snapshot")
+
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
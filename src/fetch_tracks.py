@@ -1,63 +1,168 @@
+from classes.TrackRecord import TrackRecord
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from itertools import islice
+from lib.metrics import metrics
 
+import logging
 import os
+import time
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
 
-def fetch_tracks(sp_client, last_track_index=None):
+# Maximum number of items returned by the playlist items endpoint
+PAGE_SIZE = 100
+
+# Minimum number of seconds between two progress log lines
+PROGRESS_INTERVAL = 5
+
+
+def parse_playlist_items(items, start, last_track_index=None):
         """
-        Fetches all the tracks of the playlist starting from the last_track_index if provided.
+        Extracts the track information of a page of playlist items.
 
         Parameters
         ----------
+        items : list
+            The 'items' of a playlist_tracks response.
+        start : int
+            The playlist index of the first item of the page.
         last_track_index : int, optional
-            The index of the last track from which to start fetching. If None, fetch all tracks.
+            Items up to this index are skipped.
 
         Returns
         -------
+        list of classes.TrackRecord.TrackRecord
+            The tracks of the page, without genres and user_name yet.
+        """
+        tracks = []
+        for index, item in enumerate(items, start=start):
+            track       = item['track']
+            added_by_id = item['added_by']['id']  # Get the ID of the user who added the track
+
+            # Retrieve additional track details
+            track_id       = track['id']
+            track_name     = track['name']
+            track_album    = track['album']['name']
+            track_artist_ids = [artist['id'] for artist in track['artists']]
+            track_artists  = [artist['name'] for artist in track['artists']]
+            track_duration = track['duration_ms']
+
+            # Append the track to the list of tracks if it's newer than the last_track_index
+            if last_track_index is None or index > last_track_index:
+                tracks.append(TrackRecord(
+                    track_id, track_name, track_album, track_artist_ids, track_artists, track_duration,
+                    added_by=added_by_id
+                ))
+
+        return tracks
+
+
+def iter_track_pages(sp_client, last_track_index=None, max_workers=1, playlist_uri=None):
+        """
+        Yields the tracks of a playlist one page at a time, starting from the last_track_index if provided.
+
+        With more than one worker, the first page is used to read the playlist total and the
+        remaining pages are requested concurrently, with at most twice as many pages in flight
+        as there are workers so memory stays bounded. Pages are always yielded in playlist order.
+
+        Parameters
+        ----------
+        last_track_index : int, optional
+            The index of the last track from which to start fetching. If None, fetch all tracks.
+        max_workers : int, optional
+            The number of pages fetched concurrently.
+        playlist_uri : str, optional
+            The playlist to fetch. Defaults to the PLAYLIST_URI environment variable.
+
+        Yields
+        ------
         list
-            A list of tuples containing the track information.
+            The tracks of a page, as returned by parse_playlist_items.
         """
-        all_tracks = []  # Initialize an empty list to store the tracks
+        if playlist_uri is None:
+            playlist_uri = os.environ["PLAYLIST_URI"]
 
         # Initialize the offset for pagination
-        offset = last_track_index
-        print(f"total of tracks in the db: {last_track_index}")
+        offset = last_track_index or 0
+
+        def fetch_page(page_offset):
+            logger.debug("Fetching page at offset %d of playlist %s", page_offset, playlist_uri)
+            return sp_client.playlist_tracks(playlist_uri, offset=page_offset, limit=PAGE_SIZE)
+
+        if max_workers > 1:
+            logger.info("Gathering tracks from the playlist starting from track number %d with %d workers", offset, max_workers)
+            first_page = fetch_page(offset)
+            yield parse_playlist_items(first_page['items'], offset, last_track_index)
+
+            # The first page reports the total, so every remaining offset is known up front
+            offsets = iter(range(offset + PAGE_SIZE, first_page['total'], PAGE_SIZE))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                in_flight = deque()
+                for page_offset in islice(offsets, max_workers * 2):
+                    in_flight.append((page_offset, executor.submit(fetch_page, page_offset)))
+
+                # Consume the pages in offset order, keeping the window of pending requests full
+                while in_flight:
+                    page_offset, future = in_flight.popleft()
+                    for next_offset in islice(offsets, 1):
+                        in_flight.append((next_offset, executor.submit(fetch_page, next_offset)))
+                    yield parse_playlist_items(future.result()['items'], page_offset, last_track_index)
+            return
+
+        logger.info("Gathering tracks from the playlist starting from track number %d", offset)
 
         # Continue fetching until there are no more tracks to retrieve
         while True:
             # Fetch the next batch of tracks from the playlist with the specified offset
-            print(f"Gathering tracks from the playlist starting from track number: {offset}...")
-            results = sp_client.playlist_tracks(
-                os.environ["PLAYLIST_URI"], offset=offset, limit=100
-            )
+            results = fetch_page(offset)
 
             # If there are no items in the results, break the loop
             if not results['items']:
                 break
 
-            for index, item in enumerate(results['items'], start=offset):
-                track       = item['track']
-                added_by_id = item['added_by']['id']  # Get the ID of the user who added the track
-
-                # Retrieve additional track details
-                track_id       = track['id']
-                track_name     = track['name']
-                track_album    = track['album']['name']
-                track_artists  = [artist['name'] for artist in track['artists']]
-                track_duration = track['duration_ms']
-
-                # Append the track to the list of tracks if it's newer than the last_track_index
-                if last_track_index is None or index > last_track_index:
-                    all_tracks.append((track_id, track_name, track_album, track_artists, track_duration, added_by_id))
-
-            print(f"Gathered {len(all_tracks)} tracks")
+            yield parse_playlist_items(results['items'], offset, last_track_index)
 
             # Check if there are more tracks to retrieve (pagination)
             if results['next']:
-                offset += 100  # Increment the offset for the next batch
+                offset += PAGE_SIZE  # Increment the offset for the next batch
             else:
                 break
 
-        return all_tracks
\ No newline at end of file
+
+def fetch_tracks(sp_client, last_track_index=None, max_workers=1, playlist_uri=None):
+        """
+        Fetches all the tracks of a playlist starting from the last_track_index if provided.
+
+        Parameters
+        ----------
+        last_track_index : int, optional
+            The index of the last track from which to start fetching. If None, fetch all tracks.
+        max_workers : int, optional
+            The number of pages fetched concurrently. With more than one worker, the first page
+            is used to read the playlist total and every remaining page is requested in parallel.
+        playlist_uri : str, optional
+            The playlist to fetch. Defaults to the PLAYLIST_URI environment variable.
+
+        Returns
+        -------
+        list of classes.TrackRecord.TrackRecord
+            The fetched tracks, without genres and user_name yet.
+        """
+        all_tracks = []  # Initialize an empty list to store the tracks
+        logger.info("Last stored track index: %s", last_track_index)
+
+        with metrics.stage("fetch"):
+            last_report = time.monotonic()
+            for page in iter_track_pages(sp_client, last_track_index, max_workers, playlist_uri):
+                all_tracks.extend(page)
+                # Progress summary at most every few seconds instead of a line per page
+                if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                    logger.info("Gathered %d tracks so far", len(all_tracks))
+                    last_report = time.monotonic()
+
+        logger.info("Gathered %d tracks", len(all_tracks))
+        return all_tracks
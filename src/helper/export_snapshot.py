@@ -0,0 +1,170 @@
+from lib.metrics import configure_logging
+from lib.storage import get_backend
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+
+
+SNAPSHOT_VERSION = 1
+
+# Dimension tables: name -> (query, ((column, kind), ...)). Rows are sorted by key so the
+# codes of the link tables are stable between exports of the same data.
+DIMENSIONS = {
+    'tracks': (
+        "SELECT track_id, track_name, track_album, track_duration FROM Tracks ORDER BY track_id",
+        (('track_id', 'str'), ('track_name', 'str'), ('track_album', 'str'), ('track_duration', 'int'))
+    ),
+    'users': ("SELECT user_id, user_name FROM Users ORDER BY user_id", (('user_id', 'str'), ('user_name', 'str'))),
+    'artists': ("SELECT artist_id, artist_name FROM Artists ORDER BY artist_id", (('artist_id', 'str'), ('artist_name', 'str'))),
+    'genres': ("SELECT genre_id, genre_name FROM Genres ORDER BY genre_id", (('genre_id', 'int'), ('genre_name', 'str'))),
+}
+
+# Link tables: name -> (query, ((column, referenced dimension), ...))
+LINKS = {
+    'track_artists': ("SELECT track_id, artist_id FROM TrackArtists", (('track_id', 'tracks'), ('artist_id', 'artists'))),
+    'track_genres': ("SELECT track_id, genre_id FROM TrackGenres", (('track_id', 'tracks'), ('genre_id', 'genres'))),
+    'user_tracks': ("SELECT user_id, track_id FROM UserTracks", (('user_id', 'users'), ('track_id', 'tracks'))),
+}
+
+
+def _write_strings(directory, name, values):
+    """
+    Writes a string column as one UTF-8 blob plus an int64 array of n + 1 offsets.
+    """
+    encoded = [(value or "").encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+
+    with open(os.path.join(directory, f"{name}.bin"), 'wb') as f:
+        f.write(b"".join(encoded))
+    np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+
+
+def _publish(path, version_path):
+    """
+    Points the symlink at path to a complete export, then deletes the versions older than the
+    one it replaces.
+    """
+    link_tmp = path + ".link.tmp"
+    if os.path.lexists(link_tmp):
+        os.remove(link_tmp)
+    # A relative target, so the snapshot and its versions can be moved together
+    os.symlink(os.path.basename(version_path), link_tmp)
+
+    previous = os.path.realpath(path) if os.path.islink(path) else None
+    old_path = path + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.isdir(path) and not os.path.islink(path):
+        # A snapshot exported before the versioned layout: a directory can't be renamed over,
+        # so it is moved aside once, the only time path is briefly missing
+        os.replace(path, old_path)
+    os.replace(link_tmp, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    directory, name = os.path.split(os.path.abspath(path))
+    keep = {os.path.realpath(version_path), previous}
+    for entry in os.listdir(directory):
+        version = entry[len(name) + 1:] if entry.startswith(name + ".") else ""
+        if version.isdigit() and os.path.realpath(os.path.join(directory, entry)) not in keep:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+
+def export_snapshot(path, database=None):
+    """
+    Writes the normalized tables to a columnar snapshot the notebooks can memory-map.
+
+    The snapshot is a directory with one file per column: integer columns and the link table
+    codes are .npy arrays, string columns are a .bin UTF-8 blob with a .offsets.npy array, and
+    manifest.json lists the tables, their row counts and which dimension each code references.
+    A link table column holds the row positions of the referenced dimension rows (int32), so it
+    can be counted with np.bincount without decoding any string.
+
+    Every export is written to a new versioned directory next to the target (<path>.<version>),
+    and path is a symlink to the latest one. Publishing swaps the symlink with a single rename, so
+    path always names a complete export, and a reader that resolved the previous one keeps it
+    until the next export, when the versions before it are deleted.
+
+    Parameters
+    ----------
+    path : str
+        The symlink to the snapshot, replaced if it already exists.
+    database : str, optional
+        The database to export. Defaults to the DB_CONNECTION_DATABASE environment variable.
+
+    Returns
+    -------
+    dict
+        The manifest of the snapshot.
+    """
+    started = time.perf_counter()
+    path = path.rstrip(os.sep)
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    manifest = {'version': SNAPSHOT_VERSION, 'created': time.time(), 'tables': {}}
+    positions = {}
+
+    mydb = get_backend().connect(database)
+    mycursor = mydb.cursor()
+
+    try:
+        for table, (query, columns) in DIMENSIONS.items():
+            mycursor.execute(query)
+            rows = mycursor.fetchall()
+
+            for i, (column, kind) in enumerate(columns):
+                values = [row[i] for row in rows]
+                if kind == 'str':
+                    _write_strings(tmp_path, f"{table}.{column}", values)
+                else:
+                    np.save(os.path.join(tmp_path, f"{table}.{column}.npy"), np.array([value or 0 for value in values], dtype=np.int64))
+
+            # The key is the first column of every dimension
+            positions[table] = {row[0]: i for i, row in enumerate(rows)}
+            manifest['tables'][table] = {'rows': len(rows), 'columns': dict(columns)}
+
+        for table, (query, columns) in LINKS.items():
+            mycursor.execute(query)
+            rows = mycursor.fetchall()
+
+            for i, (column, dimension) in enumerate(columns):
+                lookup = positions[dimension]
+                codes = np.fromiter((lookup.get(row[i], -1) for row in rows), dtype=np.int32, count=len(rows))
+                np.save(os.path.join(tmp_path, f"{table}.{column}.npy"), codes)
+
+            manifest['tables'][table] = {'rows': len(rows), 'references': dict(columns)}
+
+    finally:
+        mycursor.close()
+        mydb.close()
+
+    with open(os.path.join(tmp_path, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    version_path = f"{path}.{time.time_ns()}"
+    os.replace(tmp_path, version_path)
+    _publish(path, version_path)
+
+    logging.getLogger(__name__).info(
+        "Exported the analytics snapshot to %s in %.2fs (%s)",
+        path, time.perf_counter() - started,
+        ", ".join(f"{table}: {info['rows']}" for table, info in manifest['tables'].items())
+    )
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the normalized tables to a memory-mappable snapshot")
+    parser.add_argument("--path", default=os.getenv("SNAPSHOT_PATH", ".cache/snapshot"))
+    parser.add_argument("--database", default=None)
+    args = parser.parse_args()
+
+    configure_logging()
+    export_snapshot(args.path, args.database)
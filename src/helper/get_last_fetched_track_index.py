@@ -1,17 +1,23 @@
-import mysql.connector
-import os
+from lib.storage import get_backend
+
+import logging
 
 
 def get_last_fetched_track_index():
-       
+        """
+        Estimates the index of the last stored track from the number of rows in Tracks.
+
+        This is only the fallback for databases synced before the SyncState table existed, see
+        helper.get_sync_state for the regular resume point.
+
+        Returns
+        -------
+        int or None
+            The index of the last stored track, or None if there are no tracks (or the count failed).
+        """
         try:
             # Establish a connection to the database
-            mydb = mysql.connector.connect(
-                host    =os.getenv("DB_CONNECTION_HOST"),
-                user    =os.getenv("DB_CONNECTION_USER"),
-                password=os.getenv("DB_CONNECTION_PASSWORD"),
-                database=os.getenv("DB_CONNECTION_DATABASE")
-            )
+            mydb = get_backend().connect()
 
             mycursor = mydb.cursor()
 
@@ -19,13 +25,14 @@ def get_last_fetched_track_index():
             query = "SELECT COUNT(*) FROM Tracks"
             mycursor.execute(query)
 
-            last_track_index = mycursor.fetchone()[0]
+            track_count = mycursor.fetchone()[0]
 
             # Close the database connection
             mydb.close()
 
-            return last_track_index
+            # Indexes start at 0, so the last stored track is the one before the count
+            return track_count - 1 if track_count else None
 
         except Exception as e:
-            print(f"Error fetching last track index from the database: {e}")
-            return None
\ No newline at end of file
+            logging.getLogger(__name__).error("Error fetching last track index from the database: %s", e)
+            return None
@@ -0,0 +1,47 @@
+from lib.storage import get_backend
+
+import logging
+
+
+def get_sync_state(playlist_id):
+        """
+        Returns the state stored by the previous sync of a playlist.
+
+        Parameters
+        ----------
+        playlist_id : str
+            The ID of the playlist.
+
+        Returns
+        -------
+        dict or None
+            A dictionary with the keys 'snapshot_id', 'last_track_index' and 'synced_at', or
+            None if the playlist was never synced (or the SyncState table doesn't exist).
+        """
+        backend = get_backend()
+        mydb = backend.connect()
+        mycursor = mydb.cursor()
+
+        try:
+            # Single primary key lookup
+            mycursor.execute(
+                "SELECT snapshot_id, last_track_index, synced_at FROM SyncState WHERE playlist_id = %s",
+                (playlist_id,)
+            )
+            row = mycursor.fetchone()
+
+        except Exception as e:
+            # Only a database without migration 0001 reads as never synced, any other error
+            # (connection, permissions) must not make the sync start over
+            if not backend.is_missing_table(e):
+                raise
+            logging.getLogger(__name__).warning("The SyncState table doesn't exist, apply the migrations: %s", e)
+            return None
+
+        finally:
+            mydb.close()
+
+        if row is None:
+            return None
+
+        return {'snapshot_id': row[0], 'last_track_index': row[1], 'synced_at': row[2]}
@@ -0,0 +1,254 @@
+from classes.DatabaseLoader import DatabaseLoader
+from lib.metrics import configure_logging, metrics
+from lib.storage import get_backend
+
+import argparse
+import ast
+import csv
+import logging
+import re
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# The items of a list literal without escapes or double quotes, and what may lie between them
+_LIST_ITEM = re.compile(r"'([^']*)'|(None)")
+_LIST_SEPARATORS = re.compile(r"[\s,]*")
+
+# Staging tables, private to the import connection and dropped when it is closed
+STAGING_TABLES = (
+    """CREATE TEMPORARY TABLE ImportTracks (
+        track_id       VARCHAR(255),
+        track_name     VARCHAR(255),
+        track_album    VARCHAR(255),
+        track_duration INT,
+        user_id        VARCHAR(255),
+        user_name      VARCHAR(255)
+    )""",
+    """CREATE TEMPORARY TABLE ImportTrackArtists (
+        track_id    VARCHAR(255),
+        artist_id   VARCHAR(255),
+        artist_name VARCHAR(255)
+    )""",
+    """CREATE TEMPORARY TABLE ImportTrackGenres (
+        track_id   VARCHAR(255),
+        genre_name VARCHAR(255)
+    )""",
+    "CREATE INDEX idx_import_track_genres_genre_name ON ImportTrackGenres (genre_name)",
+)
+
+# The number of tracks of each staged artist. A temporary table can't be opened twice in one
+# query, so it is computed apart from the merge of ArtistGenres.
+ARTIST_TRACKS = """CREATE TEMPORARY TABLE ImportArtistTracks AS
+    SELECT artist_id, COUNT(DISTINCT track_id) AS track_count FROM ImportTrackArtists GROUP BY artist_id"""
+
+# Set-based merge of the staging tables, parents first, as (table, columns, SELECT). The
+# INSERT IGNORE of the storage backend keeps the stored rows.
+MERGE_STATEMENTS = (
+    ("Users", ("user_id", "user_name"),
+        "SELECT user_id, MIN(user_name) FROM ImportTracks GROUP BY user_id"),
+    ("Tracks", ("track_id", "track_name", "track_album", "track_duration", "added_by"),
+        "SELECT track_id, track_name, track_album, track_duration, user_id FROM ImportTracks"),
+    ("Artists", ("artist_id", "artist_name"),
+        "SELECT artist_id, MIN(artist_name) FROM ImportTrackArtists GROUP BY artist_id"),
+    ("TrackArtists", ("track_id", "artist_id"),
+        "SELECT DISTINCT track_id, artist_id FROM ImportTrackArtists"),
+    ("Genres", ("genre_name",),
+        """SELECT DISTINCT S.genre_name FROM ImportTrackGenres S
+        LEFT JOIN Genres G ON G.genre_name = S.genre_name
+        WHERE G.genre_id IS NULL"""),
+    # The CSV only has the union of the genres per track: an artist gets the genres shared by
+    # all its tracks, which the TrackGenres view unions back. Artists with stored genres keep them.
+    ("ArtistGenres", ("artist_id", "genre_id"),
+        """SELECT A.artist_id, G.genre_id FROM ImportTrackArtists A
+        INNER JOIN ImportTrackGenres S ON S.track_id = A.track_id
+        INNER JOIN Genres G ON G.genre_name = S.genre_name
+        INNER JOIN ImportArtistTracks N ON N.artist_id = A.artist_id
+        LEFT JOIN ArtistGenres AG ON AG.artist_id = A.artist_id
+        WHERE AG.artist_id IS NULL
+        GROUP BY A.artist_id, G.genre_id, N.track_count
+        HAVING COUNT(DISTINCT A.track_id) = N.track_count"""),
+    ("UserTracks", ("user_id", "track_id"),
+        "SELECT DISTINCT user_id, track_id FROM ImportTracks"),
+)
+
+# Same as scripts/RebuildAggregates.sql: a backfill touches too many rows for per-key deltas
+REBUILD_AGGREGATES = (
+    "DELETE FROM UserGenreCounts",
+    "DELETE FROM GenreTrackCounts",
+    "DELETE FROM ArtistTrackCounts",
+    "DELETE FROM UserTrackCounts",
+    "INSERT INTO UserTrackCounts (user_id, track_count) SELECT user_id, COUNT(*) FROM UserTracks GROUP BY user_id",
+    "INSERT INTO ArtistTrackCounts (artist_id, track_count) SELECT artist_id, COUNT(*) FROM TrackArtists GROUP BY artist_id",
+    "INSERT INTO GenreTrackCounts (genre_id, track_count) SELECT genre_id, COUNT(*) FROM TrackGenres GROUP BY genre_id",
+    """INSERT INTO UserGenreCounts (user_id, genre_id, track_count)
+        SELECT UT.user_id, TG.genre_id, COUNT(*) FROM UserTracks UT
+        INNER JOIN TrackGenres TG ON UT.track_id = TG.track_id
+        GROUP BY UT.user_id, TG.genre_id""",
+)
+
+
+def parse_list(text):
+    """
+    Parses a list column of the cache CSV, e.g. "['rock', 'grunge']" or "[None]".
+
+    The cells are Python list literals of strings. The common ones are split with a regex,
+    about 3x faster than building an AST, and anything else (escapes, quotes in the names,
+    unexpected syntax) goes through ast.literal_eval, which never executes code.
+
+    Parameters
+    ----------
+    text : str
+        The content of the cell.
+
+    Returns
+    -------
+    list
+        The strings of the list, None for the missing values.
+    """
+    text = text.strip()
+    if not text.startswith("[") or not text.endswith("]"):
+        raise ValueError(f"Not a list literal: {text[:50]!r}")
+
+    # Without double quotes or backslashes every string is single-quoted and contains no quote
+    if '"' not in text and "\\" not in text:
+        inner = text[1:-1]
+        if _LIST_SEPARATORS.fullmatch(_LIST_ITEM.sub("", inner)):
+            return [None if none else value for value, none in _LIST_ITEM.findall(inner)]
+
+    # Rare cells with escapes or unusual formatting
+    values = ast.literal_eval(text)
+    if not isinstance(values, list):
+        raise ValueError(f"Not a list literal: {text[:50]!r}")
+    return values
+
+
+def iter_csv_chunks(csv_path, chunk_size):
+    """
+    Reads the cache CSV in chunks of parsed rows, so the file is never fully in memory.
+
+    Parameters
+    ----------
+    csv_path : str
+        The path of the CSV file.
+    chunk_size : int
+        The number of rows per chunk.
+
+    Yields
+    ------
+    tuple of list
+        The rows of ImportTracks, ImportTrackArtists and ImportTrackGenres of the chunk.
+    """
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        tracks, track_artists, track_genres = [], [], []
+
+        for row in reader:
+            track_id = row['track_id']
+            tracks.append((
+                track_id, row['track_name'], row['track_album'], int(row['track_duration']), row['user_id'], row['user_name']
+            ))
+
+            for artist_id, artist_name in zip(parse_list(row['artist_id']), parse_list(row['artist_name'])):
+                # Missing artists are stored like the loader does
+                track_artists.append((
+                    track_id,
+                    artist_id if artist_id is not None else "No Artist",
+                    artist_name if artist_name is not None else "No Artist"
+                ))
+
+            track_genres.extend((track_id, genre) for genre in parse_list(row['genres']))
+
+            if len(tracks) >= chunk_size:
+                yield tracks, track_artists, track_genres
+                tracks, track_artists, track_genres = [], [], []
+
+        if tracks:
+            yield tracks, track_artists, track_genres
+
+
+def import_csv(csv_path, chunk_size=5000, database=None):
+    """
+    Imports a cache CSV (e.g. deprecated/data/playlist_data_cache.csv) into the database.
+
+    The file is streamed in chunks into temporary staging tables with multi-row INSERTs, then
+    merged into the schema with one set-based statement per table and the summary tables are
+    rebuilt, all in a single transaction. Track genres are stored per artist in ArtistGenres.
+
+    Parameters
+    ----------
+    csv_path : str
+        The path of the CSV file, with the columns track_id, track_name, track_album, artist_id,
+        artist_name, track_duration, genres, user_id and user_name.
+    chunk_size : int, optional
+        The number of CSV rows staged at a time.
+    database : str, optional
+        The database to import into (the file path with SQLite). Defaults to the
+        DB_CONNECTION_DATABASE environment variable (SQLITE_PATH with SQLite).
+
+    Returns
+    -------
+    dict
+        The number of rows written per table.
+    """
+    started = time.perf_counter()
+    written = {}
+    staged = 0
+
+    backend = get_backend()
+    mydb = backend.connect(database)
+    mycursor = mydb.cursor()
+
+    try:
+        for statement in STAGING_TABLES:
+            mycursor.execute(statement)
+
+        with metrics.stage("import.stage"):
+            for tracks, track_artists, track_genres in iter_csv_chunks(csv_path, chunk_size):
+                DatabaseLoader.insert_ignore_many(
+                    mycursor, "ImportTracks",
+                    ("track_id", "track_name", "track_album", "track_duration", "user_id", "user_name"), tracks
+                )
+                DatabaseLoader.insert_ignore_many(mycursor, "ImportTrackArtists", ("track_id", "artist_id", "artist_name"), track_artists)
+                DatabaseLoader.insert_ignore_many(mycursor, "ImportTrackGenres", ("track_id", "genre_name"), track_genres)
+                staged += len(tracks)
+                logger.debug("Staged %d rows", staged)
+
+        with metrics.stage("import.merge"):
+            mycursor.execute(ARTIST_TRACKS)
+            for table, columns, select in MERGE_STATEMENTS:
+                mycursor.execute(backend.insert_ignore_select_sql(table, columns, select))
+                written[table] = mycursor.rowcount
+
+            for statement in REBUILD_AGGREGATES:
+                mycursor.execute(statement)
+
+        mydb.commit()
+
+    except Exception:
+        mydb.rollback()
+        raise
+
+    finally:
+        mycursor.close()
+        # Closing drops the temporary tables: MySQL's pool resets the session, SQLite closes the file
+        mydb.close()
+
+    metrics.add_rows(written)
+    logger.info(
+        "Imported %d CSV rows from %s in %.2fs, rows written: %s",
+        staged, csv_path, time.perf_counter() - started, written
+    )
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bulk import a playlist cache CSV into the database")
+    parser.add_argument("csv_path")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--database", default=None)
+    args = parser.parse_args()
+
+    configure_logging()
+    import_csv(args.csv_path, args.chunk_size, args.database)
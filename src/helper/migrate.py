@@ -0,0 +1,181 @@
+from lib.dbClient import get_connection
+from lib.metrics import configure_logging
+
+import argparse
+import logging
+import os
+import re
+
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "migrations")
+
+# Migration files are named <version>_<name>.sql, e.g. 0002_unique_genre_name.sql
+_MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+# Serializes the runners of a database, so two deployments never apply the same migration
+LOCK_NAME = "playlist_do_xet_migrations"
+
+VERSION_TABLE = """CREATE TABLE IF NOT EXISTS SchemaMigrations (
+    version    INT          PRIMARY KEY,
+    name       VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMP    NOT NULL DEFAULT CURRENT_TIMESTAMP
+)"""
+
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """
+    Returns the migration files of a directory, sorted by version.
+
+    Parameters
+    ----------
+    directory : str, optional
+        The folder of the migrations. Defaults to scripts/migrations.
+
+    Returns
+    -------
+    list of tuple
+        (version, name, path) triples.
+    """
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    migrations.sort()
+
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicated migration versions in {directory}")
+    return migrations
+
+
+def split_statements(sql):
+    """
+    Splits a migration script into its statements.
+
+    Comment lines are dropped and statements end with a semicolon at the end of a line, which
+    is all the migration files use (no semicolons inside string literals).
+    """
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    statements = re.split(r";\s*$", "\n".join(lines), flags=re.MULTILINE)
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def applied_versions(mycursor):
+    mycursor.execute(VERSION_TABLE)
+    mycursor.execute("SELECT version, applied_at FROM SchemaMigrations")
+    return dict(mycursor.fetchall())
+
+
+def migration_status(database=None, directory=MIGRATIONS_DIR):
+    """
+    Returns which migrations are applied to a database.
+
+    Parameters
+    ----------
+    database : str, optional
+        The database. Defaults to the DB_CONNECTION_DATABASE environment variable.
+    directory : str, optional
+        The folder of the migrations. Defaults to scripts/migrations.
+
+    Returns
+    -------
+    list of dict
+        One dictionary per migration with the keys 'version', 'name' and 'applied_at' (None
+        if pending).
+    """
+    mydb = get_connection(database)
+    mycursor = mydb.cursor()
+    try:
+        applied = applied_versions(mycursor)
+    finally:
+        mycursor.close()
+        mydb.close()
+
+    return [
+        {'version': version, 'name': name, 'applied_at': applied.get(version)}
+        for version, name, _ in list_migrations(directory)
+    ]
+
+
+def apply_migrations(database=None, target=None, directory=MIGRATIONS_DIR):
+    """
+    Applies the pending migrations to a database, in version order.
+
+    MySQL commits DDL implicitly, so a migration can't be rolled back as a whole: its version
+    is recorded right after its last statement, and a migration that fails halfway stops the
+    run and has to be fixed by hand before the next one.
+
+    Parameters
+    ----------
+    database : str, optional
+        The database. Defaults to the DB_CONNECTION_DATABASE environment variable.
+    target : int, optional
+        The last version to apply. Defaults to every migration.
+    directory : str, optional
+        The folder of the migrations. Defaults to scripts/migrations.
+
+    Returns
+    -------
+    list of int
+        The versions applied by this run.
+    """
+    mydb = get_connection(database)
+    mycursor = mydb.cursor()
+    applied_now = []
+
+    try:
+        mycursor.execute("SELECT GET_LOCK(%s, 60)", (LOCK_NAME,))
+        if mycursor.fetchone()[0] != 1:
+            raise RuntimeError("Another migration run holds the lock")
+
+        try:
+            applied = applied_versions(mycursor)
+
+            for version, name, path in list_migrations(directory):
+                if version in applied or (target is not None and version > target):
+                    continue
+
+                logger.info("Applying migration %04d_%s", version, name)
+                with open(path, encoding='utf-8') as f:
+                    statements = split_statements(f.read())
+
+                for statement in statements:
+                    mycursor.execute(statement)
+                mycursor.execute("INSERT INTO SchemaMigrations (version, name) VALUES (%s, %s)", (version, name))
+                mydb.commit()
+                applied_now.append(version)
+
+        finally:
+            mycursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+            mycursor.fetchone()
+
+    except Exception:
+        mydb.rollback()
+        raise
+
+    finally:
+        mycursor.close()
+        mydb.close()
+
+    logger.info("Applied %d migration(s)%s", len(applied_now), f": {applied_now}" if applied_now else "")
+    return applied_now
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Apply or list the schema migrations of scripts/migrations")
+    parser.add_argument("command", choices=("apply", "status"))
+    parser.add_argument("--database", default=None)
+    parser.add_argument("--target", type=int, default=None, help="last version to apply")
+    args = parser.parse_args()
+
+    configure_logging()
+
+    if args.command == "apply":
+        apply_migrations(args.database, args.target)
+    else:
+        for migration in migration_status(args.database):
+            state = f"applied {migration['applied_at']}" if migration['applied_at'] else "pending"
+            print(f"{migration['version']:04d}_{migration['name']}: {state}")
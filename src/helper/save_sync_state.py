@@ -0,0 +1,31 @@
+from lib.storage import get_backend
+
+
+def save_sync_state(playlist_id, snapshot_id, last_track_index):
+        """
+        Records the state of a finished sync so the next run can skip or resume it.
+
+        Parameters
+        ----------
+        playlist_id : str
+            The ID of the playlist.
+        snapshot_id : str
+            The snapshot_id of the playlist that was synced.
+        last_track_index : int or None
+            The index of the last track of the playlist that is now stored.
+
+        Returns
+        -------
+        None
+        """
+        backend = get_backend()
+        mydb = backend.connect()
+        mycursor = mydb.cursor()
+
+        mycursor.execute(
+            backend.upsert_sql("SyncState", ("playlist_id",), ("playlist_id", "snapshot_id", "last_track_index")),
+            (playlist_id, snapshot_id, last_track_index)
+        )
+
+        mydb.commit()
+        mydb.close()
@@ -0,0 +1,135 @@
+from dotenv import load_dotenv
+
+import os
+import threading
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Optional callable applied to every connection handed out, e.g. to count statements
+_connection_wrapper = None
+
+
+def set_connection_wrapper(wrapper):
+    """
+    Sets a callable that receives every connection and returns the object handed to the caller.
+
+    It applies to the pooled MySQL connections and to the ones of lib.storage.SQLiteBackend.
+
+    Parameters
+    ----------
+    wrapper : callable or None
+        The wrapper, or None to hand out the pooled connections unchanged.
+
+    Returns
+    -------
+    None
+    """
+    global _connection_wrapper
+    _connection_wrapper = wrapper
+
+
+def _get_pool(database):
+    """
+    Returns the connection pool of a database, creating it on first use.
+    """
+    with _pools_lock:
+        pool = _pools.get(database)
+        if pool is None:
+            # Imported here so the embedded SQLite backend works without the MySQL connector
+            from mysql.connector import pooling
+
+            load_dotenv()
+            pool = pooling.MySQLConnectionPool(
+                pool_name=f"playlist_do_xet_{database}",
+                pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+                host=os.getenv("DB_CONNECTION_HOST"),
+                user=os.getenv("DB_CONNECTION_USER"),
+                password=os.getenv("DB_CONNECTION_PASSWORD"),
+                database=database
+            )
+            _pools[database] = pool
+        return pool
+
+
+def get_connection(database=None):
+    """
+    Returns a connection from the process-wide pool of a database.
+
+    The pool is created on the first call, so the connection setup happens once per process.
+    Closing the returned connection hands it back to the pool.
+
+    Parameters
+    ----------
+    database : str, optional
+        The database to connect to. Defaults to the DB_CONNECTION_DATABASE environment variable.
+
+    Returns
+    -------
+    mysql.connector.pooling.PooledMySQLConnection
+        A pooled connection to the MySQL database.
+    """
+    if database is None:
+        load_dotenv()
+        database = os.getenv("DB_CONNECTION_DATABASE")
+    connection = _get_pool(database).get_connection()
+    if _connection_wrapper is not None:
+        connection = _connection_wrapper(connection)
+    return connection
+
+
+class PreparedCursor:
+    """
+    A cursor that runs every distinct statement through its own server-side prepared statement.
+
+    The connector's prepared cursor only keeps the last statement it prepared, so alternating
+    between templates would prepare them again on every call. This class keeps one prepared
+    cursor per template instead, so each template is parsed by the server once per connection.
+    It exposes the subset of the cursor interface the loader uses.
+
+    ...
+
+    Methods
+    -------
+    execute(sql, params):
+        Executes a statement through the prepared cursor of its template.
+
+    fetchall() / fetchone():
+        Fetches the results of the last executed statement.
+
+    close():
+        Closes every prepared cursor.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursors    = {}
+        self._last       = None
+
+    def execute(self, sql, params=()):
+        cursor = self._cursors.get(sql)
+        if cursor is None:
+            cursor = self._connection.cursor(prepared=True)
+            self._cursors[sql] = cursor
+        cursor.execute(sql, params)
+        self._last = cursor
+
+    def fetchall(self):
+        return self._last.fetchall()
+
+    def fetchone(self):
+        return self._last.fetchone()
+
+    @property
+    def rowcount(self):
+        return self._last.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._last.lastrowid
+
+    def close(self):
+        for cursor in self._cursors.values():
+            cursor.close()
+        self._cursors.clear()
@@ -0,0 +1,244 @@
+from collections import defaultdict
+from contextlib import contextmanager
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+
+# Upper bounds (in seconds) of the API latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_TABLE_PATTERN = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+`?(\w+)`?", re.IGNORECASE)
+
+
+def configure_logging(level=None):
+    """
+    Configures the root logger of the pipeline.
+
+    Parameters
+    ----------
+    level : str, optional
+        The logging level name. Defaults to the LOG_LEVEL environment variable, or INFO.
+
+    Returns
+    -------
+    None
+    """
+    logging.basicConfig(
+        level=getattr(logging, (level or os.getenv("LOG_LEVEL", "INFO")).upper(), logging.INFO),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+
+
+class Histogram:
+    """
+    A cumulative histogram with fixed buckets, in the Prometheus sense.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts  = [0] * len(buckets)
+        self.count   = 0
+        self.sum     = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum   += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'buckets': {str(bound): count for bound, count in zip(self.buckets, self.counts)}
+        }
+
+
+class Metrics:
+    """
+    A thread-safe registry of the measurements of a sync run.
+
+    ...
+
+    Methods
+    -------
+    stage(name):
+        Context manager timing a pipeline stage.
+
+    observe_api(endpoint, seconds):
+        Records the latency of an API call.
+
+    count_statement(sql):
+        Records a DB statement against the table it targets.
+
+    add_rows(written):
+        Adds the rows written per table.
+
+    wrap_connection(connection):
+        Wraps a DB connection so its statements and commits are counted.
+
+    report():
+        Returns every measurement as a dictionary.
+
+    export(json_path, prometheus_path):
+        Writes the report as JSON and/or as a Prometheus textfile.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._lock          = threading.Lock()
+        self.started        = time.time()
+        self.stage_seconds  = defaultdict(float)
+        self.api_latency    = defaultdict(Histogram)
+        self.db_statements  = defaultdict(int)
+        self.db_commits     = 0
+        self.rows_written   = defaultdict(int)
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.stage_seconds[name] += elapsed
+            logging.getLogger(__name__).debug("Stage %s took %.2fs", name, elapsed)
+
+    def observe_api(self, endpoint, seconds):
+        with self._lock:
+            self.api_latency[endpoint].observe(seconds)
+
+    def count_statement(self, sql):
+        match = _TABLE_PATTERN.search(sql)
+        with self._lock:
+            self.db_statements[match.group(1) if match else "other"] += 1
+
+    def count_commit(self):
+        with self._lock:
+            self.db_commits += 1
+
+    def add_rows(self, written):
+        with self._lock:
+            for table, rows in written.items():
+                self.rows_written[table] += rows
+
+    def wrap_connection(self, connection):
+        return _InstrumentedConnection(connection, self)
+
+    def db_round_trips(self):
+        with self._lock:
+            return sum(self.db_statements.values()) + self.db_commits
+
+    def api_calls(self):
+        with self._lock:
+            return sum(histogram.count for histogram in self.api_latency.values())
+
+    def report(self):
+        with self._lock:
+            return {
+                'started': self.started,
+                'duration_seconds': round(time.time() - self.started, 3),
+                'stages_seconds': {name: round(seconds, 3) for name, seconds in self.stage_seconds.items()},
+                'api_latency_seconds': {endpoint: histogram.to_dict() for endpoint, histogram in self.api_latency.items()},
+                'db_statements': dict(self.db_statements),
+                'db_commits': self.db_commits,
+                'rows_written': dict(self.rows_written)
+            }
+
+    def to_prometheus(self):
+        """
+        Returns the report in the Prometheus text exposition format.
+        """
+        report = self.report()
+        lines  = [
+            "# TYPE playlist_sync_duration_seconds gauge",
+            f"playlist_sync_duration_seconds {report['duration_seconds']}",
+            "# TYPE playlist_sync_stage_seconds gauge",
+        ]
+        lines += [f'playlist_sync_stage_seconds{{stage="{name}"}} {seconds}' for name, seconds in report['stages_seconds'].items()]
+
+        lines.append("# TYPE playlist_sync_api_latency_seconds histogram")
+        for endpoint, histogram in report['api_latency_seconds'].items():
+            for bound, count in histogram['buckets'].items():
+                lines.append(f'playlist_sync_api_latency_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+            lines.append(f'playlist_sync_api_latency_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'playlist_sync_api_latency_seconds_sum{{endpoint="{endpoint}"}} {histogram["sum"]}')
+            lines.append(f'playlist_sync_api_latency_seconds_count{{endpoint="{endpoint}"}} {histogram["count"]}')
+
+        lines.append("# TYPE playlist_sync_db_statements_total counter")
+        lines += [f'playlist_sync_db_statements_total{{table="{table}"}} {count}' for table, count in report['db_statements'].items()]
+        lines.append("# TYPE playlist_sync_db_commits_total counter")
+        lines.append(f"playlist_sync_db_commits_total {report['db_commits']}")
+        lines.append("# TYPE playlist_sync_rows_written_total counter")
+        lines += [f'playlist_sync_rows_written_total{{table="{table}"}} {rows}' for table, rows in report['rows_written'].items()]
+        return "\n".join(lines) + "\n"
+
+    def export(self, json_path=None, prometheus_path=None):
+        """
+        Writes the report as JSON and/or as a Prometheus textfile.
+
+        Parameters
+        ----------
+        json_path : str, optional
+            Where to write the JSON report. Defaults to the METRICS_JSON_PATH environment variable.
+        prometheus_path : str, optional
+            Where to write the Prometheus textfile. Defaults to the METRICS_PROM_PATH environment variable.
+
+        Returns
+        -------
+        None
+        """
+        json_path       = json_path or os.getenv("METRICS_JSON_PATH")
+        prometheus_path = prometheus_path or os.getenv("METRICS_PROM_PATH")
+
+        if json_path:
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(self.report(), f, indent=2)
+
+        if prometheus_path:
+            # Write then rename, so the node exporter never reads a partial file
+            with open(prometheus_path + ".tmp", 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+            os.replace(prometheus_path + ".tmp", prometheus_path)
+
+
+class _InstrumentedConnection:
+    def __init__(self, connection, metrics):
+        self._connection = connection
+        self._metrics    = metrics
+
+    def cursor(self, *args, **kwargs):
+        return _InstrumentedCursor(self._connection.cursor(*args, **kwargs), self._metrics)
+
+    def commit(self):
+        self._metrics.count_commit()
+        self._connection.commit()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class _InstrumentedCursor:
+    def __init__(self, cursor, metrics):
+        self._cursor  = cursor
+        self._metrics = metrics
+
+    def execute(self, operation, *args, **kwargs):
+        self._metrics.count_statement(operation)
+        return self._cursor.execute(operation, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+# The registry shared by the whole process
+metrics = Metrics()
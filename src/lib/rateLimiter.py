@@ -0,0 +1,230 @@
+from lib.metrics import metrics
+
+import logging
+import os
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket shared by every caller of a client.
+
+    Tokens are refilled continuously at `rate` per second up to `burst`, each request takes one,
+    and the whole bucket can be paused (e.g. for a Retry-After) so every thread waits together.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate   = float(rate)
+        self.burst  = float(burst)
+        self.tokens = float(burst)
+
+        self._updated      = time.monotonic()
+        self._paused_until = 0.0
+        self._lock         = threading.Lock()
+
+    def pause_until(self, deadline):
+        """
+        Blocks every acquisition until the given time.monotonic() deadline.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, deadline)
+
+    def acquire(self):
+        """
+        Takes a token, sleeping until one is available.
+
+        Returns
+        -------
+        float
+            The number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens  = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                else:
+                    delay = (1 - self.tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+
+class AdaptiveConcurrency:
+    """
+    Bounds the number of requests in flight and adapts the bound to the observed throttling.
+
+    The limit is halved on every 429 and grows back by one after `increase_after` consecutive
+    successful requests (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self, max_limit, increase_after=50):
+        self.max_limit      = max_limit
+        self.limit          = max_limit
+        self.increase_after = increase_after
+
+        self._in_flight  = 0
+        self._successes  = 0
+        self._condition  = threading.Condition()
+
+    def __enter__(self):
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            self._successes += 1
+            if self._successes >= self.increase_after and self.limit < self.max_limit:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify_all()
+
+    def on_throttle(self):
+        with self._condition:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+
+
+class RateLimitedClient:
+    """
+    A wrapper that rate limits every method call of a Spotify client.
+
+    All the threads using the wrapper share one token bucket and one adaptive concurrency
+    limit. When the API answers 429, the Retry-After header pauses the whole bucket, the
+    concurrency limit is halved and the call is retried. Any attribute that isn't a method
+    is passed through unchanged.
+
+    ...
+
+    Attributes
+    ----------
+    calls : int
+        The number of requests sent, retries included.
+    throttles : int
+        The number of 429 responses received.
+    wait_time : float
+        The total number of seconds spent waiting for the limiter or a Retry-After.
+
+    Methods
+    -------
+    stats():
+        Returns the counters of the wrapper.
+    """
+
+    def __init__(self, client, rate=None, burst=None, max_concurrency=None, max_retries=None):
+        """
+        Parameters
+        ----------
+        client : spotipy.Spotify
+            The client to wrap.
+        rate : float, optional
+            The sustained number of requests per second. Defaults to SPOTIFY_RATE_LIMIT.
+        burst : int, optional
+            The number of requests that can be sent at once. Defaults to SPOTIFY_RATE_BURST.
+        max_concurrency : int, optional
+            The maximum number of requests in flight. Defaults to SPOTIFY_MAX_CONCURRENCY.
+        max_retries : int, optional
+            The number of retries after a 429 before giving up. Defaults to SPOTIFY_MAX_RETRIES.
+        """
+        self.client      = client
+        self.bucket      = TokenBucket(
+            rate if rate is not None else float(os.getenv("SPOTIFY_RATE_LIMIT", 10)),
+            burst if burst is not None else float(os.getenv("SPOTIFY_RATE_BURST", 20))
+        )
+        self.concurrency = AdaptiveConcurrency(
+            max_concurrency if max_concurrency is not None else int(os.getenv("SPOTIFY_MAX_CONCURRENCY", 8))
+        )
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("SPOTIFY_MAX_RETRIES", 5))
+
+        self.calls     = 0
+        self.throttles = 0
+        self.wait_time = 0.0
+
+        self._counters_lock = threading.Lock()
+
+    @staticmethod
+    def _retry_after(error, attempt):
+        """
+        Returns the number of seconds to wait after a 429, from its Retry-After header if present.
+        """
+        headers = getattr(error, 'headers', None) or {}
+        try:
+            return float(headers.get('Retry-After', headers.get('retry-after')))
+        except (TypeError, ValueError):
+            # No usable header, back off exponentially
+            return min(2 ** attempt, 60)
+
+    def _call(self, name, method, *args, **kwargs):
+        attempt = 0
+        while True:
+            with self.concurrency:
+                waited = self.bucket.acquire()
+                with self._counters_lock:
+                    self.calls     += 1
+                    self.wait_time += waited
+                started = time.perf_counter()
+                try:
+                    result = method(*args, **kwargs)
+                except Exception as e:
+                    metrics.observe_api(name, time.perf_counter() - started)
+                    if getattr(e, 'http_status', None) != 429 or attempt >= self.max_retries:
+                        raise
+                    error = e
+                else:
+                    metrics.observe_api(name, time.perf_counter() - started)
+                    self.concurrency.on_success()
+                    return result
+
+            # Throttled: pause every caller for the Retry-After and lower the concurrency
+            delay = self._retry_after(error, attempt)
+            with self._counters_lock:
+                self.throttles += 1
+                self.wait_time += delay
+            self.concurrency.on_throttle()
+            self.bucket.pause_until(time.monotonic() + delay)
+            logging.getLogger(__name__).warning(
+                "Spotify API throttled, retrying in %.1fs (concurrency limit %d)", delay, self.concurrency.limit
+            )
+            attempt += 1
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute):
+            return attribute
+
+        def rate_limited(*args, **kwargs):
+            return self._call(name, attribute, *args, **kwargs)
+
+        return rate_limited
+
+    def stats(self):
+        """
+        Returns the counters of the wrapper.
+
+        Returns
+        -------
+        dict
+            The number of calls, throttles, the total wait time and the current concurrency limit.
+        """
+        return {
+            'calls': self.calls,
+            'throttles': self.throttles,
+            'wait_time': round(self.wait_time, 3),
+            'concurrency_limit': self.concurrency.limit
+        }
@@ -1,24 +1,62 @@
+import requests
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
-from spotipy.oauth2 import SpotifyClientCredentials
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from lib.rateLimiter import RateLimitedClient
 
+import logging
 import os
 
 
+def build_session():
+    """
+    Returns the HTTP session of the Spotify client, retrying the server errors but not the 429s.
+
+    urllib3 retries every 429 carrying a Retry-After header by default, sleeping in the calling
+    thread, even if 429 is left out of status_forcelist. Here every 429 is returned to spotipy
+    as is, so it raises with the response headers and RateLimitedClient sees the Retry-After.
+
+    Returns
+    -------
+    requests.Session
+    """
+    retry = Retry(
+        total=3,
+        connect=None,
+        read=False,
+        allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+        status=3,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        respect_retry_after_header=False
+    )
+    session = requests.Session()
+    adapter = HTTPAdapter(max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
 def generate_sp_client():
 
 
     try:   # Initialize the Spotify client with the scope retrieved from the environment variable
 
-        sp = spotipy.Spotify(auth_manager=SpotifyOAuth(scope=os.getenv('SCOPE')))
+        # 429 is never retried by the session, so it reaches the rate limiter with its Retry-After header
+        sp = spotipy.Spotify(
+            auth_manager=SpotifyOAuth(scope=os.getenv('SCOPE')),
+            requests_session=build_session()
+        )
+
+        sp = RateLimitedClient(sp)
 
-        print("Spotify client initialized successfully")
+        logging.getLogger(__name__).info("Spotify client initialized successfully")
 
     except Exception as e:   # If an error occurs during initialization, print an error message and set self.sp to None
 
-        print("Spotify client initialization failed")
-        print(e)
+        logging.getLogger(__name__).error("Spotify client initialization failed: %s", e)
 
         sp = None
 
-    return sp
\ No newline at end of file
+    return sp
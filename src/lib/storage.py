@@ -0,0 +1,278 @@
+from datetime import datetime
+from dotenv import load_dotenv
+from lib import dbClient
+
+import os
+import sqlite3
+import threading
+
+
+DEFAULT_SQLITE_PATH = os.path.join(".cache", "playlist_do_xet.sqlite")
+
+SQLITE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "SchemaSQLite.sql")
+
+# TIMESTAMP columns come back as datetime objects, like with MySQL
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+
+class MySQLBackend:
+    """
+    The storage backend of a MySQL server, through the connection pools of lib.dbClient.
+
+    Every backend exposes the same interface, which is all the loader and the helpers need
+    besides portable SQL with %s placeholders.
+
+    ...
+
+    Methods
+    -------
+    connect(database):
+        Returns a connection to a database; closing it releases the connection.
+
+    prepared_cursor(connection):
+        Returns a cursor that reuses the parsed form of every statement it runs.
+
+    insert_ignore_sql(table, columns, rows):
+        Returns a multi-row INSERT that skips the rows whose key already exists.
+
+    insert_ignore_select_sql(table, columns, select):
+        Returns an INSERT ... SELECT that skips the rows whose key already exists.
+
+    upsert_sql(table, key_columns, columns, rows, increment):
+        Returns a multi-row INSERT that updates the rows whose key already exists.
+
+    is_missing_table(error):
+        Returns whether an error was raised because a table doesn't exist.
+    """
+
+    name = "mysql"
+
+    def connect(self, database=None):
+        return dbClient.get_connection(database)
+
+    def prepared_cursor(self, connection):
+        return dbClient.PreparedCursor(connection)
+
+    def insert_ignore_sql(self, table, columns, rows=1):
+        return f"INSERT IGNORE INTO {table} ({', '.join(columns)}) VALUES " + _values(columns, rows)
+
+    def insert_ignore_select_sql(self, table, columns, select):
+        return f"INSERT IGNORE INTO {table} ({', '.join(columns)}) {select}"
+
+    def upsert_sql(self, table, key_columns, columns, rows=1, increment=False):
+        """
+        Parameters
+        ----------
+        table : str
+            The name of the table.
+        key_columns : tuple of str
+            The primary key of the table, part of columns.
+        columns : tuple of str
+            The names of the columns being inserted.
+        rows : int, optional
+            The number of rows of the statement.
+        increment : bool, optional
+            Whether the stored values are incremented by the inserted ones instead of replaced.
+        """
+        updates = ", ".join(
+            f"{column} = {column} + VALUES({column})" if increment else f"{column} = VALUES({column})"
+            for column in columns if column not in key_columns
+        )
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + _values(columns, rows)
+            + f" ON DUPLICATE KEY UPDATE {updates}"
+        )
+
+    def is_missing_table(self, error):
+        # ER_NO_SUCH_TABLE
+        return getattr(error, 'errno', None) == 1146
+
+
+class SQLiteBackend:
+    """
+    An embedded storage backend: a local SQLite file with the schema of scripts/SchemaSQLite.sql.
+
+    The file is created with its schema on first use and opened in WAL mode, so readers (the
+    notebooks, the snapshot export) never block the loader. It suits the single-writer workload
+    of a sync: no network round trip per statement, and the loader's chunk commits make the
+    batched transactions. Statements use the %s placeholders of the MySQL connector, which the
+    connections translate to SQLite's.
+
+    ...
+
+    Methods
+    -------
+    connect(database):
+        Returns a connection to a database file; closing it closes the file.
+
+    prepared_cursor(connection):
+        Returns a plain cursor, SQLite already caches the compiled statements per connection.
+
+    insert_ignore_sql(table, columns, rows):
+        Returns a multi-row INSERT OR IGNORE.
+
+    insert_ignore_select_sql(table, columns, select):
+        Returns an INSERT OR IGNORE ... SELECT.
+
+    upsert_sql(table, key_columns, columns, rows, increment):
+        Returns a multi-row INSERT ... ON CONFLICT DO UPDATE.
+
+    is_missing_table(error):
+        Returns whether an error was raised because a table doesn't exist.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=None):
+        """
+        Parameters
+        ----------
+        path : str, optional
+            The default database file. Defaults to the SQLITE_PATH environment variable.
+        """
+        load_dotenv()
+        self.path = path or os.getenv("SQLITE_PATH", DEFAULT_SQLITE_PATH)
+
+        self._initialized = set()
+        self._lock        = threading.Lock()
+
+    def _initialize(self, path):
+        with self._lock:
+            if path in self._initialized:
+                return
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(SQLITE_SCHEMA, encoding='utf-8') as f:
+                schema = f.read()
+            connection = sqlite3.connect(path)
+            try:
+                # The journal mode is stored in the file, every later connection uses WAL
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(schema)
+                connection.commit()
+            finally:
+                connection.close()
+            self._initialized.add(path)
+
+    def connect(self, database=None):
+        """
+        Parameters
+        ----------
+        database : str, optional
+            The path of the database file. Defaults to the path of the backend.
+        """
+        path = database or self.path
+        self._initialize(path)
+
+        connection = sqlite3.connect(
+            path, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False
+        )
+        # WAL only needs the log synced at checkpoints to stay consistent after a crash
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+
+        connection = _SQLiteConnection(connection)
+        if dbClient._connection_wrapper is not None:
+            connection = dbClient._connection_wrapper(connection)
+        return connection
+
+    def prepared_cursor(self, connection):
+        return connection.cursor()
+
+    def insert_ignore_sql(self, table, columns, rows=1):
+        return f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES " + _values(columns, rows)
+
+    def insert_ignore_select_sql(self, table, columns, select):
+        return f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) {select}"
+
+    def upsert_sql(self, table, key_columns, columns, rows=1, increment=False):
+        updates = ", ".join(
+            f"{column} = {column} + excluded.{column}" if increment else f"{column} = excluded.{column}"
+            for column in columns if column not in key_columns
+        )
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + _values(columns, rows)
+            + f" ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {updates}"
+        )
+
+    def is_missing_table(self, error):
+        return isinstance(error, sqlite3.OperationalError) and str(error).startswith("no such table")
+
+
+class _SQLiteConnection:
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self):
+        return _SQLiteCursor(self._connection.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class _SQLiteCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        # None of the statements has a literal %s, so the placeholders translate one to one
+        self._cursor.execute(sql.replace("%s", "?"), params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+def _values(columns, rows):
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    return ", ".join([placeholders] * rows)
+
+
+_BACKENDS = {
+    "mysql": MySQLBackend,
+    "sqlite": SQLiteBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Returns the storage backend of the process, chosen by the STORAGE_BACKEND environment variable.
+
+    Returns
+    -------
+    MySQLBackend or SQLiteBackend
+        The backend, created on the first call. Defaults to MySQL.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            load_dotenv()
+            name = os.getenv("STORAGE_BACKEND", "mysql")
+            if name not in _BACKENDS:
+                raise ValueError(f"Unknown STORAGE_BACKEND {name!r}, expected one of {sorted(_BACKENDS)}")
+            _backend = _BACKENDS[name]()
+        return _backend
+
+
+def set_backend(backend):
+    """
+    Sets the storage backend of the process, e.g. SQLiteBackend(path) for a benchmark.
+
+    Parameters
+    ----------
+    backend : MySQLBackend or SQLiteBackend or None
+        The backend, or None to choose it again from the environment on the next call.
+
+    Returns
+    -------
+    None
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
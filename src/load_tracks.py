@@ -0,0 +1,30 @@
+from classes.DatabaseLoader import DatabaseLoader
+from contextlib import nullcontext
+
+import os
+
+
+def load_batches(batches, chunk_size=1000, write_lock=None):
+        """
+        Loads processed track batches into the database, with the path chosen by DB_LOAD_MODE.
+
+        Parameters
+        ----------
+        batches : iterable of classes.TrackBatch.TrackBatch
+            The processed tracks, e.g. the batches of a TrackSpool.
+        chunk_size : int, optional
+            The number of tracks committed at once by the bulk path.
+        write_lock : threading.Lock, optional
+            The lock serializing the database transactions of the playlists loaded concurrently.
+
+        Returns
+        -------
+        None
+        """
+        if os.getenv("DB_LOAD_MODE", "bulk") == "bulk":
+            DatabaseLoader.stream_to_db(batches, chunk_size=chunk_size, write_lock=write_lock)
+        else:
+            # The per-row path commits once per call, so it holds the lock for a whole batch
+            for batch in batches:
+                with write_lock or nullcontext():
+                    DatabaseLoader().csv_to_db(processed_tracks=batch)
@@ -1,29 +1,8 @@
-from lib.spClient import generate_sp_client
-from helper.get_last_fetched_track_index import get_last_fetched_track_index
-from fetch_tracks import fetch_tracks
-from process_tracks import process_tracks
-from classes.DatabaseLoader import DatabaseLoader
+from cli import main
 
+import sys
 
-# TODO: 
-# 1. Add documentation to the functions
 
+# Kept for the existing cron entries: `python main.py [playlists]` is `python cli.py sync [playlists]`
 if __name__ == '__main__':
-    sp = generate_sp_client()
-
-    last_fetched_track_index = get_last_fetched_track_index()
-
-    if last_fetched_track_index is None:
-        last_fetched_track_index = 0
-
-    tracks = fetch_tracks(
-        sp_client=sp, 
-        last_track_index=last_fetched_track_index
-        )
-
-    processed_tracks = process_tracks(
-        sp_client=sp,
-        all_tracks=tracks
-    )
-
-    DatabaseLoader().csv_to_db(processed_tracks=processed_tracks)
\ No newline at end of file
+    sys.exit(main(["sync", *sys.argv[1:]]))
@@ -0,0 +1,139 @@
+from fetch_tracks import iter_track_pages
+from process_tracks import iter_processed_tracks
+from classes.DatabaseLoader import DatabaseLoader
+
+import queue
+import threading
+
+
+# Marks the end of a stage's output in the queues
+_END = object()
+
+
+class _StageFailed:
+    def __init__(self, error):
+        self.error = error
+
+
+# How often a blocked stage checks whether the pipeline was cancelled
+_POLL_SECONDS = 0.1
+
+
+def _put(output, item, cancel):
+    """
+    Puts an item into a bounded queue unless the pipeline is cancelled, returning whether it did.
+    """
+    while not cancel.is_set():
+        try:
+            output.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _run_stage(source, output, cancel):
+    """
+    Drains a generator into a bounded queue, ending with _END or the error that stopped it.
+
+    A cancelled pipeline closes the generator, so it stops making requests, and leaves the queue.
+    """
+    try:
+        for item in source:
+            if not _put(output, item, cancel):
+                return
+    except BaseException as e:
+        _put(output, _StageFailed(e), cancel)
+        return
+    finally:
+        source.close()
+    _put(output, _END, cancel)
+
+
+def _drain(input_queue, cancel):
+    """
+    Yields the items of a queue filled by _run_stage, re-raising the error of the stage if it failed.
+
+    The iteration stops early when the pipeline is cancelled.
+    """
+    while not cancel.is_set():
+        try:
+            item = input_queue.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            continue
+        if item is _END:
+            return
+        if isinstance(item, _StageFailed):
+            raise item.error
+        yield item
+
+
+def run_streaming_pipeline(sp_client, last_track_index=None, fetch_workers=1, artist_cache=None,
+                           known_users=None, user_workers=1, chunk_size=1000, queue_size=4,
+                           playlist_uri=None, write_lock=None):
+    """
+    Runs fetch -> process -> load as three overlapping stages connected by bounded queues.
+
+    The fetching and the processing run in their own threads while the loader drains the
+    processed batches in the calling thread, committing every chunk_size tracks. Since every
+    queue holds at most queue_size pages, peak memory doesn't depend on the playlist size.
+
+    Parameters
+    ----------
+    sp_client : spotipy.Spotify
+        The Spotify client used to make the API requests.
+    last_track_index : int, optional
+        The index of the last track from which to start fetching.
+    fetch_workers : int, optional
+        The number of playlist pages fetched concurrently.
+    artist_cache : classes.ArtistCache.ArtistCache, optional
+        The persistent artist cache.
+    known_users : dict, optional
+        The users already known, e.g. preloaded from the Users table.
+    user_workers : int, optional
+        The number of concurrent requests used to fetch unknown users.
+    chunk_size : int, optional
+        The number of tracks written and committed together.
+    queue_size : int, optional
+        The maximum number of pages waiting between two stages.
+    playlist_uri : str, optional
+        The playlist to sync. Defaults to the PLAYLIST_URI environment variable.
+    write_lock : threading.Lock, optional
+        A lock held by every transaction of the load, shared by the pipelines running concurrently.
+
+    Returns
+    -------
+    dict
+        The number of rows written per table.
+    """
+    fetched   = queue.Queue(maxsize=queue_size)
+    processed = queue.Queue(maxsize=queue_size)
+    cancel    = threading.Event()
+
+    fetcher = threading.Thread(
+        target=_run_stage,
+        args=(iter_track_pages(sp_client, last_track_index, fetch_workers, playlist_uri), fetched, cancel),
+        name="fetch_tracks",
+        daemon=True
+    )
+    processor = threading.Thread(
+        target=_run_stage,
+        args=(
+            iter_processed_tracks(sp_client, _drain(fetched, cancel), artist_cache, known_users, user_workers),
+            processed, cancel
+        ),
+        name="process_tracks",
+        daemon=True
+    )
+
+    fetcher.start()
+    processor.start()
+
+    try:
+        written = DatabaseLoader.stream_to_db(_drain(processed, cancel), chunk_size=chunk_size, write_lock=write_lock)
+    finally:
+        # A failed load stops the upstream stages instead of leaving them blocked on a full queue
+        cancel.set()
+        fetcher.join()
+        processor.join()
+    return written
@@ -1,43 +1,289 @@
-def process_tracks(sp_client, all_tracks):
-        # Process the gathered data
-        processed_tracks = []
-        process_iterator = 1
-        print("Processing tracks...")
-        for (track_id, track_name, track_album, track_artists, track_duration, added_by_id) in all_tracks:
-            print(f"Processing track {process_iterator} of {len(all_tracks)}")
-            # Make an additional API request to get the user's profile information
-            # TODO: check if the user already exists on db, if so just get the info from it, and if not do the api request
-            user          = sp_client.user(added_by_id)
-            user_name     = user['display_name']  # Get the name of the user who added the track
-            user_id       = user['id']  # Get the id of the user who added the track
-            
-            artist_ids   = []
-            artist_names = []
-            genres_set   = set()
-            for artist_name in track_artists:
-                artist_data = sp_client.search(q='artist:' + artist_name, type='artist')
-                genres      = artist_data['artists']['items'][0]['genres'] if artist_data['artists']['items'] else []
-                artist_id   = artist_data['artists']['items'][0]['id'] if artist_data['artists']['items'] else None  # Get the id of the artist
-
-                artist_ids.append(artist_id)
-                artist_names.append(artist_name)
-                genres_set.update(genres)
-
-            genres = list(genres_set)
-            
-            processed_tracks.append((
-                track_id, 
-                track_name, 
-                track_album, 
-                artist_ids,
-                artist_names, 
-                track_duration, 
-                genres, 
-                user_id, 
-                user_name
-            ))
-            
-            process_iterator += 1
-            print(f"Processed {process_iterator - 1}° track with results -> NAME: {track_name} | ARTISTS: {track_artists} | ADDED_BY: {user_name}")
-
-        return processed_tracks
\ No newline at end of file
+from classes.TrackBatch import TrackBatch
+from concurrent.futures import Future, ThreadPoolExecutor
+from lib.metrics import metrics
+
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+# Maximum number of artist IDs accepted by the Spotify "several artists" endpoint
+ARTISTS_BATCH_SIZE = 50
+
+# The artists and users being requested for the playlists processed concurrently, by ID: the
+# first thread to claim an ID requests it and the others wait on its future, which fails if
+# the request does. The lock only guards these dictionaries, never a request.
+_in_flight_lock    = threading.Lock()
+_artists_in_flight = {}
+_users_in_flight   = {}
+
+
+def _claim(in_flight, ids):
+        """
+        Claims the IDs that no other thread is requesting.
+
+        Parameters
+        ----------
+        in_flight : dict
+            The futures of the IDs being requested, _artists_in_flight or _users_in_flight.
+        ids : iterable of str
+            The IDs to claim.
+
+        Returns
+        -------
+        tuple
+            An (owned, pending) pair of dictionaries mapping IDs to futures: the caller requests
+            the owned IDs and resolves them with _settle, and waits on the pending ones.
+        """
+        owned, pending = {}, {}
+        with _in_flight_lock:
+            for id_ in ids:
+                future = in_flight.get(id_)
+                if future is None:
+                    owned[id_] = in_flight[id_] = Future()
+                else:
+                    pending[id_] = future
+        return owned, pending
+
+
+def _settle(in_flight, owned, results, error=None):
+        """
+        Releases claimed IDs, resolving their futures with their results, or with error for the
+        IDs missing from results.
+
+        The futures are resolved once released, after the results reached the shared caches, so
+        a thread claiming one of the IDs afterwards finds it there.
+        """
+        with _in_flight_lock:
+            for id_, future in owned.items():
+                if in_flight.get(id_) is future:
+                    del in_flight[id_]
+        for id_, future in owned.items():
+            if id_ in results:
+                future.set_result(results[id_])
+            else:
+                future.set_exception(error or LookupError(f"{id_} was not resolved"))
+
+
+def fetch_artists_genres(sp_client, artist_ids, artist_cache=None):
+        """
+        Resolves the genres of the given artists using the multi-artist endpoint.
+
+        When an artist_cache is provided, the artists it already knows are answered from it and
+        only the missing or expired ones are requested from the API. The cache is shared by the
+        playlists processed concurrently, so an artist another thread is already requesting is
+        waited for instead of requested again.
+
+        Parameters
+        ----------
+        sp_client : spotipy.Spotify
+            The Spotify client used to make the API requests.
+        artist_ids : iterable of str
+            The IDs of the artists to resolve. Duplicates and None values are ignored.
+        artist_cache : classes.ArtistCache.ArtistCache, optional
+            The persistent artist cache to read from and write to.
+
+        Returns
+        -------
+        dict
+            A dictionary mapping each artist ID to its list of genres.
+        """
+        # Deduplicate the IDs while keeping the order in which they were first seen
+        unique_ids = list(dict.fromkeys(artist_id for artist_id in artist_ids if artist_id))
+
+        artists_genres = {}
+        owned, pending = {}, {}
+        if artist_cache is not None:
+            # Claimed before the cache lookup, so an artist cached by another thread in between
+            # is either found in the cache or waited for
+            owned, pending = _claim(_artists_in_flight, unique_ids)
+            cached, unique_ids = artist_cache.get_many(list(owned))
+            artists_genres.update((artist_id, entry['genres']) for artist_id, entry in cached.items())
+            _settle(_artists_in_flight, {artist_id: owned.pop(artist_id) for artist_id in cached}, artists_genres)
+            logger.info(
+                "Artist cache: %d hits, %d artists left to fetch, %d fetched by another playlist",
+                len(cached), len(unique_ids), len(pending)
+            )
+
+        try:
+            for start in range(0, len(unique_ids), ARTISTS_BATCH_SIZE):
+                batch = unique_ids[start:start + ARTISTS_BATCH_SIZE]
+                logger.debug("Fetching genres for artists %d-%d of %d", start + 1, start + len(batch), len(unique_ids))
+                results = sp_client.artists(batch)
+
+                fetched, unresolved = {}, []
+                for artist_id, artist in zip(batch, results['artists']):
+                    # The API returns None for IDs it can't resolve
+                    artists_genres[artist_id] = artist['genres'] if artist else []
+                    if artist:
+                        fetched[artist_id] = (artist['name'], artist['genres'])
+                    else:
+                        unresolved.append(artist_id)
+
+                if artist_cache is not None and fetched:
+                    artist_cache.put_many(fetched)
+                if artist_cache is not None and unresolved:
+                    # A short-lived negative entry, so they aren't requested again on every run
+                    artist_cache.put_unresolved(unresolved)
+                _settle(
+                    _artists_in_flight, {artist_id: owned.pop(artist_id) for artist_id in batch if artist_id in owned},
+                    artists_genres
+                )
+        except BaseException as e:
+            _settle(_artists_in_flight, owned, {}, e)
+            raise
+
+        for artist_id, future in pending.items():
+            artists_genres[artist_id] = future.result()
+
+        return artists_genres
+
+
+def resolve_users(sp_client, user_ids, known_users=None, max_workers=1):
+        """
+        Resolves the display names of the users who added the tracks.
+
+        Users already present in known_users (e.g. preloaded from the Users table) are answered
+        from it, and every other ID is requested from the API only once. When known_users is
+        shared by the playlists processed concurrently, a user another thread is already
+        requesting is waited for instead of requested again.
+
+        Parameters
+        ----------
+        sp_client : spotipy.Spotify
+            The Spotify client used to make the API requests.
+        user_ids : iterable of str
+            The IDs of the users to resolve. Duplicates are ignored.
+        known_users : dict, optional
+            A dictionary mapping user IDs to user names. It is updated in place with the new
+            lookups, so passing the same dictionary around memoizes them for the whole run.
+        max_workers : int, optional
+            The number of concurrent requests used to fetch the unknown users.
+
+        Returns
+        -------
+        dict
+            A dictionary mapping each user ID to its display name.
+        """
+        shared = known_users is not None
+        if known_users is None:
+            known_users = {}
+
+        new_ids = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in known_users]
+        owned, pending = {}, {}
+        if shared:
+            owned, pending = _claim(_users_in_flight, new_ids)
+            # A user memoized by another thread between the check above and the claim
+            memoized = {user_id: owned.pop(user_id) for user_id in list(owned) if user_id in known_users}
+            _settle(_users_in_flight, memoized, known_users)
+            new_ids = list(owned)
+        logger.info("Users: %d known, %d to fetch, %d fetched by another playlist", len(known_users), len(new_ids), len(pending))
+
+        try:
+            if max_workers > 1 and len(new_ids) > 1:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    users = list(executor.map(sp_client.user, new_ids))
+            else:
+                users = [sp_client.user(user_id) for user_id in new_ids]
+        except BaseException as e:
+            _settle(_users_in_flight, owned, {}, e)
+            raise
+
+        for user_id, user in zip(new_ids, users):
+            known_users[user_id] = user['display_name']
+        _settle(_users_in_flight, owned, known_users)
+
+        for user_id, future in pending.items():
+            known_users.setdefault(user_id, future.result())
+
+        return known_users
+
+
+def process_tracks(sp_client, all_tracks, artist_cache=None, known_users=None, user_workers=1):
+        """
+        Completes the fetched tracks with the genres of their artists and the name of the user who added them.
+
+        Parameters
+        ----------
+        sp_client : spotipy.Spotify
+            The Spotify client used to make the API requests.
+        all_tracks : list of classes.TrackRecord.TrackRecord
+            The fetched tracks.
+        artist_cache : classes.ArtistCache.ArtistCache, optional
+            The persistent artist cache.
+        known_users : dict, optional
+            The users already known, e.g. preloaded from the Users table.
+        user_workers : int, optional
+            The number of concurrent requests used to fetch unknown users.
+
+        Returns
+        -------
+        classes.TrackBatch.TrackBatch
+            The processed tracks, in columnar form.
+        """
+        with metrics.stage("process"):
+            # Resolve the genres of every artist in the batch up front, one request per 50 uncached artists
+            with metrics.stage("process.artists"):
+                artists_genres = fetch_artists_genres(
+                    sp_client,
+                    (artist_id for track in all_tracks for artist_id in track.artist_ids),
+                    artist_cache=artist_cache
+                )
+
+            # Resolve every contributor once, skipping the ones we already know
+            with metrics.stage("process.users"):
+                users = resolve_users(
+                    sp_client,
+                    (track.added_by for track in all_tracks),
+                    known_users=known_users,
+                    max_workers=user_workers
+                )
+
+            # Process the gathered data
+            processed_tracks = TrackBatch()
+            for track in all_tracks:
+                track.user_name = users[track.added_by]  # Get the name of the user who added the track
+
+                genres_set = set()
+                for artist_id in track.artist_ids:
+                    genres_set.update(artists_genres.get(artist_id, []))
+
+                track.genres = tuple(genres_set)
+
+                processed_tracks.append(track, artists_genres)
+                logger.debug("Processed track %s | ARTISTS: %s | ADDED_BY: %s", track.track_name, track.artist_names, track.user_name)
+
+        logger.info("Processed %d tracks", len(processed_tracks))
+        return processed_tracks
+
+
+def iter_processed_tracks(sp_client, track_batches, artist_cache=None, known_users=None, user_workers=1):
+        """
+        Processes the tracks one batch at a time, as they arrive from iter_track_pages.
+
+        Parameters
+        ----------
+        sp_client : spotipy.Spotify
+            The Spotify client used to make the API requests.
+        track_batches : iterable of list
+            The batches of fetched tracks.
+        artist_cache : classes.ArtistCache.ArtistCache, optional
+            The persistent artist cache shared by every batch.
+        known_users : dict, optional
+            The known users, memoized across every batch.
+        user_workers : int, optional
+            The number of concurrent requests used to fetch unknown users.
+
+        Yields
+        ------
+        classes.TrackBatch.TrackBatch
+            The processed tracks of each batch, as returned by process_tracks.
+        """
+        if known_users is None:
+            known_users = {}
+
+        for batch in track_batches:
+            if batch:
+                yield process_tracks(sp_client, batch, artist_cache, known_users, user_workers)
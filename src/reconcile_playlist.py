@@ -0,0 +1,394 @@
+from classes.DatabaseLoader import DatabaseLoader, INSERT_BATCH_SIZE
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from fetch_tracks import iter_track_pages
+from lib.metrics import metrics
+from lib.storage import get_backend
+from process_tracks import process_tracks
+
+import hashlib
+import logging
+import os
+
+
+logger = logging.getLogger(__name__)
+
+# The items are grouped in content-defined chunks: a chunk ends after an item whose hash is a
+# multiple of CHUNK_AVERAGE once it holds CHUNK_MIN items, or at CHUNK_MAX items. A boundary only
+# depends on the items since the previous one, so inserting or deleting an item changes the
+# chunk holding it (merged or split with a neighbour at worst), and every later chunk is intact.
+CHUNK_MIN     = 8
+CHUNK_AVERAGE = 32
+CHUNK_MAX     = 256
+
+
+def item_hash(track_id, added_by):
+        """
+        Returns the 64-bit hash of a playlist item that decides the chunk boundaries.
+        """
+        digest = hashlib.blake2b(f"{track_id}\x1f{added_by}".encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big')
+
+
+def iter_chunks(pages):
+        """
+        Splits the tracks of a playlist into content-defined chunks.
+
+        Parameters
+        ----------
+        pages : iterable of list
+            The pages of classes.TrackRecord.TrackRecord, in playlist order, e.g. from iter_track_pages.
+
+        Yields
+        ------
+        list of classes.TrackRecord.TrackRecord
+            The tracks of each chunk, in playlist order.
+        """
+        chunk = []
+        for page in pages:
+            for track in page:
+                chunk.append(track)
+                if len(chunk) >= CHUNK_MAX or (
+                    len(chunk) >= CHUNK_MIN and item_hash(track.track_id, track.added_by) % CHUNK_AVERAGE == 0
+                ):
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+
+def chunk_fingerprint(items):
+        """
+        Returns the fingerprint of a chunk of playlist items.
+
+        Parameters
+        ----------
+        items : iterable of tuple
+            The (track_id, added_by) pairs of the chunk, in playlist order.
+
+        Returns
+        -------
+        str
+            16 hex characters (a 64-bit BLAKE2b digest) that change whenever an item of the chunk
+            is added, removed, replaced or moved.
+        """
+        digest = hashlib.blake2b(digest_size=8)
+        for track_id, added_by in items:
+            digest.update(f"{track_id}\x1f{added_by}\x1e".encode('utf-8'))
+        return digest.hexdigest()
+
+
+def diff_items(stored, current):
+        """
+        Computes the deltas turning the stored items of the changed chunks into the current ones.
+
+        Items are identified by their (track_id, added_by) pair and located by their slot, a
+        (chunk fingerprint, offset) pair. A pair found on both sides is a move if its slot
+        changed, and the occurrences of a repeated pair are matched in slot order.
+
+        Parameters
+        ----------
+        stored : dict
+            The stored items, slot -> (track_id, added_by).
+        current : dict
+            The current items, slot -> (track_id, added_by).
+
+        Returns
+        -------
+        tuple of list
+            The slots inserted in current, the slots deleted from stored and the moved
+            (old_slot, new_slot) pairs.
+        """
+        stored_slots  = defaultdict(list)
+        current_slots = defaultdict(list)
+        for slot in sorted(stored):
+            stored_slots[stored[slot]].append(slot)
+        for slot in sorted(current):
+            current_slots[current[slot]].append(slot)
+
+        inserted, deleted, moved = [], [], []
+        for item in stored_slots.keys() | current_slots.keys():
+            old, new = stored_slots.get(item, []), current_slots.get(item, [])
+            moved.extend((old_slot, new_slot) for old_slot, new_slot in zip(old, new) if old_slot != new_slot)
+            inserted.extend(new[len(old):])
+            deleted.extend(old[len(new):])
+
+        return sorted(inserted), sorted(deleted), sorted(moved)
+
+
+def select_stored_chunks(mycursor, playlist_id):
+        mycursor.execute("SELECT fingerprint, occurrences FROM PlaylistChunks WHERE playlist_id = %s", (playlist_id,))
+        return dict(mycursor.fetchall())
+
+
+def select_stored_items(mycursor, playlist_id, fingerprints):
+        items = {}
+        for start in range(0, len(fingerprints), INSERT_BATCH_SIZE):
+            batch = fingerprints[start:start + INSERT_BATCH_SIZE]
+            mycursor.execute(
+                "SELECT chunk, item_offset, track_id, added_by FROM PlaylistItems "
+                f"WHERE playlist_id = %s AND chunk IN ({', '.join(['%s'] * len(batch))})",
+                [playlist_id] + batch
+            )
+            items.update(((chunk, offset), (track_id, added_by)) for chunk, offset, track_id, added_by in mycursor.fetchall())
+        return items
+
+
+def write_playlist_state(mycursor, playlist_id, gone_chunks, current, occurrences):
+        """
+        Replaces the stored chunks that changed, without committing.
+
+        Parameters
+        ----------
+        mycursor : mysql.connector.cursor_cext.CMySQLCursor
+            A cursor object used to execute MySQL queries.
+        playlist_id : str
+            The ID of the playlist.
+        gone_chunks : list of str
+            The fingerprints of the stored chunks the playlist no longer has.
+        current : dict
+            The items of the new chunks, (chunk fingerprint, offset) -> (track_id, added_by).
+        occurrences : dict
+            The number of times each new or recounted chunk occurs in the playlist, fingerprint -> count.
+
+        Returns
+        -------
+        None
+        """
+        backend = get_backend()
+
+        for start in range(0, len(gone_chunks), INSERT_BATCH_SIZE):
+            batch = gone_chunks[start:start + INSERT_BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(batch))
+            mycursor.execute(f"DELETE FROM PlaylistItems WHERE playlist_id = %s AND chunk IN ({placeholders})", [playlist_id] + batch)
+            mycursor.execute(f"DELETE FROM PlaylistChunks WHERE playlist_id = %s AND fingerprint IN ({placeholders})", [playlist_id] + batch)
+
+        DatabaseLoader.insert_ignore_many(
+            mycursor, "PlaylistItems", ("playlist_id", "chunk", "item_offset", "track_id", "added_by"),
+            [(playlist_id, chunk, offset, track_id, added_by) for (chunk, offset), (track_id, added_by) in sorted(current.items())]
+        )
+
+        rows = sorted((playlist_id, fingerprint, count) for fingerprint, count in occurrences.items())
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            batch = rows[start:start + INSERT_BATCH_SIZE]
+            mycursor.execute(
+                backend.upsert_sql("PlaylistChunks", ("playlist_id", "fingerprint"), ("playlist_id", "fingerprint", "occurrences"), len(batch)),
+                [value for row in batch for value in row]
+            )
+
+
+def append_mode_playlists(mycursor, playlist_id):
+        """
+        Returns the other synced playlists that were never reconciled.
+
+        The append-only sync doesn't record which playlist holds which track, so while any of
+        these playlists exists, a track missing from PlaylistItems may still be held by one.
+
+        Parameters
+        ----------
+        mycursor : mysql.connector.cursor_cext.CMySQLCursor
+            A cursor object used to execute MySQL queries.
+        playlist_id : str
+            The URI or ID of the playlist being reconciled.
+
+        Returns
+        -------
+        list of str
+            The IDs of the playlists with a sync state but no stored chunk.
+        """
+        mycursor.execute(
+            "SELECT S.playlist_id FROM SyncState S "
+            "WHERE S.playlist_id <> %s AND NOT EXISTS (SELECT 1 FROM PlaylistChunks C WHERE C.playlist_id = S.playlist_id)",
+            (playlist_id,)
+        )
+        return [row[0] for row in mycursor.fetchall()]
+
+
+def remove_unreferenced(mycursor, removed_items, playlist_id):
+        """
+        Deletes what the removed playlist items leave unreferenced, without committing.
+
+        A (user, track) pair that no playlist holds anymore is deleted from UserTracks, and a
+        track that no playlist holds anymore is deleted with its relations. The summary tables
+        are decremented accordingly, and their rows that drop to zero are deleted.
+
+        Only the reconciled playlists record their items, so nothing is deleted while another
+        playlist is synced in append mode (see append_mode_playlists).
+
+        Parameters
+        ----------
+        mycursor : mysql.connector.cursor_cext.CMySQLCursor
+            A cursor object used to execute MySQL queries.
+        removed_items : set of tuple
+            The (track_id, added_by) pairs of the deleted items, after PlaylistItems was updated.
+        playlist_id : str
+            The URI or ID of the playlist being reconciled.
+
+        Returns
+        -------
+        dict
+            The number of rows deleted from UserTracks, TrackArtists and Tracks.
+        """
+        others = append_mode_playlists(mycursor, playlist_id)
+        if others:
+            logger.warning(
+                "Keeping the %d tracks removed from playlist %s: %d other playlists (%s) are synced in "
+                "append mode and may still hold them", len({track_id for track_id, _ in removed_items}),
+                playlist_id, len(others), ", ".join(others[:5]) + (", ..." if len(others) > 5 else "")
+            )
+            return {'UserTracks': 0, 'TrackArtists': 0, 'Tracks': 0}
+
+        track_ids = sorted({track_id for track_id, _ in removed_items})
+        remaining = DatabaseLoader.select_track_relations(mycursor, "PlaylistItems", ("track_id", "added_by"), track_ids)
+
+        orphan_tracks = set(track_ids) - {track_id for track_id, _ in remaining}
+        user_tracks   = DatabaseLoader.select_track_relations(mycursor, "UserTracks", ("user_id", "track_id"), track_ids)
+
+        removed_user_tracks = {
+            (user_id, track_id) for user_id, track_id in user_tracks
+            if track_id in orphan_tracks or ((track_id, user_id) in removed_items and (track_id, user_id) not in remaining)
+        }
+
+        orphan_ids = sorted(orphan_tracks)
+        removed_track_artists = DatabaseLoader.select_track_relations(mycursor, "TrackArtists", ("track_id", "artist_id"), orphan_ids)
+        track_genres = DatabaseLoader.select_track_relations(
+            mycursor, "TrackGenres", ("track_id", "genre_id"), sorted({track_id for _, track_id in removed_user_tracks} | orphan_tracks)
+        )
+        removed_track_genres = {(track_id, genre_id) for track_id, genre_id in track_genres if track_id in orphan_tracks}
+
+        # The deltas of writing these rows, negated. The users of an orphan track are all removed
+        # with it, so no stored user-track pair gains or loses a genre.
+        deltas = DatabaseLoader.aggregate_deltas(removed_user_tracks, removed_track_artists, removed_track_genres, set(), track_genres)
+        deltas = {table: Counter({key: -count for key, count in counter.items()}) for table, counter in deltas.items()}
+
+        for user_id, track_id in sorted(removed_user_tracks):
+            mycursor.execute("DELETE FROM UserTracks WHERE user_id = %s AND track_id = %s", (user_id, track_id))
+        for start in range(0, len(orphan_ids), INSERT_BATCH_SIZE):
+            batch = orphan_ids[start:start + INSERT_BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(batch))
+            mycursor.execute(f"DELETE FROM TrackArtists WHERE track_id IN ({placeholders})", batch)
+            mycursor.execute(f"DELETE FROM Tracks WHERE track_id IN ({placeholders})", batch)
+
+        DatabaseLoader.apply_aggregate_deltas(mycursor, deltas)
+        for table, counter in deltas.items():
+            if counter:
+                mycursor.execute(f"DELETE FROM {table} WHERE track_count <= 0")
+
+        return {'UserTracks': len(removed_user_tracks), 'TrackArtists': len(removed_track_artists), 'Tracks': len(orphan_ids)}
+
+
+def reconcile_playlist(sp_client, playlist_id, artist_cache=None, known_users=None, write_lock=None, database=None):
+        """
+        Brings the stored items of a playlist up to date with the playlist, whatever changed.
+
+        The playlist is fetched and split into content-defined chunks (see iter_chunks), and only
+        the chunks whose fingerprint isn't stored, or the stored ones it no longer has, are diffed
+        item by item. The new items are processed and loaded like in the append-only sync; the
+        deleted ones are removed from PlaylistItems and, when no playlist holds them anymore, from
+        UserTracks and Tracks; the moved ones only change chunk. An insertion, deletion or move
+        anywhere in the playlist only changes the chunks around it, so the database work is
+        proportional to the changes rather than to the playlist.
+
+        Parameters
+        ----------
+        sp_client : spotipy.Spotify
+            The Spotify client used to make the API requests.
+        playlist_id : str
+            The URI or ID of the playlist.
+        artist_cache : classes.ArtistCache.ArtistCache, optional
+            The persistent artist cache.
+        known_users : dict, optional
+            The users already known, e.g. preloaded from the Users table.
+        write_lock : threading.Lock, optional
+            The lock serializing the database transactions of the playlists synced concurrently.
+        database : str, optional
+            The database to reconcile. Defaults to the one of the storage backend.
+
+        Returns
+        -------
+        dict
+            The number of 'chunks' and 'changed_chunks', and of 'inserted', 'deleted' and 'moved' items.
+        """
+        fetch_workers = int(os.getenv("FETCH_WORKERS", 4))
+
+        mydb = DatabaseLoader.establish_connection(database)
+        mycursor = mydb.cursor()
+        stored_chunks = select_stored_chunks(mycursor, playlist_id)
+        mycursor.close()
+        mydb.close()
+
+        # Only the tracks of the chunks that aren't stored are kept
+        occurrences = Counter()
+        new_chunks  = {}
+        with metrics.stage("fetch"):
+            for chunk in iter_chunks(iter_track_pages(sp_client, None, fetch_workers, playlist_id)):
+                fingerprint = chunk_fingerprint((track.track_id, track.added_by) for track in chunk)
+                occurrences[fingerprint] += 1
+                if fingerprint not in stored_chunks:
+                    new_chunks[fingerprint] = chunk
+
+        gone_chunks = sorted(stored_chunks.keys() - occurrences.keys())
+        # A chunk repeated a different number of times only needs its count updated
+        recounted = {
+            fingerprint: count for fingerprint, count in occurrences.items()
+            if fingerprint in stored_chunks and stored_chunks[fingerprint] != count
+        }
+
+        changed_chunks = len(new_chunks) + len(gone_chunks)
+        result = {
+            'chunks': sum(occurrences.values()), 'changed_chunks': changed_chunks, 'inserted': 0, 'deleted': 0, 'moved': 0
+        }
+        if not changed_chunks and not recounted:
+            logger.info("Playlist %s: no chunk changed", playlist_id)
+            return result
+
+        mydb = DatabaseLoader.establish_connection(database)
+        mycursor = mydb.cursor()
+        stored = select_stored_items(mycursor, playlist_id, gone_chunks)
+        mycursor.close()
+        mydb.close()
+
+        tracks_at = {
+            (fingerprint, offset): track
+            for fingerprint, chunk in new_chunks.items() for offset, track in enumerate(chunk)
+        }
+        current = {slot: (track.track_id, track.added_by) for slot, track in tracks_at.items()}
+
+        inserted, deleted, moved = diff_items(stored, current)
+        result.update(inserted=len(inserted), deleted=len(deleted), moved=len(moved))
+
+        if inserted:
+            processed_tracks = process_tracks(
+                sp_client, [tracks_at[slot] for slot in inserted], artist_cache, known_users,
+                int(os.getenv("USER_FETCH_WORKERS", 4))
+            )
+            with metrics.stage("load"):
+                DatabaseLoader.bulk_csv_to_db(
+                    processed_tracks, chunk_size=int(os.getenv("DB_CHUNK_SIZE", 1000)), database=database, write_lock=write_lock
+                )
+
+        removed_items = {stored[slot] for slot in deleted}
+
+        mydb = DatabaseLoader.establish_connection(database)
+        mycursor = mydb.cursor()
+        try:
+            with write_lock or nullcontext():
+                write_playlist_state(
+                    mycursor, playlist_id, gone_chunks, current,
+                    {fingerprint: occurrences[fingerprint] for fingerprint in new_chunks.keys() | recounted.keys()}
+                )
+                removed = remove_unreferenced(mycursor, removed_items, playlist_id) if removed_items else {}
+                mydb.commit()
+        except Exception:
+            mydb.rollback()
+            raise
+        finally:
+            mycursor.close()
+            mydb.close()
+
+        metrics.add_rows({'PlaylistItems': len(current)})
+        logger.info(
+            "Playlist %s reconciled: %d of %d chunks changed, %d inserted, %d deleted, %d moved, removed rows: %s",
+            playlist_id, changed_chunks, result['chunks'], len(inserted), len(deleted), len(moved), removed
+        )
+        return result
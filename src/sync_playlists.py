@@ -0,0 +1,199 @@
+from classes.TrackSpool import TrackSpool
+from concurrent.futures import ThreadPoolExecutor
+from fetch_tracks import iter_track_pages
+from helper.get_last_fetched_track_index import get_last_fetched_track_index
+from helper.get_sync_state import get_sync_state
+from helper.save_sync_state import save_sync_state
+from lib.metrics import metrics
+from load_tracks import load_batches
+from pipeline import run_streaming_pipeline
+from process_tracks import iter_processed_tracks
+from reconcile_playlist import reconcile_playlist
+
+import logging
+import os
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+def group_pages(pages, size):
+        """
+        Regroups the pages of iter_track_pages into lists of at least size tracks (but the last).
+        """
+        group = []
+        for page in pages:
+            group.extend(page)
+            if len(group) >= size:
+                yield group
+                group = []
+        if group:
+            yield group
+
+
+def last_stored_index(sync_state, legacy_resume=False):
+        """
+        Returns the index an append-only sync of a playlist resumes after.
+
+        Parameters
+        ----------
+        sync_state : dict or None
+            The state stored by the previous sync, see get_sync_state.
+        legacy_resume : bool, optional
+            Whether a playlist without sync state resumes from the number of stored tracks.
+
+        Returns
+        -------
+        int or None
+            The index of the last stored track, or None to fetch the whole playlist.
+        """
+        if sync_state is not None:
+            return sync_state['last_track_index']
+        if legacy_resume:
+            # Databases synced before SyncState existed fall back to counting the stored tracks
+            return get_last_fetched_track_index()
+        return None
+
+
+def sync_playlist(sp_client, playlist_id, artist_cache, known_users, write_lock=None, legacy_resume=False):
+        """
+        Syncs one playlist: fetches the tracks added since its previous sync, processes and loads them.
+
+        With SYNC_MODE=reconcile, the stored items are reconciled with the whole playlist instead
+        (see reconcile_playlist), so removed and reordered tracks are reflected too.
+
+        Parameters
+        ----------
+        sp_client : spotipy.Spotify
+            The Spotify client used to make the API requests.
+        playlist_id : str
+            The URI or ID of the playlist.
+        artist_cache : classes.ArtistCache.ArtistCache
+            The persistent artist cache, shared by every playlist of the run.
+        known_users : dict
+            The known users, shared and memoized by every playlist of the run.
+        write_lock : threading.Lock, optional
+            The lock serializing the database transactions of the playlists synced concurrently.
+        legacy_resume : bool, optional
+            Whether a playlist without sync state resumes from the number of stored tracks, which
+            is only right for a database holding that single playlist.
+
+        Returns
+        -------
+        dict
+            The 'playlist_id', its 'status' ('unchanged' or 'synced') and the number of 'tracks'
+            of the playlist.
+        """
+        # One lightweight request tells whether the playlist changed since the last sync
+        playlist = sp_client.playlist(playlist_id, fields="snapshot_id,tracks.total")
+        snapshot_id  = playlist['snapshot_id']
+        total_tracks = playlist['tracks']['total']
+
+        sync_state = get_sync_state(playlist_id)
+
+        if sync_state is not None and sync_state['snapshot_id'] == snapshot_id:
+            logger.info("Playlist %s unchanged since %s (snapshot %s), nothing to sync", playlist_id, sync_state['synced_at'], snapshot_id)
+            return {'playlist_id': playlist_id, 'status': 'unchanged', 'tracks': total_tracks}
+
+        if os.getenv("SYNC_MODE", "append") == "reconcile":
+            # Applies the additions, removals and moves anywhere in the playlist
+            reconcile_playlist(sp_client, playlist_id, artist_cache, known_users, write_lock)
+            save_sync_state(playlist_id, snapshot_id, total_tracks - 1 if total_tracks else None)
+            return {'playlist_id': playlist_id, 'status': 'synced', 'tracks': total_tracks}
+
+        # The append-only sync resumes after the last stored track
+        last_fetched_track_index = last_stored_index(sync_state, legacy_resume)
+
+        fetch_workers = int(os.getenv("FETCH_WORKERS", 4))
+        user_workers  = int(os.getenv("USER_FETCH_WORKERS", 4))
+        chunk_size    = int(os.getenv("DB_CHUNK_SIZE", 1000))
+        spool         = None
+
+        if os.getenv("PIPELINE_MODE", "batch") == "streaming":
+            # Fetch, process and load overlap, committing every chunk_size tracks
+            with metrics.stage("pipeline"):
+                run_streaming_pipeline(
+                    sp_client=sp_client,
+                    last_track_index=last_fetched_track_index,
+                    fetch_workers=fetch_workers,
+                    artist_cache=artist_cache,
+                    known_users=known_users,
+                    user_workers=user_workers,
+                    chunk_size=chunk_size,
+                    queue_size=int(os.getenv("PIPELINE_QUEUE_SIZE", 4)),
+                    playlist_uri=playlist_id,
+                    write_lock=write_lock
+                )
+
+        else:
+            # Every processed batch goes to the spool first, so a crash only loses the batch in progress
+            spool = TrackSpool(playlist_id)
+            spooled = spool.open(last_fetched_track_index, snapshot_id, total_tracks, known_users)
+            last_spooled_index = (last_fetched_track_index if last_fetched_track_index is not None else -1) + spooled
+
+            pages = iter_track_pages(
+                sp_client, last_spooled_index if last_spooled_index >= 0 else None, fetch_workers, playlist_id
+            )
+            for batch in iter_processed_tracks(
+                sp_client, group_pages(pages, int(os.getenv("SPOOL_BATCH_SIZE", 500))), artist_cache, known_users, user_workers
+            ):
+                spool.append(batch)
+            logger.info("Playlist %s: %d tracks spooled, %d of them replayed", playlist_id, len(spool), spooled)
+
+            with metrics.stage("load"):
+                load_batches(spool.batches(), chunk_size=chunk_size, write_lock=write_lock)
+
+        save_sync_state(playlist_id, snapshot_id, total_tracks - 1 if total_tracks else None)
+        if spool is not None:
+            # Only once the tracks and the new resume point are committed
+            spool.truncate()
+        return {'playlist_id': playlist_id, 'status': 'synced', 'tracks': total_tracks}
+
+
+def sync_playlists(sp_client, playlist_ids, artist_cache, known_users, max_workers=1):
+        """
+        Syncs several playlists concurrently with a bounded pool of workers.
+
+        Every worker shares the API client (and its rate limiter), the artist cache and the known
+        users, so an artist or contributor found in several playlists is resolved once per run.
+        Fetching and processing run in parallel, while the database transactions are serialized.
+        A failing playlist is logged and doesn't stop the others.
+
+        Parameters
+        ----------
+        sp_client : spotipy.Spotify
+            The Spotify client used to make the API requests.
+        playlist_ids : list of str
+            The URIs or IDs of the playlists.
+        artist_cache : classes.ArtistCache.ArtistCache
+            The persistent artist cache.
+        known_users : dict
+            The users already known, e.g. preloaded from the Users table.
+        max_workers : int, optional
+            The number of playlists synced at the same time.
+
+        Returns
+        -------
+        list of dict
+            The result of sync_playlist for each playlist, in order, with the status 'failed' and
+            the 'error' for the playlists that raised.
+        """
+        write_lock = threading.Lock()
+        legacy_resume = len(playlist_ids) == 1
+
+        def sync(playlist_id):
+            try:
+                return sync_playlist(sp_client, playlist_id, artist_cache, known_users, write_lock, legacy_resume)
+            except Exception as e:
+                logger.exception("Sync of playlist %s failed", playlist_id)
+                return {'playlist_id': playlist_id, 'status': 'failed', 'error': str(e)}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(playlist_ids)))) as executor:
+            results = list(executor.map(sync, playlist_ids))
+
+        logger.info(
+            "Synced %d playlist(s): %s", len(results),
+            ", ".join(f"{result['playlist_id']} {result['status']}" for result in results)
+        )
+        return results